@@ -3,11 +3,35 @@ from flask_pymongo import PyMongo
 from flask_jwt_extended import JWTManager
 from flask_cors import CORS
 from app.config import Config
+from app.models.exercise import ensure_exercise_indexes
+from app.models.exercise_stats import ensure_exercise_stats_indexes
+from app.services.admission import AdmissionController
+from app.services.code_execution import CodeExecutionService
+from app.services.code_store import CodeStore
+from app.services.exercise_cache import ExerciseCache
+from app.services.exercise_stats import record_submission_stats
+from app.services.judge_queue import JudgeQueue
+from app.services.submission_recorder import SubmissionRecorder
+from app.services.test_case_store import TestCaseStore
+from app.services.verdict_cache import VerdictCache
 import os
 
 # Initialize extensions
 mongo = PyMongo()
 jwt = JWTManager()
+code_executor = CodeExecutionService()
+admission = AdmissionController()
+judge_queue = JudgeQueue(admission=admission)
+verdict_cache = VerdictCache()
+code_store = CodeStore(lambda: mongo.db.code_blobs)
+submission_recorder = SubmissionRecorder(
+    lambda: mongo.db.submissions,
+    before_write=code_store.store_submissions,
+    on_written=lambda submissions: record_submission_stats(mongo.db, submissions)
+)
+test_case_store = TestCaseStore(lambda: mongo.db)
+exercise_cache = ExerciseCache(lambda exercise_id: mongo.db.exercises.find_one({'_id': exercise_id}),
+                               resolve=test_case_store.resolve)
 
 def create_app(config_class=Config):
     app = Flask(__name__)
@@ -19,6 +43,21 @@ def create_app(config_class=Config):
     # Initialize extensions with app
     mongo.init_app(app)
     jwt.init_app(app)
+    code_executor.init_app(app)
+    admission.init_app(app)
+    judge_queue.init_app(app)
+    verdict_cache.init_app(app)
+    exercise_cache.init_app(app)
+    submission_recorder.init_app(app)
+    test_case_store.init_app(app)
+
+    # Create the indexes the exercise listing and statistics rely on
+    with app.app_context():
+        try:
+            ensure_exercise_indexes(mongo.db)
+            ensure_exercise_stats_indexes(mongo.db)
+        except Exception as e:
+            app.logger.warning(f"Could not create exercise indexes: {e}")
 
     # Ensure the upload directory exists
     os.makedirs(app.config.get('UPLOAD_FOLDER', 'uploads'), exist_ok=True)
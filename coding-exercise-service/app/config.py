@@ -12,4 +12,54 @@ class Config:
     
     # File storage settings
     UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER', 'uploads')
-    MAX_CONTENT_LENGTH = 50 * 1024 * 1024  # 50MB limit for file uploads
\ No newline at end of file
+    MAX_CONTENT_LENGTH = 50 * 1024 * 1024  # 50MB limit for file uploads
+
+    # Code execution settings
+    EXECUTION_TIMEOUT = int(os.environ.get('EXECUTION_TIMEOUT', 5))
+    EXECUTION_POOL_SIZE = int(os.environ.get('EXECUTION_POOL_SIZE', 4))  # 0 disables the warm pool
+    EXECUTION_POOL_MAX_JOBS = int(os.environ.get('EXECUTION_POOL_MAX_JOBS', 200))  # Recycle runners after N jobs
+    EXECUTION_MAX_CONCURRENCY = int(os.environ.get('EXECUTION_MAX_CONCURRENCY', os.cpu_count() or 1))  # Test cases running at once, service-wide
+    EXECUTION_MAX_PARALLEL_CASES = int(os.environ.get('EXECUTION_MAX_PARALLEL_CASES', 4))  # Per-submission share of that budget
+    EXECUTION_CPU_TIME_LIMIT = int(os.environ.get('EXECUTION_CPU_TIME_LIMIT', 0)) or None  # Seconds per test case, defaults to the timeout
+    EXECUTION_MEMORY_LIMIT_MB = int(os.environ.get('EXECUTION_MEMORY_LIMIT_MB', 256))  # Address space per test case, 0 disables
+    EXECUTION_FILE_SIZE_LIMIT_KB = int(os.environ.get('EXECUTION_FILE_SIZE_LIMIT_KB', 1024))  # Largest file a submission may write, 0 disables
+    EXECUTION_OUTPUT_LIMIT_KB = int(os.environ.get('EXECUTION_OUTPUT_LIMIT_KB', 1024))  # Output (stdout + stderr) a test case may print, 0 disables
+
+    # Submission queue settings
+    SUBMISSION_QUEUE_ENABLED = os.environ.get('SUBMISSION_QUEUE_ENABLED', 'false').lower() == 'true'  # Default for POST /submit
+    SUBMISSION_QUEUE_WORKERS = int(os.environ.get('SUBMISSION_QUEUE_WORKERS', 4))
+    SUBMISSION_QUEUE_MAX_RETAINED = int(os.environ.get('SUBMISSION_QUEUE_MAX_RETAINED', 10000))  # Finished jobs kept for polling
+    SUBMISSION_QUEUE_MAX_PENDING = int(os.environ.get('SUBMISSION_QUEUE_MAX_PENDING', 1000))  # Queued jobs before 503, 0 for no bound
+
+    # Admission control settings
+    ADMISSION_ENABLED = os.environ.get('ADMISSION_ENABLED', 'true').lower() == 'true'
+    ADMISSION_MAX_ACTIVE = int(os.environ.get('ADMISSION_MAX_ACTIVE', 0))  # Submissions judged at once, 0 for EXECUTION_MAX_CONCURRENCY
+    ADMISSION_MAX_WAITING = int(os.environ.get('ADMISSION_MAX_WAITING', 64))  # Submissions waiting for a slot before 503
+    ADMISSION_MAX_WAIT = float(os.environ.get('ADMISSION_MAX_WAIT', 10))  # Seconds a submission may wait for a slot before 503
+    ADMISSION_MAX_PER_USER = int(os.environ.get('ADMISSION_MAX_PER_USER', 2))  # Submissions in flight per user before 429, 0 for no limit
+
+    # Submission writer settings
+    SUBMISSION_WRITER_MODE = os.environ.get('SUBMISSION_WRITER_MODE', 'batched')  # "batched" (write-behind) or "sync"
+    SUBMISSION_WRITER_BATCH_SIZE = int(os.environ.get('SUBMISSION_WRITER_BATCH_SIZE', 100))  # Documents per insert_many
+    SUBMISSION_WRITER_FLUSH_INTERVAL = float(os.environ.get('SUBMISSION_WRITER_FLUSH_INTERVAL', 0.5))  # Seconds a document may wait
+    SUBMISSION_WRITER_CAPACITY = int(os.environ.get('SUBMISSION_WRITER_CAPACITY', 10000))  # Pending documents before backpressure
+    SUBMISSION_WRITER_PUT_TIMEOUT = float(os.environ.get('SUBMISSION_WRITER_PUT_TIMEOUT', 1.0))  # Seconds to wait when full before writing inline
+
+    # Verdict cache settings
+    VERDICT_CACHE_SIZE = int(os.environ.get('VERDICT_CACHE_SIZE', 10000))  # 0 disables the cache
+
+    # Exercise listing settings
+    EXERCISES_PAGE_SIZE = int(os.environ.get('EXERCISES_PAGE_SIZE', 20))  # Default page size of GET /api/exercises/
+    EXERCISES_MAX_PAGE_SIZE = int(os.environ.get('EXERCISES_MAX_PAGE_SIZE', 100))  # Largest page a client may request
+
+    # Exercise cache settings
+    EXERCISE_CACHE_SIZE = int(os.environ.get('EXERCISE_CACHE_SIZE', 1000))  # 0 disables the cache
+    EXERCISE_CACHE_TTL = int(os.environ.get('EXERCISE_CACHE_TTL', 60))  # Seconds before a cached exercise is reloaded
+
+    # Reference solution validation settings
+    VALIDATION_TIME_LIMIT_FACTOR = float(os.environ.get('VALIDATION_TIME_LIMIT_FACTOR', 3.0))  # Derived time limit = slowest reference case x factor
+    VALIDATION_MIN_TIME_LIMIT = float(os.environ.get('VALIDATION_MIN_TIME_LIMIT', 1.0))  # Lowest derived time limit in seconds
+
+    # Test case storage settings
+    TEST_CASE_INLINE_LIMIT_KB = int(os.environ.get('TEST_CASE_INLINE_LIMIT_KB', 16))  # Larger inputs/outputs go to GridFS, 0 keeps everything inline
+    TEST_CASE_CACHE_MB = int(os.environ.get('TEST_CASE_CACHE_MB', 64))  # Out-of-line payloads cached for the judge
\ No newline at end of file
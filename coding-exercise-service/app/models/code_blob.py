@@ -0,0 +1,11 @@
+from datetime import datetime
+
+# Submitted source code, stored once per content hash and referenced from
+# submissions by code_hash (see app/services/code_store.py)
+code_blob_schema = {
+    "_id": str,            # SHA-256 of the UTF-8 source
+    "code": str,
+    "size": int,           # Bytes of UTF-8 source
+    "refs": int,           # Submissions referencing this blob
+    "created_at": datetime
+}
@@ -11,7 +11,11 @@ exercise_schema = {
         {
             "input": str,
             "expected_output": str,
-            "is_hidden": bool  # Hidden test cases are not shown to users
+            "is_hidden": bool,  # Hidden test cases are not shown to users
+            # Payloads above TEST_CASE_INLINE_LIMIT_KB replace the field above
+            # with a reference into the test_case_blobs GridFS bucket
+            "input_blob": {"sha256": str, "size": int},
+            "expected_output_blob": {"sha256": str, "size": int}
         }
     ],
     "starter_code": {
@@ -29,12 +33,61 @@ exercise_schema = {
             "level": int,  # 1 for subtle hints, 3 for more direct hints
             "content": str
         }
-    ]
+    ],
+    "max_failures": int,  # Stop judging after this many failed test cases (None runs all)
+    "time_limit": float,  # Seconds per test case, derived from the reference solution (None uses the service timeout)
+    "validation": {       # Last run of the reference solution, see exercise_validation
+        "status": str,    # passed, failed, no_solution, no_test_cases
+        "validated_at": datetime,
+        "cases": [
+            {
+                "test_case_id": int,
+                "passed": bool,
+                "wall_time": float,  # Reference runtime in seconds
+                "cpu_time": float    # What the time limit is derived from
+            }
+        ],
+        "failed_cases": [int],
+        "reference_time": float,  # Slowest reference case, in CPU seconds
+        "time_limit": float       # Derived limit (None unless every case passed)
+    }
 }
 
+# Fields a client may select when listing exercises
+LISTABLE_FIELDS = ('title', 'description', 'difficulty', 'topic', 'created_at', 'max_failures', 'time_limit')
+
+# Indexes backing the exercise listing: equality filters on topic and/or
+# difficulty followed by the _id keyset sort
+EXERCISE_INDEXES = [
+    [('topic', 1), ('difficulty', 1), ('_id', 1)],
+    [('topic', 1), ('_id', 1)],
+    [('difficulty', 1), ('_id', 1)]
+]
+
+def ensure_exercise_indexes(db):
+    """Create the exercise collection's indexes (a no-op if they exist)."""
+    for keys in EXERCISE_INDEXES:
+        db.exercises.create_index(keys)
+
+def validate_max_failures(value, source='max_failures'):
+    """
+    Check a max_failures setting: a positive integer, or None to run every
+    test case. Integer strings (e.g. from a form) are accepted.
+
+    Raises:
+        ValueError: If the value is anything else
+    """
+    if value is None:
+        return None
+    if isinstance(value, str) and value.strip().isdigit():
+        value = int(value)
+    if type(value) is not int or value < 1:
+        raise ValueError(f"{source} must be a positive integer")
+    return value
+
 def create_exercise_document(title, description, difficulty, topic, 
                            test_cases=None, starter_code=None, 
-                           solution_code=None, hints=None):
+                           solution_code=None, hints=None, max_failures=None):
     """Create a new exercise document."""
     return {
         "title": title,
@@ -45,5 +98,6 @@ def create_exercise_document(title, description, difficulty, topic,
         "test_cases": test_cases or [],
         "starter_code": starter_code or {},
         "solution_code": solution_code or {},
-        "hints": hints or []
+        "hints": hints or [],
+        "max_failures": max_failures
     }
\ No newline at end of file
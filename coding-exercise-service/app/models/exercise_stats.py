@@ -0,0 +1,37 @@
+from datetime import datetime
+
+# Materialized per-exercise statistics, keyed by exercise ID and updated
+# as submissions are written (see app/services/exercise_stats.py)
+exercise_stats_schema = {
+    "_id": "ObjectId",             # Exercise ID
+    "attempts": int,               # Submissions
+    "passes": int,                 # Submissions that passed every test case
+    "distinct_users": int,         # Users with at least one submission
+    "solved_users": int,           # Users with at least one passing submission
+    "first_attempt_passes": int,   # Users whose first submission passed
+    "compile_errors": int,
+    "attempts_to_solve": {
+        "1": int,                  # Users who solved it on their Nth attempt ("10" is 10+)
+    },
+    "test_case_failures": {
+        "0": int,                  # Failed (not skipped) runs per test case index
+    },
+    "updated_at": datetime
+}
+
+# One document per (user, exercise) pair that has been attempted
+exercise_progress_schema = {
+    "user_id": "ObjectId",
+    "exercise_id": "ObjectId",
+    "attempts": int,
+    "passed": bool,
+    "first_submitted_at": datetime,
+    "last_submitted_at": datetime,
+    "passed_at": datetime,  # First passing submission, absent until then
+    "last_submission_id": "ObjectId"  # Last submission folded in, see record_submission_stats
+}
+
+def ensure_exercise_stats_indexes(db):
+    """Create the indexes used to update and query exercise progress."""
+    db.exercise_progress.create_index([('user_id', 1), ('exercise_id', 1)], unique=True)
+    db.exercise_progress.create_index([('user_id', 1), ('passed', 1)])
@@ -1,13 +1,18 @@
-from flask import Blueprint, request, jsonify
+import json
+import queue
+import threading
+from flask import Blueprint, Response, request, jsonify, current_app, url_for
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from app import mongo
+from app import mongo, judge_queue, admission, verdict_cache, exercise_cache, submission_recorder, test_case_store
 from bson.objectid import ObjectId
-from datetime import datetime
-from app.models.exercise import create_exercise_document
-from app.services.code_execution import CodeExecutionService
+from app.models.exercise import create_exercise_document, validate_max_failures, LISTABLE_FIELDS
+from app.services.admission import AdmissionRejected
+from app.services.pagination import encode_cursor, decode_cursor
+from app.services.exercise_stats import summarize_exercise_stats
+from app.services.exercise_validation import validate_exercise, save_validation
+from app.services.judge import is_supported_language, resolve_max_failures, process_submission
 
 exercises_bp = Blueprint('exercises', __name__, url_prefix='/api/exercises')
-code_executor = CodeExecutionService()
 
 @exercises_bp.route('/', methods=['GET'])
 @jwt_required()
@@ -22,53 +27,71 @@ def get_exercises():
         query['topic'] = topic
     if difficulty:
         query['difficulty'] = difficulty
+    filters = dict(query)
     
-    # Get exercises
-    exercises = list(mongo.db.exercises.find(
-        query,
-        {
+    # Page size is capped by the server whatever the client asks for
+    try:
+        limit = int(request.args.get('limit', current_app.config.get('EXERCISES_PAGE_SIZE', 20)))
+    except ValueError:
+        return jsonify({"message": "limit must be an integer"}), 400
+    if limit < 1:
+        return jsonify({"message": "limit must be positive"}), 400
+    limit = min(limit, current_app.config.get('EXERCISES_MAX_PAGE_SIZE', 100))
+    
+    # Optional field selection; test cases and solutions are never listed
+    fields = request.args.get('fields')
+    if fields:
+        selected = [field.strip() for field in fields.split(',') if field.strip()]
+        unknown = [field for field in selected if field not in LISTABLE_FIELDS]
+        if unknown:
+            return jsonify({"message": f"Unknown fields: {', '.join(unknown)}"}), 400
+        projection = {field: 1 for field in selected}
+    else:
+        projection = {
             'title': 1,
             'description': 1,
             'difficulty': 1,
             'topic': 1,
             'test_cases': {'$slice': 0}  # Don't include test cases
         }
-    ))
+    
+    # Keyset pagination: resume after the last _id of the previous page
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            query['_id'] = {'$gt': decode_cursor(cursor, filters)}
+        except ValueError as e:
+            return jsonify({"message": str(e)}), 400
+    
+    # Get one extra exercise to know whether another page follows
+    exercises = list(mongo.db.exercises.find(query, projection).sort('_id', 1).limit(limit + 1))
+    has_more = len(exercises) > limit
+    exercises = exercises[:limit]
+    next_cursor = encode_cursor(exercises[-1]['_id'], filters) if has_more else None
     
     # Convert ObjectIds to strings
     for exercise in exercises:
         exercise['_id'] = str(exercise['_id'])
     
-    return jsonify(exercises), 200
+    # The body stays a plain array; the continuation token travels in headers
+    response = jsonify(exercises)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+        next_args = request.args.to_dict()
+        next_args['cursor'] = next_cursor
+        response.headers['Link'] = f'<{url_for(".get_exercises", **next_args)}>; rel="next"'
+    return response, 200
 
 @exercises_bp.route('/<exercise_id>', methods=['GET'])
 @jwt_required()
 def get_exercise(exercise_id):
     try:
-        # Project non-hidden test cases
-        pipeline = [
-            {'$match': {'_id': ObjectId(exercise_id)}},
-            {'$project': {
-                'solution_code': 0,  # Don't include solution code
-                'test_cases': {
-                    '$filter': {
-                        'input': '$test_cases',
-                        'as': 'test_case',
-                        'cond': {'$eq': ['$$test_case.is_hidden', False]}
-                    }
-                }
-            }}
-        ]
-        
-        exercise_cursor = mongo.db.exercises.aggregate(pipeline)
-        exercise = next(exercise_cursor, None)
+        # Cached projection without solution code or hidden test cases
+        exercise = exercise_cache.get_public(exercise_id)
         
         if not exercise:
             return jsonify({"message": "Exercise not found"}), 404
         
-        # Convert ObjectId to string
-        exercise['_id'] = str(exercise['_id'])
-        
         return jsonify(exercise), 200
     except Exception as e:
         return jsonify({"message": str(e)}), 400
@@ -81,10 +104,7 @@ def get_hints(exercise_id):
         level = int(request.args.get('level', 1))
         
         # Get exercise hints
-        exercise = mongo.db.exercises.find_one(
-            {'_id': ObjectId(exercise_id)},
-            {'hints': 1}
-        )
+        exercise = exercise_cache.get(exercise_id)
         
         if not exercise:
             return jsonify({"message": "Exercise not found"}), 404
@@ -96,6 +116,42 @@ def get_hints(exercise_id):
     except Exception as e:
         return jsonify({"message": str(e)}), 400
 
+@exercises_bp.route('/<exercise_id>/stats', methods=['GET'])
+@jwt_required()
+def get_exercise_stats(exercise_id):
+    try:
+        # Materialized counters: one document read, no submission scan
+        stats = mongo.db.exercise_stats.find_one({'_id': ObjectId(exercise_id)})
+        
+        if not stats and not exercise_cache.get(exercise_id):
+            return jsonify({"message": "Exercise not found"}), 404
+        
+        return jsonify(summarize_exercise_stats(stats)), 200
+    except Exception as e:
+        return jsonify({"message": str(e)}), 400
+
+@exercises_bp.route('/<exercise_id>/validate', methods=['POST'])
+@jwt_required()
+def validate_exercise_solution(exercise_id):
+    try:
+        # Read the stored document, not a cached copy that may predate an edit
+        exercise = mongo.db.exercises.find_one({'_id': ObjectId(exercise_id)})
+        
+        if not exercise:
+            return jsonify({"message": "Exercise not found"}), 404
+        
+        # Run the reference solution and derive the exercise's time limit
+        validation = validate_exercise(
+            exercise,
+            factor=current_app.config.get('VALIDATION_TIME_LIMIT_FACTOR', 3.0),
+            minimum=current_app.config.get('VALIDATION_MIN_TIME_LIMIT', 1.0)
+        )
+        save_validation(mongo.db, exercise['_id'], validation)
+        
+        return jsonify(validation), 200
+    except Exception as e:
+        return jsonify({"message": str(e)}), 400
+
 @exercises_bp.route('/submit', methods=['POST'])
 @jwt_required()
 def submit_code():
@@ -106,63 +162,185 @@ def submit_code():
         return jsonify({"message": "Missing required fields"}), 400
     
     try:
-        # Get exercise
-        exercise = mongo.db.exercises.find_one({'_id': ObjectId(data['exercise_id'])})
-        if not exercise:
-            return jsonify({"message": "Exercise not found"}), 404
-        
-        # Process submissions based on language
-        if data['language'].lower() == 'python':
-            results = []
-            for i, test_case in enumerate(exercise['test_cases']):
-                result = code_executor.execute_python(data['code'], test_case['input'])
-                
-                # Check result
-                if result['success']:
-                    passed = result['output'] == test_case['expected_output']
-                    results.append({
-                        "test_case_id": i,
-                        "passed": passed,
-                        "expected": test_case['expected_output'],
-                        "actual": result['output'],
-                        "hidden": test_case.get('is_hidden', False)
-                    })
-                else:
-                    results.append({
-                        "test_case_id": i,
-                        "passed": False,
-                        "error": result['error'],
-                        "hidden": test_case.get('is_hidden', False)
-                    })
-        else:
-            # Handle other languages
-            return jsonify({"message": f"Language {data['language']} not supported yet"}), 400
+        exercise, error = _find_submission_exercise(data)
+        if error:
+            return error
         
-        # Save submission
         user_id = get_jwt_identity()
-        submission = {
-            "user_id": ObjectId(user_id),
-            "exercise_id": ObjectId(data['exercise_id']),
-            "language": data['language'],
-            "code": data['code'],
-            "results": results,
-            "submitted_at": datetime.utcnow(),
-            "passed_all": all(r['passed'] for r in results)
-        }
-        
-        mongo.db.submissions.insert_one(submission)
+        max_failures = resolve_max_failures(data, exercise)
         
-        # For the response, remove hidden test case details
-        visible_results = [r for r in results if not r.get('hidden', False)]
+        # Queued mode: hand the submission to a judge worker and return at once
+        if data.get('async', current_app.config.get('SUBMISSION_QUEUE_ENABLED', False)):
+            job_id = judge_queue.submit(
+                user_id, process_submission,
+                user_id, exercise, data['language'], data['code'], max_failures
+            )
+            return jsonify({
+                "job_id": job_id,
+                "status": "queued",
+                "position": judge_queue.position(job_id)
+            }), 202
         
-        return jsonify({
-            "results": visible_results,
-            "passed_all": all(r['passed'] for r in results),
-            "passed_visible": all(r['passed'] for r in visible_results)
-        }), 200
+        # Wait for a judging slot, or turn the submission away at once
+        with admission.admit(user_id):
+            return jsonify(process_submission(user_id, exercise, data['language'], data['code'], max_failures)), 200
+    except AdmissionRejected as e:
+        return _rejected_response(e)
     except Exception as e:
         return jsonify({"message": str(e)}), 400
 
+@exercises_bp.route('/submit/stream', methods=['POST'])
+@jwt_required()
+def submit_code_stream():
+    """
+    Judge a submission and stream the results as NDJSON.
+
+    One {"event": "case", "result": ...} line is written per visible test
+    case as soon as it finishes, then a final {"event": "summary", ...} line
+    carrying the same fields as the POST /submit response (or an
+    {"event": "error"} line if judging failed).
+    """
+    data = request.json
+    
+    # Validate required fields
+    if not all(k in data for k in ('exercise_id', 'language', 'code')):
+        return jsonify({"message": "Missing required fields"}), 400
+    
+    try:
+        exercise, error = _find_submission_exercise(data)
+        if error:
+            return error
+        max_failures = resolve_max_failures(data, exercise)
+    except Exception as e:
+        return jsonify({"message": str(e)}), 400
+    
+    user_id = get_jwt_identity()
+    app = current_app._get_current_object()
+    events = queue.Queue()
+    
+    # Admission is decided before the stream starts, so a rejection is a
+    # plain 429/503 response; the slot is released when judging ends
+    try:
+        ticket = admission.acquire(user_id)
+    except AdmissionRejected as e:
+        return _rejected_response(e)
+    
+    def on_case(result):
+        if not result.get('hidden', False):
+            events.put({"event": "case", "result": result})
+    
+    # Judge on a separate thread so events reach the client while it runs;
+    # the submission is still saved if the client disconnects
+    def judge():
+        with app.app_context():
+            try:
+                response = process_submission(user_id, exercise, data['language'], data['code'],
+                                              max_failures, on_case)
+                events.put(dict(response, event="summary"))
+            except Exception as e:
+                events.put({"event": "error", "message": str(e)})
+            finally:
+                admission.release(ticket)
+    
+    threading.Thread(target=judge, name="submit-stream", daemon=True).start()
+    
+    def generate():
+        while True:
+            event = events.get()
+            yield json.dumps(event, default=str) + '\n'
+            if event['event'] != 'case':
+                break
+    
+    return Response(generate(), mimetype='application/x-ndjson', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # Stop reverse proxies from buffering the stream
+    }), 200
+
+def _rejected_response(rejection):
+    response = jsonify({
+        "message": rejection.message,
+        "reason": rejection.reason,
+        "retry_after": rejection.retry_after
+    })
+    return response, rejection.status, {'Retry-After': str(rejection.retry_after)}
+
+def _find_submission_exercise(data):
+    """
+    Look up the exercise a submission targets and check its language.
+    
+    Returns:
+        tuple: (exercise, None), or (None, error response)
+    """
+    exercise = exercise_cache.get(data['exercise_id'])
+    if not exercise:
+        return None, (jsonify({"message": "Exercise not found"}), 404)
+    
+    # Process submissions based on language
+    if not is_supported_language(data['language']):
+        # Handle other languages
+        return None, (jsonify({"message": f"Language {data['language']} not supported yet"}), 400)
+    
+    return exercise, None
+
+@exercises_bp.route('/submissions/<job_id>', methods=['GET'])
+@jwt_required()
+def get_submission_job(job_id):
+    job = judge_queue.get(job_id)
+    
+    # Jobs are only visible to the user who submitted them
+    if not job or job['owner'] != get_jwt_identity():
+        return jsonify({"message": "Submission job not found"}), 404
+    
+    response = {
+        "job_id": job['job_id'],
+        "status": job['status'],
+        "wait_time": None,
+        "run_time": None
+    }
+    
+    if job['status'] == 'queued':
+        response['position'] = judge_queue.position(job_id)
+    if job['started_at']:
+        response['wait_time'] = round(job['started_at'] - job['enqueued_at'], 4)
+    if job['finished_at']:
+        response['run_time'] = round(job['finished_at'] - job['started_at'], 4)
+    if job['status'] == 'done':
+        response.update(job['result'])
+    elif job['status'] == 'failed':
+        response['message'] = job['error']
+    
+    return jsonify(response), 200
+
+@exercises_bp.route('/queue/stats', methods=['GET'])
+@jwt_required()
+def get_queue_stats():
+    return jsonify(judge_queue.stats()), 200
+
+@exercises_bp.route('/admission/stats', methods=['GET'])
+@jwt_required()
+def get_admission_stats():
+    return jsonify(admission.stats()), 200
+
+@exercises_bp.route('/verdict-cache/stats', methods=['GET'])
+@jwt_required()
+def get_verdict_cache_stats():
+    return jsonify(verdict_cache.stats()), 200
+
+@exercises_bp.route('/submission-writer/stats', methods=['GET'])
+@jwt_required()
+def get_submission_writer_stats():
+    return jsonify(submission_recorder.stats()), 200
+
+@exercises_bp.route('/exercise-cache/stats', methods=['GET'])
+@jwt_required()
+def get_exercise_cache_stats():
+    return jsonify(exercise_cache.stats()), 200
+
+@exercises_bp.route('/test-case-store/stats', methods=['GET'])
+@jwt_required()
+def get_test_case_store_stats():
+    return jsonify(test_case_store.stats()), 200
+
 @exercises_bp.route('/', methods=['POST'])
 @jwt_required()
 def create_exercise():
@@ -172,6 +350,10 @@ def create_exercise():
     required_fields = ['title', 'description', 'difficulty', 'topic']
     if not all(field in data for field in required_fields):
         return jsonify({"message": f"Missing required fields: {', '.join(required_fields)}"}), 400
+    try:
+        max_failures = validate_max_failures(data.get('max_failures'))
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
     
     # Create new exercise document
     new_exercise = create_exercise_document(
@@ -179,14 +361,16 @@ def create_exercise():
         description=data['description'],
         difficulty=data['difficulty'],
         topic=data['topic'],
-        test_cases=data.get('test_cases', []),
+        test_cases=test_case_store.externalize(data.get('test_cases', [])),
         starter_code=data.get('starter_code', {}),
         solution_code=data.get('solution_code', {}),
-        hints=data.get('hints', [])
+        hints=data.get('hints', []),
+        max_failures=max_failures
     )
     
     # Insert into database
     result = mongo.db.exercises.insert_one(new_exercise)
+    exercise_cache.invalidate(result.inserted_id)
     
     return jsonify({
         "message": "Exercise created successfully",
@@ -0,0 +1,191 @@
+import math
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from app.services.metrics import summarize
+
+# Bounds of the Retry-After hint, in seconds
+MIN_RETRY_AFTER = 1
+MAX_RETRY_AFTER = 60
+
+
+class AdmissionRejected(Exception):
+    """
+    A submission was turned away because the service is saturated (503)
+    or the user already has too many submissions in flight (429).
+    """
+
+    def __init__(self, message, reason, status, retry_after):
+        super().__init__(message)
+        self.message = message
+        self.reason = reason
+        self.status = status
+        self.retry_after = retry_after
+
+
+def retry_after(backlog, workers, run_times):
+    """
+    Estimate how many seconds until a rejected submission would get in:
+    the time workers need to get through backlog judgings of the average
+    recent duration.
+    """
+    if not run_times:
+        return MIN_RETRY_AFTER
+    average = sum(run_times) / len(run_times)
+    estimate = math.ceil(average * (backlog + 1) / max(1, workers))
+    return max(MIN_RETRY_AFTER, min(estimate, MAX_RETRY_AFTER))
+
+
+class AdmissionController:
+    """
+    Admission control for judgings.
+
+    At most max_active submissions are judged at once; up to max_waiting
+    more wait for a slot in arrival order, each for at most max_wait
+    seconds. A user may have at most max_per_user submissions active or
+    waiting. Anything beyond that is rejected at once with a Retry-After
+    hint, so under a burst the host keeps judging at capacity instead of
+    every request slowing down until all of them time out. Judge queue
+    workers take their slots here too, so queued judgings count against
+    max_active, but are never rejected: the queue has its own limits.
+    """
+
+    def __init__(self, max_active=4, max_waiting=64, max_per_user=2, max_wait=10, enabled=True,
+                 sample_size=1000):
+        self.max_active = max_active
+        self.max_waiting = max_waiting
+        self.max_per_user = max_per_user
+        self.max_wait = max_wait
+        self.enabled = enabled
+        self.active = 0
+        self._waiters = deque()
+        self._per_user = Counter()
+        self._condition = threading.Condition()
+        self._wait_times = deque(maxlen=sample_size)
+        self._run_times = deque(maxlen=sample_size)
+        self._counters = {"admitted": 0, "rejected_user_limit": 0, "rejected_queue_full": 0,
+                          "rejected_wait_timeout": 0}
+
+    def init_app(self, app):
+        self.enabled = app.config.get('ADMISSION_ENABLED', self.enabled)
+        self.max_active = (app.config.get('ADMISSION_MAX_ACTIVE')
+                           or app.config.get('EXECUTION_MAX_CONCURRENCY') or self.max_active)
+        self.max_waiting = app.config.get('ADMISSION_MAX_WAITING', self.max_waiting)
+        self.max_per_user = app.config.get('ADMISSION_MAX_PER_USER', self.max_per_user)
+        self.max_wait = app.config.get('ADMISSION_MAX_WAIT', self.max_wait)
+
+    def acquire(self, user_id, queued=False):
+        """
+        Wait for a judging slot.
+
+        Args:
+            user_id: The user the judging is for
+            queued (bool): For judge queue workers: the job was already
+                admitted by the queue (its per-owner limit and max_pending),
+                so it is never rejected and waits as long as it takes
+
+        Returns:
+            tuple: Ticket to hand back to release
+
+        Raises:
+            AdmissionRejected: If the user is over their limit, the wait
+                queue is full or no slot freed up within max_wait seconds
+        """
+        user_id = str(user_id)
+        if not self.enabled:
+            return (user_id, time.monotonic(), False)
+
+        with self._condition:
+            if not queued and self.max_per_user and self._per_user[user_id] >= self.max_per_user:
+                self._counters['rejected_user_limit'] += 1
+                raise AdmissionRejected(
+                    f"Too many submissions in progress (at most {self.max_per_user} at a time)",
+                    'user_limit', 429, self._retry_after()
+                )
+
+            arrived = time.monotonic()
+            if self.active < self.max_active and not self._waiters:
+                return self._admit(user_id, arrived)
+
+            if not queued and len(self._waiters) >= self.max_waiting:
+                self._counters['rejected_queue_full'] += 1
+                raise AdmissionRejected("Service is busy, try again later", 'queue_full', 503,
+                                        self._retry_after())
+
+            waiter = object()
+            self._waiters.append(waiter)
+            self._per_user[user_id] += 1
+            deadline = None if queued else arrived + self.max_wait
+            try:
+                while not (self._waiters[0] is waiter and self.active < self.max_active):
+                    if deadline is None:
+                        self._condition.wait()
+                        continue
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._counters['rejected_wait_timeout'] += 1
+                        raise AdmissionRejected("Service is busy, try again later", 'wait_timeout', 503,
+                                                self._retry_after())
+                    self._condition.wait(remaining)
+            finally:
+                self._waiters.remove(waiter)
+                self._per_user[user_id] -= 1
+                if not self._per_user[user_id]:
+                    del self._per_user[user_id]
+                # The next waiter may be first in line now
+                self._condition.notify_all()
+
+            return self._admit(user_id, arrived)
+
+    def _admit(self, user_id, arrived):
+        now = time.monotonic()
+        self.active += 1
+        self._per_user[user_id] += 1
+        self._counters['admitted'] += 1
+        self._wait_times.append(now - arrived)
+        return (user_id, now, True)
+
+    def _retry_after(self):
+        return retry_after(len(self._waiters) + self.active, self.max_active, self._run_times)
+
+    def release(self, ticket):
+        user_id, started, counted = ticket
+        if not counted:
+            return
+        with self._condition:
+            self.active -= 1
+            self._per_user[user_id] -= 1
+            if not self._per_user[user_id]:
+                del self._per_user[user_id]
+            self._run_times.append(time.monotonic() - started)
+            self._condition.notify_all()
+
+    @contextmanager
+    def admit(self, user_id):
+        """Context manager around acquire/release."""
+        ticket = self.acquire(user_id)
+        try:
+            yield
+        finally:
+            self.release(ticket)
+
+    def stats(self):
+        with self._condition:
+            return {
+                "enabled": self.enabled,
+                "active": self.active,
+                "waiting": len(self._waiters),
+                "max_active": self.max_active,
+                "max_waiting": self.max_waiting,
+                "max_per_user": self.max_per_user,
+                "max_wait": self.max_wait,
+                "admitted": self._counters['admitted'],
+                "rejected": {
+                    "user_limit": self._counters['rejected_user_limit'],
+                    "queue_full": self._counters['rejected_queue_full'],
+                    "wait_timeout": self._counters['rejected_wait_timeout']
+                },
+                "wait_time": summarize(self._wait_times),
+                "run_time": summarize(self._run_times)
+            }
@@ -1,12 +1,109 @@
 import subprocess
-import tempfile
+import sys
 import os
 import json
+import atexit
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime
+from app.services.concurrency import ConcurrencyBudget
+from app.services.runner import (
+    PREVIEW_BYTES, READ_CHUNK, OutputCapture, StreamingMatcher, apply_limits, detect_limit_exceeded,
+    max_rss_kb, output_digest
+)
+from app.services.worker_pool import WorkerPool, WorkerError
+
+LIMIT_MESSAGES = {
+    'cpu_time': "CPU time limit exceeded",
+    'memory': "Memory limit exceeded",
+    'file_size': "File size limit exceeded",
+    'output': "Output limit exceeded",
+    'killed': "Process was killed"
+}
+
+# Run by cold interpreters with -c: read the submission from stdin, point
+# stdin at /dev/null and execute it as __main__, hiding this frame from
+# tracebacks. Kept import-light so it adds nothing to interpreter startup.
+COLD_BOOTSTRAP = """\
+import os, sys
+source = sys.stdin.buffer.read().decode('utf-8')
+os.dup2(os.open(os.devnull, os.O_RDONLY), 0)
+try:
+    exec(compile(source, '<submission>', 'exec'), {'__name__': '__main__', '__builtins__': __builtins__})
+except SystemExit:
+    raise
+except BaseException:
+    etype, value, tb = sys.exc_info()
+    sys.excepthook(etype, value.with_traceback(tb.tb_next), tb.tb_next)
+    sys.exit(1)
+"""
 
 class CodeExecutionService:
-    def __init__(self, timeout=5):
+    def __init__(self, timeout=5, pool_size=4, max_jobs_per_worker=200,
+                 max_concurrency=None, max_parallel_cases=4,
+                 cpu_time_limit=None, memory_limit_mb=256, file_size_limit_kb=1024,
+                 output_limit_kb=1024):
         self.timeout = timeout
+        self.pool = None
+        self.pool_size = pool_size
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self._shutdown_registered = False
+        self.budget = ConcurrencyBudget(max_concurrency or os.cpu_count() or 1)
+        self.max_parallel_cases = max_parallel_cases
+        self.limits = self._build_limits(cpu_time_limit, memory_limit_mb, file_size_limit_kb, output_limit_kb)
+        self._configure_pool(pool_size, max_jobs_per_worker)
+
+    def init_app(self, app):
+        """Read execution settings from the Flask app config."""
+        self.timeout = app.config.get('EXECUTION_TIMEOUT', self.timeout)
+        self.budget.resize(app.config.get('EXECUTION_MAX_CONCURRENCY') or os.cpu_count() or 1)
+        self.max_parallel_cases = app.config.get('EXECUTION_MAX_PARALLEL_CASES', self.max_parallel_cases)
+        self.limits = self._build_limits(
+            app.config.get('EXECUTION_CPU_TIME_LIMIT'),
+            app.config.get('EXECUTION_MEMORY_LIMIT_MB', 256),
+            app.config.get('EXECUTION_FILE_SIZE_LIMIT_KB', 1024),
+            app.config.get('EXECUTION_OUTPUT_LIMIT_KB', 1024)
+        )
+        self._configure_pool(
+            app.config.get('EXECUTION_POOL_SIZE', self.pool_size),
+            app.config.get('EXECUTION_POOL_MAX_JOBS', self.max_jobs_per_worker)
+        )
+
+    def _build_limits(self, cpu_time_limit, memory_limit_mb, file_size_limit_kb, output_limit_kb):
+        """Resource limits applied to every child; 0 disables a limit."""
+        return {
+            "cpu_time": cpu_time_limit or self.timeout,
+            "memory": (memory_limit_mb or 0) * 1024 * 1024,
+            "file_size": (file_size_limit_kb or 0) * 1024,
+            "output": (output_limit_kb or 0) * 1024
+        }
+
+    def _limits_for(self, timeout):
+        """The resource limits, with the CPU limit cut to a call's effective timeout."""
+        limits = dict(self.limits)
+        limits['cpu_time'] = min(self.limits.get('cpu_time') or timeout, timeout)
+        return limits
+
+    def _configure_pool(self, pool_size, max_jobs_per_worker):
+        self.pool_size = pool_size
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self.shutdown_pool()
+
+        # Runner processes are started lazily on first use, so the pool
+        # is created in the serving process rather than the reloader
+        if pool_size > 0 and WorkerPool.supported():
+            self.pool = WorkerPool(pool_size, max_jobs_per_worker)
+            if not self._shutdown_registered:
+                # Registered once; shuts down whichever pool is current
+                atexit.register(self.shutdown_pool)
+                self._shutdown_registered = True
+
+    def shutdown_pool(self):
+        """Stop the warm pool's runners, if there is a pool."""
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
     
     def execute_python(self, code, input_data):
         """
@@ -19,46 +116,364 @@ class CodeExecutionService:
         Returns:
             dict: Execution result
         """
+        with self.budget.reserve(1):
+            if self.pool is not None:
+                return self._execute_in_pool(code, input_data)
+            return self._execute_cold(code, input_data)
+
+    def _execute_cold(self, code, input_data, expected=None, timeout=None):
+        """
+        Execute Python code in a freshly started interpreter.
+
+        The source is sent over the interpreter's stdin pipe rather than
+        written to a temporary file, so nothing is left to clean up.
+        """
+        started = time.monotonic()
+        limits = self._limits_for(timeout or self.timeout)
         try:
-            # Prepare the code file with input
-            with tempfile.NamedTemporaryFile(suffix='.py', mode='w', delete=False) as f:
-                f.write(code)
-                f.write(f"\n\nprint({input_data})")
-                temp_file = f.name
-            
             # Execute the code with timeout
-            result = subprocess.run(
-                ["python", temp_file],
-                capture_output=True,
-                text=True,
-                timeout=self.timeout
-            )
-            
-            # Clean up
-            os.unlink(temp_file)
-            
-            if result.returncode == 0:
+            with subprocess.Popen(
+                [sys.executable, '-c', COLD_BOOTSTRAP],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                preexec_fn=(lambda: apply_limits(limits)) if os.name == 'posix' else None
+            ) as process:
+                self._send_source(process, f"{code}\n\nprint({input_data})")
+                stdout, stderr, output_exceeded, matched, timed_out, usage = self._collect_output(
+                    process, expected, timeout)
+            # Includes interpreter start-up, unlike the runner's measurement
+            metrics = {"wall_time": round(time.monotonic() - started, 6)}
+            if usage is not None:
+                metrics['cpu_time'] = round(usage.ru_utime + usage.ru_stime, 6)
+                metrics['peak_rss_kb'] = max_rss_kb(usage)
+
+            if timed_out:
+                return dict(self._error_result("Execution timed out", transient=True), **metrics)
+            if output_exceeded:
+                limit = 'output'
+            else:
+                limit = detect_limit_exceeded(process.returncode, stderr, False, metrics.get('cpu_time'),
+                                              metrics.get('peak_rss_kb'), limits)
+            if limit:
+                error = self._error_result(LIMIT_MESSAGES[limit])
+                error['limit_exceeded'] = limit
+                return dict(error, **metrics)
+            elif process.returncode == 0:
                 return {
                     "success": True,
-                    "output": result.stdout.strip(),
-                    "error": None
+                    "output": expected if matched else stdout.strip(),
+                    "error": None,
+                    **metrics
                 }
             else:
                 return {
                     "success": False,
                     "output": None,
-                    "error": result.stderr.strip()
+                    "error": stderr.strip(),
+                    **metrics
                 }
                 
-        except subprocess.TimeoutExpired:
-            return {
-                "success": False,
-                "output": None,
-                "error": "Execution timed out"
-            }
         except Exception as e:
-            return {
-                "success": False,
-                "output": None,
-                "error": str(e)
-            }
\ No newline at end of file
+            return self._error_result(str(e), transient=True)
+
+    @staticmethod
+    def _send_source(process, source):
+        # The bootstrap reads the whole source before running it, so this
+        # cannot deadlock on a full pipe; a child that already died (e.g.
+        # on a resource limit) is reported through its exit status
+        try:
+            process.stdin.write(source.encode('utf-8'))
+        except BrokenPipeError:
+            pass
+        finally:
+            try:
+                process.stdin.close()
+            except BrokenPipeError:
+                pass
+
+    def _collect_output(self, process, expected=None, timeout=None):
+        """
+        Read a cold interpreter's stdout and stderr through bounded captures.
+
+        Readers run on threads, which also works where pipes cannot be
+        selected on. The process is killed as soon as its output passes the
+        output cap, or once it runs too long; with an expected output, stdout
+        is matched as it streams and only a preview of it is kept. Where
+        os.wait4 exists the process is reaped with it, so its own resource
+        usage is known even while other interpreters run on other threads.
+
+        Returns:
+            tuple: (stdout, stderr, output cap exceeded, matched or None,
+            timed out, rusage or None)
+        """
+        timeout = timeout or self.timeout
+        max_output = self.limits.get('output') or None
+        keep = max_output
+        matcher = None
+        if expected is not None:
+            keep = min(PREVIEW_BYTES, max_output or PREVIEW_BYTES)
+            matcher = StreamingMatcher(expected)
+        captures = (OutputCapture(keep), OutputCapture(max_output))
+        exceeded = threading.Event()
+        lock = threading.Lock()
+
+        def pump(stream, capture, stream_matcher):
+            for chunk in iter(lambda: stream.read1(READ_CHUNK), b''):
+                with lock:
+                    capture.feed(chunk)
+                    if stream_matcher is not None:
+                        stream_matcher.feed(chunk)
+                    over = max_output and sum(c.total for c in captures) > max_output
+                if over and not exceeded.is_set():
+                    exceeded.set()
+                    process.kill()
+
+        readers = [
+            threading.Thread(target=pump, args=(process.stdout, captures[0], matcher), daemon=True),
+            threading.Thread(target=pump, args=(process.stderr, captures[1], None), daemon=True)
+        ]
+        for reader in readers:
+            reader.start()
+        # Waiting on the readers (which finish at EOF) avoids the polling
+        # loop of Popen.wait(timeout), which adds milliseconds to every case
+        deadline = time.monotonic() + timeout
+        for reader in readers:
+            reader.join(max(0, deadline - time.monotonic()))
+        timed_out, usage = self._reap(process, deadline)
+        # Grandchildren may hold the pipes open, so never wait forever
+        for reader in readers:
+            reader.join(timeout)
+
+        return (
+            captures[0].text(),
+            captures[1].text(),
+            exceeded.is_set(),
+            matcher.finish() if matcher is not None else None,
+            timed_out,
+            usage
+        )
+
+    @staticmethod
+    def _reap(process, deadline):
+        """
+        Wait for a cold interpreter until deadline, killing it past that.
+
+        Returns:
+            tuple: (timed out, rusage of the process or None where os.wait4
+            does not exist)
+        """
+        if not hasattr(os, 'wait4'):
+            try:
+                process.wait(timeout=max(0, deadline - time.monotonic()))
+                return False, None
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+                return True, None
+
+        # Usually the process has exited by the time its pipes close
+        delay = 0.0005
+        while True:
+            pid, status, usage = os.wait4(process.pid, os.WNOHANG)
+            if pid:
+                process.returncode = os.waitstatus_to_exitcode(status)
+                return False, usage
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                process.kill()
+                _, status, usage = os.wait4(process.pid, 0)
+                process.returncode = os.waitstatus_to_exitcode(status)
+                return True, usage
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, 0.05)
+
+    def execute_python_batch(self, code, inputs, expected=None, max_failures=None, on_result=None,
+                             timeout=None):
+        """
+        Execute Python code against several inputs in one round-trip.
+
+        The code is compiled and loaded once; every input is then evaluated
+        in an isolated fork of the loaded program with its own timeout and
+        output capture. Cases run in parallel, using as many slots of the
+        service-wide concurrency budget as are free (up to
+        max_parallel_cases). Expected outputs stay in this process: warm
+        runners only report a digest of each case's output.
+
+        Args:
+            code (str): Python code to execute
+            inputs (list): Inputs to the code, one per test case
+            expected (list): Expected outputs, compared with each case's
+                output and needed for short-circuiting
+            max_failures (int): Stop starting cases after this many failed;
+                the remaining results come back with skipped=True
+            on_result (callable): Called with (index, result) as each case
+                finishes, in completion order; skipped cases are not reported
+            timeout (float): Seconds each case may run, e.g. an exercise's
+                derived time limit; defaults to the service timeout
+
+        Returns:
+            dict: "results" in the same order as inputs, plus the
+            submission's "wall_time" and summed "cpu_time" in seconds
+            (cpu_time is None when it could not be measured)
+        """
+        if not inputs:
+            return {"results": [], "wall_time": 0.0, "cpu_time": 0.0}
+
+        timeout = min(timeout or self.timeout, self.timeout)
+        started = time.monotonic()
+        with self.budget.reserve(min(len(inputs), self.max_parallel_cases)) as slots:
+            if self.pool is None:
+                # Without the warm pool, fan cold interpreters out over threads
+                results = self._execute_cold_batch(code, inputs, slots, expected, max_failures, on_result,
+                                                   timeout)
+                measured = [result for result in results if not result.get('skipped')]
+                cpu_time = None
+                if all('cpu_time' in result for result in measured):
+                    cpu_time = round(sum(result['cpu_time'] for result in measured), 6)
+                return {
+                    "results": results,
+                    "wall_time": round(time.monotonic() - started, 6),
+                    "cpu_time": cpu_time
+                }
+
+            # Short-circuiting needs every case as it finishes, to tell the
+            # runner when to stop
+            short_circuit = bool(max_failures) and expected is not None
+            job = {
+                "kind": "batch",
+                "code": code,
+                "inputs": list(inputs),
+                "timeout": timeout,
+                "parallelism": slots,
+                "digest": expected is not None,
+                "limits": self._limits_for(timeout),
+                "stream": on_result is not None or short_circuit
+            }
+            failures = [0]
+
+            def on_event(event):
+                index = event['index']
+                result = self._to_result(event['result'], expected[index] if expected is not None else None)
+                if on_result is not None:
+                    on_result(index, result)
+                if short_circuit and not (result['success'] and result['output'] == expected[index]):
+                    failures[0] += 1
+                return short_circuit and failures[0] >= max_failures
+
+            rounds = -(-len(inputs) // slots)
+            try:
+                response = self.pool.run(job, timeout * (rounds + 1) + 1,
+                                         on_event if job['stream'] else None)
+            except WorkerError as e:
+                response = {"results": [], "error": str(e)}
+
+        if 'results' not in response or len(response['results']) != len(inputs):
+            error = response.get('error') or response.get('stderr') or "Execution failed"
+            results = [self._error_result(error, transient=True) for _ in inputs]
+        else:
+            results = [self._to_result(raw, expected[i] if expected is not None else None)
+                       for i, raw in enumerate(response['results'])]
+
+        return {
+            "results": results,
+            "wall_time": round(time.monotonic() - started, 6),
+            "cpu_time": response.get('cpu_time')
+        }
+
+    def _execute_cold_batch(self, code, inputs, slots, expected, max_failures, on_result=None, timeout=None):
+        """
+        Run cold interpreters over threads, starting the next case as soon
+        as any running one finishes so no slot sits idle behind a slow case.
+        """
+        results = [None] * len(inputs)
+        failures = 0
+        next_index = 0
+        running = {}
+        with ThreadPoolExecutor(max_workers=slots) as executor:
+            while True:
+                stopped = max_failures and expected is not None and failures >= max_failures
+                while not stopped and next_index < len(inputs) and len(running) < slots:
+                    future = executor.submit(self._execute_cold, code, inputs[next_index],
+                                             expected[next_index] if expected is not None else None, timeout)
+                    running[future] = next_index
+                    next_index += 1
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index = running.pop(future)
+                    result = results[index] = future.result()
+                    if on_result is not None:
+                        on_result(index, result)
+                    if expected is not None and not (result['success'] and result['output'] == expected[index]):
+                        failures += 1
+        # Cases never started once max_failures was reached
+        return [result if result is not None else self._skipped_result() for result in results]
+
+    def _execute_in_pool(self, code, input_data):
+        """Execute Python code in a child forked from a warm runner."""
+        job = {
+            "kind": "source",
+            "source": f"{code}\n\nprint({input_data})",
+            "timeout": self.timeout,
+            "limits": self._limits_for(self.timeout)
+        }
+        try:
+            return self._to_result(self.pool.run(job, self.timeout))
+        except WorkerError as e:
+            return self._error_result(str(e), transient=True)
+
+    @staticmethod
+    def _error_result(error, transient=False):
+        # Transient errors (timeouts, runner failures) may not recur on a
+        # retry, so callers must not treat them as a stable verdict
+        result = {
+            "success": False,
+            "output": None,
+            "error": error
+        }
+        if transient:
+            result['transient'] = True
+        return result
+
+    @staticmethod
+    def _skipped_result():
+        return {
+            "success": False,
+            "output": None,
+            "error": None,
+            "skipped": True
+        }
+
+    def _to_result(self, raw, expected=None):
+        """
+        Convert a raw runner response into an execution result.
+
+        A case with a stdout digest only carries a preview of its stdout;
+        when the digest is that of the expected output, its output is the
+        expected output itself.
+        """
+        if raw.get('skipped'):
+            return self._skipped_result()
+        elif raw['timed_out']:
+            result = self._error_result("Execution timed out", transient=True)
+        elif raw.get('limit_exceeded'):
+            result = self._error_result(LIMIT_MESSAGES[raw['limit_exceeded']])
+            result['limit_exceeded'] = raw['limit_exceeded']
+        elif raw['returncode'] == 0:
+            matched = expected is not None and raw.get('stdout_digest') == output_digest(expected)
+            result = {
+                "success": True,
+                "output": expected if matched else raw['stdout'].strip(),
+                "error": None
+            }
+        else:
+            result = self._error_result(raw['stderr'].strip())
+
+        # Resource usage measured by the runner (wait4 rusage)
+        if 'cpu_time' in raw:
+            result['cpu_time'] = raw['cpu_time']
+            result['wall_time'] = raw['wall_time']
+            result['peak_rss_kb'] = raw.get('peak_rss_kb')
+        return result
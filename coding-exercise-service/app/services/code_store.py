@@ -0,0 +1,169 @@
+import hashlib
+from collections import Counter
+from datetime import datetime
+from pymongo import UpdateOne
+
+
+def hash_code(code):
+    """Content hash of submitted source, exactly as submitted."""
+    return hashlib.sha256(code.encode('utf-8')).hexdigest()
+
+
+class CodeStore:
+    """
+    Content-addressed, reference-counted storage of submitted code.
+
+    Each distinct source is stored once in the code_blobs collection under
+    its SHA-256; submissions keep only code_hash. Blobs are written (and
+    their reference counts raised) before the submissions referencing them,
+    so a failure in between can only over-count, never leave a submission
+    pointing at nothing; recount_refs restores exact counts.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def store_submissions(self, submissions):
+        """
+        Move the code of submission documents into blobs.
+
+        Documents still holding "code" get "code_hash" and "code_size"
+        instead; the blobs for the whole batch are upserted with one bulk
+        write. Documents already converted are skipped, so retrying a
+        batch does not count its references twice.
+
+        Args:
+            submissions (list): Submission documents, modified in place
+        """
+        pending = [submission for submission in submissions if 'code' in submission]
+        if not pending:
+            return
+        refs = Counter()
+        blobs = {}
+        for submission in pending:
+            code_hash = hash_code(submission['code'])
+            refs[code_hash] += 1
+            blobs[code_hash] = submission['code']
+        self._add(blobs, refs)
+        for submission in pending:
+            code = submission.pop('code')
+            submission['code_hash'] = hash_code(code)
+            submission['code_size'] = len(code.encode('utf-8'))
+
+    def _add(self, blobs, refs):
+        now = datetime.utcnow()
+        self.collection().bulk_write([
+            UpdateOne(
+                {'_id': code_hash},
+                {
+                    '$inc': {'refs': refs[code_hash]},
+                    '$setOnInsert': {'code': code, 'size': len(code.encode('utf-8')), 'created_at': now}
+                },
+                upsert=True
+            )
+            for code_hash, code in blobs.items()
+        ], ordered=False)
+
+    def get(self, code_hash):
+        """Return the source stored under code_hash, or None."""
+        blob = self.collection().find_one({'_id': code_hash}, {'code': 1})
+        return blob['code'] if blob else None
+
+    def get_many(self, code_hashes):
+        """Return {code_hash: source} for the blobs that exist."""
+        return {
+            blob['_id']: blob['code']
+            for blob in self.collection().find({'_id': {'$in': list(set(code_hashes))}}, {'code': 1})
+        }
+
+    def release(self, code_hashes):
+        """
+        Drop one reference per hash (repeat a hash to drop several), e.g.
+        when submissions are deleted; blobs left unreferenced are removed.
+        """
+        refs = Counter(code_hashes)
+        if not refs:
+            return
+        self.collection().bulk_write([
+            UpdateOne({'_id': code_hash}, {'$inc': {'refs': -count}})
+            for code_hash, count in refs.items()
+        ], ordered=False)
+        self.collection().delete_many({'_id': {'$in': list(refs)}, 'refs': {'$lte': 0}})
+
+
+def compact_submissions(db, store, batch_size=1000):
+    """
+    Move the code of existing submissions into blobs.
+
+    Submissions still holding "code" are read in _id order, one batch at a
+    time, so the collection is never scanned into memory and an interrupted
+    run resumes where it stopped.
+
+    Returns:
+        dict: Submissions "compacted", distinct "blobs" touched and the
+        "bytes_before" / "bytes_after" of inline code this removed
+    """
+    summary = {"compacted": 0, "blobs": 0, "bytes_before": 0, "bytes_after": 0}
+    seen = set()
+    last_id = None
+    while True:
+        query = {'code': {'$exists': True}}
+        if last_id is not None:
+            query['_id'] = {'$gt': last_id}
+        batch = list(db.submissions.find(query, {'code': 1}).sort('_id', 1).limit(batch_size))
+        if not batch:
+            break
+        last_id = batch[-1]['_id']
+
+        store.store_submissions(batch)
+        db.submissions.bulk_write([
+            UpdateOne(
+                {'_id': submission['_id']},
+                {'$set': {'code_hash': submission['code_hash'], 'code_size': submission['code_size']},
+                 '$unset': {'code': ''}}
+            )
+            for submission in batch
+        ], ordered=False)
+
+        for submission in batch:
+            summary['bytes_before'] += submission['code_size']
+            if submission['code_hash'] not in seen:
+                seen.add(submission['code_hash'])
+                summary['bytes_after'] += submission['code_size']
+        summary['compacted'] += len(batch)
+    summary['blobs'] = len(seen)
+    return summary
+
+
+def recount_refs(db, batch_size=1000):
+    """
+    Recompute every blob's reference count from the submissions and
+    delete blobs no submission references. Meant to run while no
+    submissions are being written; blobs created after it started are
+    never deleted.
+
+    Returns:
+        dict: Blobs "updated" and "deleted"
+    """
+    started = datetime.utcnow()
+    counts = db.submissions.aggregate([
+        {'$match': {'code_hash': {'$exists': True}}},
+        {'$group': {'_id': '$code_hash', 'refs': {'$sum': 1}}}
+    ], allowDiskUse=True)
+
+    updated = 0
+    updates = []
+    for count in counts:
+        updates.append(UpdateOne({'_id': count['_id']}, {'$set': {'refs': count['refs'], 'checked': True}}))
+        if len(updates) >= batch_size:
+            db.code_blobs.bulk_write(updates, ordered=False)
+            updated += len(updates)
+            updates = []
+    if updates:
+        db.code_blobs.bulk_write(updates, ordered=False)
+        updated += len(updates)
+
+    # Blobs not marked above have no submission left
+    deleted = db.code_blobs.delete_many({'checked': {'$ne': True}, 'created_at': {'$lt': started}}).deleted_count
+    db.code_blobs.update_many({'checked': True}, {'$unset': {'checked': ''}})
+    return {"updated": updated, "deleted": deleted}
@@ -0,0 +1,51 @@
+import threading
+from contextlib import contextmanager
+
+
+class ConcurrencyBudget:
+    """
+    Service-wide limit on how many test cases may execute at once.
+
+    A submission asks for up to N slots and is granted however many are
+    free (at least one, waiting if none are), so one large submission can
+    use idle cores without starving everyone else.
+    """
+
+    def __init__(self, total):
+        self.total = max(1, total)
+        self.in_use = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, wanted):
+        """
+        Block until at least one slot is free and take up to wanted slots.
+
+        Returns:
+            int: Number of slots granted
+        """
+        wanted = max(1, min(wanted, self.total))
+        with self._condition:
+            while self.in_use >= self.total:
+                self._condition.wait()
+            granted = min(wanted, self.total - self.in_use)
+            self.in_use += granted
+            return granted
+
+    def release(self, slots):
+        with self._condition:
+            self.in_use -= slots
+            self._condition.notify_all()
+
+    def resize(self, total):
+        with self._condition:
+            self.total = max(1, total)
+            self._condition.notify_all()
+
+    @contextmanager
+    def reserve(self, wanted):
+        """Context manager around acquire/release yielding the slot count."""
+        slots = self.acquire(wanted)
+        try:
+            yield slots
+        finally:
+            self.release(slots)
@@ -0,0 +1,142 @@
+import threading
+import time
+from collections import OrderedDict
+from bson.objectid import ObjectId
+
+
+def public_projection(exercise, resolve=None):
+    """
+    The exercise as shown to students: no solution code or reference
+    validation and only the test cases explicitly marked is_hidden=False,
+    with a string _id.
+
+    Visible test cases stored out of line are loaded with resolve (see
+    TestCaseStore.resolve), so students see their input and expected
+    output rather than blob references.
+    """
+    public = {key: value for key, value in exercise.items() if key not in ('solution_code', 'validation')}
+    public['_id'] = str(exercise['_id'])
+    visible = [tc for tc in exercise.get('test_cases', []) if tc.get('is_hidden') is False]
+    if resolve is not None:
+        visible = [{key: value for key, value in tc.items() if key != 'out_of_line'} for tc in resolve(visible)]
+    public['test_cases'] = visible
+    return public
+
+
+class ExerciseCache:
+    """
+    Read-through cache of exercise documents with TTL and LRU eviction.
+
+    Each entry holds the full document (used for judging) and its public
+    projection, computed once when the document is loaded. Documents are
+    shared between requests and must be treated as read-only. Writers call
+    invalidate; the TTL bounds staleness across service processes, which
+    each keep their own cache.
+    """
+
+    def __init__(self, loader, ttl=60, max_entries=1000, resolve=None):
+        self.loader = loader
+        self.resolve = resolve
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._stats = {"hits": 0, "misses": 0, "expirations": 0, "evictions": 0, "invalidations": 0}
+
+    def init_app(self, app):
+        self.ttl = app.config.get('EXERCISE_CACHE_TTL', self.ttl)
+        self.max_entries = app.config.get('EXERCISE_CACHE_SIZE', self.max_entries)
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0 and self.ttl > 0
+
+    def get(self, exercise_id):
+        """
+        Return the full exercise document, loading it on a miss.
+
+        Args:
+            exercise_id (str|ObjectId): Exercise ID
+
+        Returns:
+            dict: Exercise document, or None if it does not exist
+
+        Raises:
+            bson.errors.InvalidId: If exercise_id is not a valid ObjectId
+        """
+        entry = self._entry(exercise_id)
+        return entry['document'] if entry else None
+
+    def get_public(self, exercise_id):
+        """Return the exercise's public projection, or None if it does not exist."""
+        entry = self._entry(exercise_id)
+        return entry['public'] if entry else None
+
+    def _entry(self, exercise_id):
+        object_id = ObjectId(exercise_id)
+        key = str(object_id)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry['expires_at'] <= time.monotonic():
+                del self._entries[key]
+                self._stats['expirations'] += 1
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._stats['hits'] += 1
+                return entry
+            self._stats['misses'] += 1
+            generation = self._generation
+
+        # Load outside the lock so a slow query does not block other hits;
+        # concurrent misses for one exercise may both load it
+        document = self.loader(object_id)
+        if document is None:
+            return None
+        entry = {
+            "document": document,
+            "public": public_projection(document, self.resolve),
+            "expires_at": time.monotonic() + self.ttl
+        }
+
+        if self.enabled:
+            with self._lock:
+                # A write that landed while loading may have made this copy stale
+                if generation != self._generation:
+                    return entry
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self._stats['evictions'] += 1
+        return entry
+
+    def invalidate(self, exercise_id):
+        """Drop an exercise so the next read loads it again."""
+        with self._lock:
+            self._generation += 1
+            if self._entries.pop(str(exercise_id), None) is not None:
+                self._stats['invalidations'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._stats['invalidations'] += len(self._entries)
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self._stats['hits'] + self._stats['misses']
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self._stats['hits'],
+                "misses": self._stats['misses'],
+                "hit_ratio": round(self._stats['hits'] / lookups, 4) if lookups else None,
+                "expirations": self._stats['expirations'],
+                "evictions": self._stats['evictions'],
+                "invalidations": self._stats['invalidations']
+            }
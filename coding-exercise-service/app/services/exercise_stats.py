@@ -0,0 +1,243 @@
+from collections import Counter, defaultdict
+from datetime import datetime
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+# Attempts-to-solve histogram buckets; the last one also counts anything above
+MAX_ATTEMPTS_BUCKET = 10
+
+# MongoDB's duplicate key error code
+DUPLICATE_KEY = 11000
+
+
+def _progress_update(before, group):
+    """
+    Fold one user's submissions to one exercise into their progress.
+
+    Args:
+        before (dict): The exercise_progress document read, or None
+        group (list): The submissions, in submission order
+
+    Returns:
+        tuple: (the exercise_stats increments, whether the user solved the
+        exercise for the first time, the progress document update)
+    """
+    counts = Counter()
+    attempts = (before or {}).get('attempts', 0)
+    passed_before = bool(before and before.get('passed'))
+    passed_at = None
+    for submission in group:
+        passed = bool(submission.get('passed_all'))
+        attempts += 1
+        counts['attempts'] += 1
+        counts['passes'] += passed
+        if submission.get('compile_error'):
+            counts['compile_errors'] += 1
+        if attempts == 1:
+            counts['distinct_users'] += 1
+            counts['first_attempt_passes'] += passed
+        if passed and not passed_before:
+            counts['solved_users'] += 1
+            counts[f'attempts_to_solve.{min(attempts, MAX_ATTEMPTS_BUCKET)}'] += 1
+            passed_before = True
+            passed_at = submission['submitted_at']
+        for result in submission.get('results', []):
+            if not result.get('passed') and not result.get('skipped'):
+                counts[f"test_case_failures.{result['test_case_id']}"] += 1
+
+    update = {
+        '$inc': {'attempts': len(group)},
+        '$max': {'passed': passed_before},
+        '$set': {'last_submitted_at': group[-1]['submitted_at'], 'last_submission_id': group[-1]['_id']},
+        '$setOnInsert': {'first_submitted_at': group[0]['submitted_at']}
+    }
+    if passed_at is not None:
+        update['$min'] = {'passed_at': passed_at}
+    return counts, passed_at is not None, update
+
+
+def record_submission_stats(db, submissions, emit_events=True, max_attempts=5):
+    """
+    Fold newly written submissions into the materialized statistics.
+
+    The batch's submissions are grouped by user and exercise. The progress
+    documents of every pair are read with one query, each pair's new
+    progress and statistics increments are worked out from what was read,
+    and the progress updates go out in one bulk write, followed by one for
+    every exercise's increments.
+
+    Each progress document records the _id of the last submission folded
+    into it, which makes this safe to call again with the same batch: a
+    pair whose recorded submission is in the batch was applied already and
+    is skipped. The update of a pair is conditional on that _id not having
+    changed since it was read; pairs another writer updated in between are
+    read and folded again (up to max_attempts times).
+
+    Users who solved an exercise for the first time get a user_events
+    entry, which tells the recommendation service to drop their cached
+    exercise recommendations.
+
+    Args:
+        db: Database handle
+        submissions (list): Submission documents, in submission order
+        emit_events (bool): Record user_events for new solves
+        max_attempts (int): Times a pair is read and folded before giving up
+
+    Raises:
+        pymongo.errors.BulkWriteError: If a progress update failed for any
+            reason other than a concurrent update
+        RuntimeError: If some pairs were still being updated concurrently
+            after max_attempts; either only once every other pair has
+            been applied
+    """
+    groups = defaultdict(list)
+    for submission in submissions:
+        groups[(submission['user_id'], submission['exercise_id'])].append(submission)
+
+    increments = defaultdict(Counter)
+    solved_by = set()
+    write_error = None
+    pending = list(groups)
+    for _ in range(max_attempts):
+        if not pending:
+            break
+        progress = {
+            (document['user_id'], document['exercise_id']): document
+            for document in db.exercise_progress.find(
+                {'$or': [{'user_id': user_id, 'exercise_id': exercise_id} for user_id, exercise_id in pending]},
+                {'user_id': 1, 'exercise_id': 1, 'attempts': 1, 'passed': 1, 'last_submission_id': 1}
+            )
+        }
+
+        operations, folded = [], []
+        for key in pending:
+            before = progress.get(key)
+            group = groups[key]
+            if before is not None and before.get('last_submission_id') in {s['_id'] for s in group}:
+                continue
+            counts, solved, update = _progress_update(before, group)
+            operations.append(UpdateOne(
+                {'user_id': key[0], 'exercise_id': key[1],
+                 'last_submission_id': (before or {}).get('last_submission_id')},
+                update,
+                upsert=True
+            ))
+            folded.append((key, counts, solved))
+        pending = []
+        if not operations:
+            break
+
+        # A pair changed since it was read matches nothing, so the upsert
+        # runs into the unique (user_id, exercise_id) index
+        conflicts, failed = set(), set()
+        try:
+            db.exercise_progress.bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            for error in e.details.get('writeErrors', []):
+                (conflicts if error.get('code') == DUPLICATE_KEY else failed).add(error['index'])
+            if failed:
+                write_error = e
+
+        for i, (key, counts, solved) in enumerate(folded):
+            if i in conflicts:
+                pending.append(key)
+                continue
+            if i in failed:
+                continue
+            increments[key[1]].update(counts)
+            if solved:
+                solved_by.add(key[0])
+
+    # The increments of every pair that was written are applied, whatever
+    # happened to the others
+    if increments:
+        _apply_increments(db, increments, solved_by, emit_events)
+    if write_error is not None:
+        raise write_error
+    if pending:
+        raise RuntimeError(f"Progress of {len(pending)} user/exercise pairs kept changing while being updated")
+
+
+def _apply_increments(db, increments, solved_by, emit_events):
+    now = datetime.utcnow()
+    if emit_events and solved_by:
+        db.user_events.insert_many([
+            {'user_id': user_id, 'source': 'exercise_progress', 'at': now}
+            for user_id in solved_by
+        ], ordered=False)
+    db.exercise_stats.bulk_write([
+        UpdateOne({'_id': exercise_id}, {'$inc': dict(counts), '$set': {'updated_at': now}}, upsert=True)
+        for exercise_id, counts in increments.items()
+    ], ordered=False)
+
+
+def _median_bucket(histogram):
+    total = sum(histogram.values())
+    if not total:
+        return None
+    seen = 0
+    for bucket in sorted(histogram, key=int):
+        seen += histogram[bucket]
+        if seen * 2 >= total:
+            return int(bucket)
+    return None
+
+
+def summarize_exercise_stats(stats):
+    """
+    Derive the public statistics from an exercise_stats document.
+
+    Args:
+        stats (dict): exercise_stats document, or None if no submission
+            was recorded yet
+
+    Returns:
+        dict: Counters plus pass rate, first-attempt pass rate, median
+        attempts to solve and failure counts per test case
+    """
+    stats = stats or {}
+    attempts = stats.get('attempts', 0)
+    distinct_users = stats.get('distinct_users', 0)
+    failures = stats.get('test_case_failures', {})
+    return {
+        "attempts": attempts,
+        "passes": stats.get('passes', 0),
+        "distinct_users": distinct_users,
+        "solved_users": stats.get('solved_users', 0),
+        "compile_errors": stats.get('compile_errors', 0),
+        "pass_rate": round(stats.get('passes', 0) / attempts, 4) if attempts else None,
+        "first_pass_rate": round(stats.get('first_attempt_passes', 0) / distinct_users, 4) if distinct_users else None,
+        "median_attempts_to_solve": _median_bucket(stats.get('attempts_to_solve', {})),
+        "attempts_to_solve": stats.get('attempts_to_solve', {}),
+        "test_case_failures": {i: failures[i] for i in sorted(failures, key=int)},
+        "updated_at": stats.get('updated_at')
+    }
+
+
+def rebuild_exercise_stats(db, batch_size=1000):
+    """
+    Recompute every statistic from the submissions collection.
+
+    Clears exercise_stats and exercise_progress, then streams submissions
+    in submission order through record_submission_stats in batches.
+
+    Returns:
+        int: Number of submissions replayed
+    """
+    db.exercise_stats.delete_many({})
+    db.exercise_progress.delete_many({})
+
+    count = 0
+    batch = []
+    projection = {'user_id': 1, 'exercise_id': 1, 'passed_all': 1, 'compile_error': 1,
+                  'submitted_at': 1, 'results.test_case_id': 1, 'results.passed': 1, 'results.skipped': 1}
+    for submission in db.submissions.find({}, projection).sort('submitted_at', 1).batch_size(batch_size):
+        batch.append(submission)
+        if len(batch) >= batch_size:
+            record_submission_stats(db, batch, emit_events=False)
+            count += len(batch)
+            batch = []
+    if batch:
+        record_submission_stats(db, batch, emit_events=False)
+        count += len(batch)
+    return count
@@ -0,0 +1,270 @@
+import json
+import math
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pymongo import UpdateOne
+from app import code_executor, exercise_cache, verdict_cache, test_case_store
+from app.models.exercise import create_exercise_document, validate_max_failures
+
+REQUIRED_FIELDS = ('title', 'description', 'difficulty', 'topic')
+
+# Errors kept in an ingest summary; the counters keep counting past it
+MAX_REPORTED_ERRORS = 100
+
+
+def derive_time_limit(runtimes, factor=3.0, minimum=1.0, maximum=None):
+    """
+    Derive a per-test-case time limit from reference runtimes.
+
+    The slowest reference case times factor, rounded up to a tenth of a
+    second and kept within [minimum, maximum]. Runtimes are CPU times:
+    a cold interpreter's wall time includes its start-up, which submissions
+    judged on the warm pool never pay, while the CPU the solution itself
+    spends is the same on either path (start-up costs a few milliseconds of
+    it, well within the rounding).
+
+    Args:
+        runtimes (list): CPU times of the reference solution in seconds
+        factor (float): Headroom over the reference solution
+        minimum (float): Lowest limit handed out, so start-up jitter never
+            fails a correct submission
+        maximum (float): Highest limit, normally the service timeout
+
+    Returns:
+        float: Time limit in seconds, or None without runtimes
+    """
+    if not runtimes:
+        return None
+    limit = max(math.ceil(max(runtimes) * factor * 10) / 10, minimum)
+    if maximum:
+        limit = min(limit, maximum)
+    return limit
+
+
+def validate_exercise(exercise, factor=3.0, minimum=1.0):
+    """
+    Run an exercise's reference Python solution against all of its test cases.
+
+    Cases run in parallel through the execution service, under the service
+    timeout rather than the exercise's current time limit.
+
+    Args:
+        exercise (dict): Exercise document with solution_code and test_cases
+        factor (float): See derive_time_limit
+        minimum (float): See derive_time_limit
+
+    Returns:
+        dict: "status" ("passed", "failed", "no_solution" or
+        "no_test_cases"), per-case "cases" with the reference runtimes,
+        "failed_cases", the slowest reference CPU time ("reference_time")
+        and the derived "time_limit" (None unless every case passed with a
+        measured CPU time)
+    """
+    solution = (exercise.get('solution_code') or {}).get('python')
+    test_cases = test_case_store.resolve(exercise.get('test_cases', []))
+    validation = {
+        "status": "passed",
+        "validated_at": datetime.utcnow(),
+        "cases": [],
+        "failed_cases": [],
+        "reference_time": None,
+        "time_limit": None
+    }
+    if not solution:
+        validation['status'] = "no_solution"
+        return validation
+    if not test_cases:
+        validation['status'] = "no_test_cases"
+        return validation
+
+    execution = code_executor.execute_python_batch(
+        solution,
+        [test_case['input'] for test_case in test_cases],
+        expected=[test_case['expected_output'] for test_case in test_cases]
+    )
+
+    for i, (test_case, result) in enumerate(zip(test_cases, execution['results'])):
+        passed = result['success'] and result['output'] == test_case['expected_output']
+        case = {
+            "test_case_id": i,
+            "passed": passed,
+            "wall_time": result.get('wall_time'),
+            "cpu_time": result.get('cpu_time')
+        }
+        if not passed:
+            case['error'] = result['error'] or f"Expected {test_case['expected_output']!r}, got {result['output']!r}"
+            validation['failed_cases'].append(i)
+        validation['cases'].append(case)
+
+    runtimes = [case['cpu_time'] for case in validation['cases'] if case['cpu_time'] is not None]
+    if runtimes:
+        validation['reference_time'] = max(runtimes)
+    if validation['failed_cases']:
+        validation['status'] = "failed"
+    elif len(runtimes) == len(test_cases):
+        validation['time_limit'] = derive_time_limit(runtimes, factor, minimum, code_executor.timeout)
+    return validation
+
+
+def validation_update(validation):
+    """
+    The update storing a validation on its exercise.
+
+    A derived time limit replaces the exercise's time_limit; a failed
+    validation leaves the current one in place.
+    """
+    fields = {'validation': validation}
+    if validation['time_limit'] is not None:
+        fields['time_limit'] = validation['time_limit']
+    return {'$set': fields}
+
+
+def save_validation(db, exercise_id, validation):
+    """Store a validation on its exercise and drop the cached copies."""
+    db.exercises.update_one({'_id': exercise_id}, validation_update(validation))
+    exercise_cache.invalidate(exercise_id)
+    verdict_cache.invalidate_exercise(exercise_id)
+
+
+def validate_exercises(db, query=None, batch_size=100, workers=4, factor=3.0, minimum=1.0):
+    """
+    Validate every exercise matching query and store the results.
+
+    Exercises are streamed from the database in batches; each batch is
+    validated on a thread pool (the execution service's concurrency budget
+    bounds how many cases actually run at once) and written back with one
+    bulk write.
+
+    Returns:
+        dict: Counts of exercises per validation status
+    """
+    counts = {}
+    batch = []
+    projection = {'solution_code.python': 1, 'test_cases': 1}
+
+    def flush():
+        validations = list(executor.map(lambda exercise: validate_exercise(exercise, factor, minimum), batch))
+        db.exercises.bulk_write([
+            UpdateOne({'_id': exercise['_id']}, validation_update(validation))
+            for exercise, validation in zip(batch, validations)
+        ], ordered=False)
+        for exercise, validation in zip(batch, validations):
+            exercise_cache.invalidate(exercise['_id'])
+            verdict_cache.invalidate_exercise(exercise['_id'])
+            counts[validation['status']] = counts.get(validation['status'], 0) + 1
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for exercise in db.exercises.find(query or {}, projection).batch_size(batch_size):
+            batch.append(exercise)
+            if len(batch) >= batch_size:
+                flush()
+                batch = []
+        if batch:
+            flush()
+    return counts
+
+
+def _exercise_from_record(record):
+    if not isinstance(record, dict):
+        raise ValueError("Expected a JSON object")
+    missing = [field for field in REQUIRED_FIELDS if field not in record]
+    if missing:
+        raise ValueError(f"Missing required fields: {', '.join(missing)}")
+    return create_exercise_document(
+        title=record['title'],
+        description=record['description'],
+        difficulty=record['difficulty'],
+        topic=record['topic'],
+        test_cases=record.get('test_cases', []),
+        starter_code=record.get('starter_code', {}),
+        solution_code=record.get('solution_code', {}),
+        hints=record.get('hints', []),
+        max_failures=validate_max_failures(record.get('max_failures'))
+    )
+
+
+def ingest_exercises(db, lines, batch_size=100, workers=4, validate=True, reject_failed=False,
+                     factor=3.0, minimum=1.0):
+    """
+    Insert new exercises from a stream of NDJSON lines.
+
+    Each line holds one exercise with the fields accepted by
+    POST /api/exercises/. Lines are parsed as they are read and inserted
+    with unordered insert_many once batch_size exercises are waiting, so
+    the input never has to fit in memory. With validate, each batch's
+    reference solutions are run first (in parallel) and the validation and
+    derived time limit are stored with the exercise.
+
+    Args:
+        db: Database handle
+        lines (iterable): NDJSON lines, e.g. an open file or sys.stdin
+        batch_size (int): Exercises per insert_many
+        workers (int): Exercises validated at once
+        validate (bool): Run the reference solutions before inserting
+        reject_failed (bool): Skip exercises whose validation did not pass
+        factor (float): See derive_time_limit
+        minimum (float): See derive_time_limit
+
+    Returns:
+        dict: Counts of lines "read", exercises "inserted", "invalid" lines,
+        "rejected" exercises and "failed" inserts, plus the first
+        MAX_REPORTED_ERRORS "errors" with their line numbers
+    """
+    summary = {"read": 0, "inserted": 0, "invalid": 0, "rejected": 0, "failed": 0, "errors": []}
+    batch = []
+
+    def error(line_number, message):
+        if len(summary['errors']) < MAX_REPORTED_ERRORS:
+            summary['errors'].append({"line": line_number, "error": message})
+
+    def flush():
+        if validate:
+            validations = executor.map(lambda item: validate_exercise(item[1], factor, minimum), batch)
+            accepted = []
+            for (line_number, exercise), validation in zip(batch, validations):
+                if reject_failed and validation['status'] != "passed":
+                    summary['rejected'] += 1
+                    error(line_number, f"Validation {validation['status']}: failed cases {validation['failed_cases']}")
+                    continue
+                exercise['validation'] = validation
+                if validation['time_limit'] is not None:
+                    exercise['time_limit'] = validation['time_limit']
+                accepted.append((line_number, exercise))
+        else:
+            accepted = batch
+        if not accepted:
+            return
+        for _, exercise in accepted:
+            exercise['test_cases'] = test_case_store.externalize(exercise['test_cases'])
+        try:
+            db.exercises.insert_many([exercise for _, exercise in accepted], ordered=False)
+            summary['inserted'] += len(accepted)
+        except Exception as e:
+            # Unordered bulk errors report which documents failed; the rest
+            # were inserted
+            details = getattr(e, 'details', None) or {}
+            write_errors = details.get('writeErrors')
+            if write_errors is None:
+                write_errors = [{"index": i, "errmsg": str(e)} for i in range(len(accepted))]
+            summary['inserted'] += len(accepted) - len(write_errors)
+            summary['failed'] += len(write_errors)
+            for write_error in write_errors:
+                error(accepted[write_error['index']][0], write_error.get('errmsg', "Insert failed"))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for line_number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            summary['read'] += 1
+            try:
+                batch.append((line_number, _exercise_from_record(json.loads(line))))
+            except ValueError as e:
+                summary['invalid'] += 1
+                error(line_number, str(e))
+                continue
+            if len(batch) >= batch_size:
+                flush()
+                batch = []
+        if batch:
+            flush()
+    return summary
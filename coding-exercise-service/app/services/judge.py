@@ -0,0 +1,232 @@
+import traceback
+from bson.objectid import ObjectId
+from datetime import datetime
+from app import code_executor, verdict_cache, submission_recorder, test_case_store
+from app.models.exercise import validate_max_failures
+from app.services.test_case_store import preview
+
+SUPPORTED_LANGUAGES = ('python',)
+
+def is_supported_language(language):
+    return language.lower() in SUPPORTED_LANGUAGES
+
+def resolve_max_failures(request_data, exercise):
+    """
+    Work out how many failed test cases end judging early.
+
+    A per-request "fail_fast" or "max_failures" wins over the exercise's
+    own "max_failures". None means every test case is run.
+
+    Raises:
+        ValueError: If the value in effect is not a positive integer
+    """
+    if request_data.get('fail_fast'):
+        return 1
+    if 'max_failures' in request_data:
+        return validate_max_failures(request_data['max_failures'])
+    return validate_max_failures(exercise.get('max_failures'), "The exercise's max_failures")
+
+def check_syntax(code):
+    """
+    Compile the code without running it.
+
+    Returns:
+        str: The syntax error message, or None if the code compiles
+    """
+    try:
+        compile(code, '<submission>', 'exec')
+        return None
+    except (SyntaxError, ValueError, RecursionError, MemoryError) as e:
+        return ''.join(traceback.format_exception_only(type(e), e)).strip()
+
+def _compile_error_judgement(exercise, error):
+    # The first case carries the error; the rest are skipped, as no
+    # process is ever started for code that does not compile
+    results = []
+    for i, test_case in enumerate(exercise['test_cases']):
+        result = {
+            "test_case_id": i,
+            "passed": False,
+            "hidden": test_case.get('is_hidden', False)
+        }
+        if i == 0:
+            result['error'] = error
+        else:
+            result['skipped'] = True
+        results.append(result)
+
+    return {
+        "results": results,
+        "timing": {"wall_time": 0.0, "cpu_time": 0.0},
+        "cached": False,
+        "compile_error": error
+    }
+
+def _test_case_result(i, test_case, result):
+    """Turn one execution result into the stored per-test-case result."""
+    if result.get('skipped'):
+        return {
+            "test_case_id": i,
+            "passed": False,
+            "skipped": True,
+            "hidden": test_case.get('is_hidden', False)
+        }
+    elif result['success']:
+        passed = result['output'] == test_case['expected_output']
+        case_result = {
+            "test_case_id": i,
+            "passed": passed,
+            "expected": test_case['expected_output'],
+            "actual": result['output'],
+            "hidden": test_case.get('is_hidden', False)
+        }
+        # Large payloads stay out of the submission document too
+        if test_case.get('out_of_line'):
+            case_result['expected'] = preview(case_result['expected'], test_case_store.inline_limit)
+            case_result['actual'] = preview(case_result['actual'], test_case_store.inline_limit)
+    else:
+        case_result = {
+            "test_case_id": i,
+            "passed": False,
+            "error": result['error'],
+            "hidden": test_case.get('is_hidden', False)
+        }
+        if result.get('limit_exceeded'):
+            case_result['limit_exceeded'] = result['limit_exceeded']
+
+    # Keep per-case resource usage for leaderboards and capacity planning
+    for metric in ('wall_time', 'cpu_time', 'peak_rss_kb'):
+        if metric in result:
+            case_result[metric] = result[metric]
+    return case_result
+
+def _report_all(judgement, on_case):
+    # Verdicts that need no execution are reported all at once, in order
+    if on_case is not None:
+        for result in judgement['results']:
+            if not result.get('skipped'):
+                on_case(result)
+
+def judge_code(exercise, language, code, max_failures=None, on_case=None):
+    """
+    Run submitted code against every test case of an exercise.
+
+    Args:
+        exercise (dict): Exercise document including its test cases
+        language (str): Language of the submission
+        code (str): Submitted source code
+        max_failures (int): Stop after this many failed test cases and
+            mark the rest as skipped; None runs every test case
+        on_case (callable): Called with each per-test-case result as soon
+            as it is known, in completion order (skipped cases excluded)
+
+    Returns:
+        dict: Per-test-case "results", the submission's "timing" and
+        whether the verdict was served from the cache
+    """
+    if not is_supported_language(language):
+        raise ValueError(f"Language {language} not supported yet")
+
+    # Reject code that does not compile without spawning anything
+    compile_error = check_syntax(code)
+    if compile_error is not None:
+        judgement = _compile_error_judgement(exercise, compile_error)
+        _report_all(judgement, on_case)
+        return judgement
+
+    # Identical resubmissions reuse the stored verdict without executing
+    cache_key = verdict_cache.make_key(exercise, language, code)
+    judgement = verdict_cache.get(cache_key)
+    if judgement is not None:
+        judgement['cached'] = True
+        _report_all(judgement, on_case)
+        return judgement
+
+    # Large payloads are only loaded once the code actually has to run
+    test_cases = test_case_store.resolve(exercise['test_cases'])
+
+    def on_result(i, result):
+        on_case(_test_case_result(i, test_cases[i], result))
+
+    # Load the code once and run every test case against it
+    execution = code_executor.execute_python_batch(
+        code,
+        [test_case['input'] for test_case in test_cases],
+        expected=[test_case['expected_output'] for test_case in test_cases],
+        max_failures=max_failures,
+        on_result=on_result if on_case is not None else None,
+        timeout=exercise.get('time_limit')
+    )
+
+    results = [_test_case_result(i, test_case, result)
+               for i, (test_case, result) in enumerate(zip(test_cases, execution['results']))]
+
+    judgement = {
+        "results": results,
+        "timing": {
+            "wall_time": execution['wall_time'],
+            "cpu_time": execution['cpu_time']
+        },
+        "cached": False
+    }
+
+    # Timeouts and runner failures can depend on load, and short-circuited
+    # verdicts are incomplete, so only stable full verdicts are cached
+    if not any(result.get('transient') or result.get('skipped') for result in execution['results']):
+        verdict_cache.put(cache_key, exercise['_id'], judgement)
+
+    return judgement
+
+def create_submission_document(user_id, exercise_id, language, code, judgement, max_failures=None):
+    """
+    Create a new submission document from a judgement.
+
+    The document holds the code itself; when it is recorded, the code moves
+    to a content-addressed blob and the document keeps its code_hash (see
+    CodeStore).
+    """
+    return {
+        "user_id": ObjectId(user_id),
+        "exercise_id": ObjectId(exercise_id),
+        "language": language,
+        "code": code,
+        "results": judgement['results'],
+        "submitted_at": datetime.utcnow(),
+        "passed_all": judgement.get('compile_error') is None and all(r['passed'] for r in judgement['results']),
+        "timing": judgement['timing'],
+        "cached": judgement.get('cached', False),
+        "compile_error": judgement.get('compile_error'),
+        "max_failures": max_failures,
+        "skipped_count": sum(1 for r in judgement['results'] if r.get('skipped'))
+    }
+
+def visible_response(submission):
+    """Build the client response for a submission, hiding hidden test cases."""
+    results = submission['results']
+    visible_results = [r for r in results if not r.get('hidden', False)]
+
+    return {
+        "results": visible_results,
+        "passed_all": submission['passed_all'],
+        "passed_visible": all(r['passed'] for r in visible_results),
+        "timing": submission['timing'],
+        "cached": submission.get('cached', False),
+        "compile_error": submission.get('compile_error'),
+        "skipped_count": submission.get('skipped_count', 0)
+    }
+
+def process_submission(user_id, exercise, language, code, max_failures=None, on_case=None):
+    """
+    Judge a submission, save it and return the client response.
+
+    Used directly by the synchronous submit endpoint, as the job body of
+    the submission queue and by the streaming endpoint, which passes
+    on_case to hear about each test case as it finishes.
+    """
+    judgement = judge_code(exercise, language, code, max_failures, on_case)
+
+    # Save submission (possibly in a later batch, see SubmissionRecorder)
+    submission = create_submission_document(user_id, exercise['_id'], language, code, judgement, max_failures)
+    submission_recorder.record(submission)
+
+    return visible_response(submission)
@@ -0,0 +1,199 @@
+import queue
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict, deque
+from app.services.admission import AdmissionRejected, retry_after
+from app.services.metrics import summarize
+
+
+class JudgeQueue:
+    """
+    In-process submission queue drained by background judge workers.
+
+    Jobs are plain callables run inside the Flask app context. Job state is
+    kept in memory, so clients polling for a result must reach the same
+    service process that accepted it. Beyond max_retained jobs the oldest
+    finished ones are forgotten; queued and running jobs are always kept.
+    At most max_pending jobs may wait and each owner may have at most
+    max_per_owner jobs queued or running; submit rejects the rest.
+
+    With an admission controller, a worker takes a judging slot from it
+    before running each job, so queued and synchronous judgings share the
+    same max_active slots; the job counts as queued until it has one.
+    """
+
+    def __init__(self, workers=4, max_retained=10000, max_pending=1000, max_per_owner=2, sample_size=1000,
+                 admission=None):
+        self.app = None
+        self.admission = admission
+        self.workers = workers
+        self.max_retained = max_retained
+        self.max_pending = max_pending
+        self.max_per_owner = max_per_owner
+        self._in_flight = Counter()
+        self._queue = queue.Queue()
+        self._jobs = OrderedDict()
+        # Jobs leave the queue in submission order, so a queued job's
+        # position is its sequence number less the jobs taken so far
+        self._sequence = {}
+        self._enqueued = 0
+        self._taken = 0
+        self._finished = deque()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._wait_times = deque(maxlen=sample_size)
+        self._run_times = deque(maxlen=sample_size)
+        self._counters = {"submitted": 0, "completed": 0, "failed": 0, "rejected": 0}
+        self._running = 0
+
+    def init_app(self, app):
+        self.app = app
+        self.workers = app.config.get('SUBMISSION_QUEUE_WORKERS', self.workers)
+        self.max_retained = app.config.get('SUBMISSION_QUEUE_MAX_RETAINED', self.max_retained)
+        self.max_pending = app.config.get('SUBMISSION_QUEUE_MAX_PENDING', self.max_pending)
+        if app.config.get('ADMISSION_ENABLED', True):
+            self.max_per_owner = app.config.get('ADMISSION_MAX_PER_USER', self.max_per_owner)
+        else:
+            self.max_per_owner = 0
+
+    def _start_workers(self):
+        # Workers start lazily on first submit so they live in the serving
+        # process rather than the reloader
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"judge-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, owner, func, *args):
+        """
+        Queue a job and return its ID immediately.
+
+        Args:
+            owner (str): ID of the user the job belongs to
+            func (callable): Job body; its return value becomes the result
+            *args: Arguments passed to func
+
+        Returns:
+            str: Job ID
+
+        Raises:
+            AdmissionRejected: If the queue is full or the owner already has
+                max_per_owner jobs in flight
+        """
+        self._start_workers()
+
+        job_id = uuid.uuid4().hex
+        job = {
+            "job_id": job_id,
+            "owner": owner,
+            "status": "queued",
+            "enqueued_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "result": None,
+            "error": None
+        }
+
+        with self._lock:
+            if self.max_per_owner and self._in_flight[owner] >= self.max_per_owner:
+                self._counters['rejected'] += 1
+                raise AdmissionRejected(
+                    f"Too many submissions in progress (at most {self.max_per_owner} at a time)",
+                    'user_limit', 429, self._retry_after()
+                )
+            if self.max_pending and self._queue.qsize() >= self.max_pending:
+                self._counters['rejected'] += 1
+                raise AdmissionRejected("Submission queue is full, try again later", 'queue_full', 503,
+                                        self._retry_after())
+            self._in_flight[owner] += 1
+            self._jobs[job_id] = job
+            self._sequence[job_id] = self._enqueued
+            self._enqueued += 1
+            self._evict_finished()
+            self._counters['submitted'] += 1
+
+        self._queue.put((job, func, args))
+        return job_id
+
+    def get(self, job_id):
+        """Return a snapshot of a job, or None if it is unknown or expired."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def position(self, job_id):
+        """Return how many queued jobs are ahead of this one, or None once it left the queue."""
+        with self._lock:
+            sequence = self._sequence.get(job_id)
+            return None if sequence is None else max(0, sequence - self._taken)
+
+    def _work(self):
+        while True:
+            job, func, args = self._queue.get()
+            with self._lock:
+                self._taken += 1
+
+            ticket = None
+            if self.admission is not None:
+                ticket = self.admission.acquire(job['owner'], queued=True)
+
+            with self._lock:
+                self._sequence.pop(job['job_id'], None)
+                job['status'] = 'running'
+                job['started_at'] = time.time()
+                self._wait_times.append(job['started_at'] - job['enqueued_at'])
+                self._running += 1
+
+            try:
+                with self.app.app_context():
+                    result = func(*args)
+                status, error = 'done', None
+            except Exception as e:
+                result, status, error = None, 'failed', str(e)
+            finally:
+                if ticket is not None:
+                    self.admission.release(ticket)
+
+            with self._lock:
+                job['status'] = status
+                job['result'] = result
+                job['error'] = error
+                job['finished_at'] = time.time()
+                self._run_times.append(job['finished_at'] - job['started_at'])
+                self._running -= 1
+                self._counters['completed' if status == 'done' else 'failed'] += 1
+                self._in_flight[job['owner']] -= 1
+                if not self._in_flight[job['owner']]:
+                    del self._in_flight[job['owner']]
+                self._finished.append(job['job_id'])
+                self._evict_finished()
+
+            self._queue.task_done()
+
+    def _evict_finished(self):
+        # Called with the lock held; jobs finish roughly in submission order
+        while len(self._jobs) > self.max_retained and self._finished:
+            self._jobs.pop(self._finished.popleft(), None)
+
+    def _retry_after(self):
+        return retry_after(self._queue.qsize(), len(self._threads), self._run_times)
+
+    def stats(self):
+        """Queue depth, worker activity and recent wait/run time percentiles."""
+        with self._lock:
+            return {
+                "depth": self._queue.qsize(),
+                "max_pending": self.max_pending,
+                "running": self._running,
+                "workers": len(self._threads),
+                "submitted": self._counters['submitted'],
+                "completed": self._counters['completed'],
+                "failed": self._counters['failed'],
+                "rejected": self._counters['rejected'],
+                "wait_time": summarize(self._wait_times),
+                "run_time": summarize(self._run_times)
+            }
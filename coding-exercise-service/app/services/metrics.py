@@ -0,0 +1,13 @@
+def summarize(samples):
+    """Count, average, p50/p95/p99 and max of a sample of durations or sizes."""
+    if not samples:
+        return {"count": 0, "avg": None, "p50": None, "p95": None, "p99": None, "max": None}
+    ordered = sorted(samples)
+    return {
+        "count": len(ordered),
+        "avg": round(sum(ordered) / len(ordered), 4),
+        "p50": round(ordered[int(0.50 * (len(ordered) - 1))], 4),
+        "p95": round(ordered[int(0.95 * (len(ordered) - 1))], 4),
+        "p99": round(ordered[int(0.99 * (len(ordered) - 1))], 4),
+        "max": round(ordered[-1], 4)
+    }
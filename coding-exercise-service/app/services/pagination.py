@@ -0,0 +1,34 @@
+import base64
+import binascii
+import json
+from bson.errors import InvalidId
+from bson.objectid import ObjectId
+
+
+def encode_cursor(last_id, filters):
+    """
+    Build the opaque continuation token for the page after last_id.
+
+    The filters the page was listed with are embedded, so a token cannot be
+    replayed against a different query.
+    """
+    payload = json.dumps({"after": str(last_id), "filters": filters}, sort_keys=True, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, filters):
+    """
+    Return the ObjectId a continuation token resumes after.
+
+    Raises:
+        ValueError: If the token is malformed or was issued for other filters
+    """
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+        after = ObjectId(payload['after'])
+    except (binascii.Error, UnicodeError, ValueError, KeyError, TypeError, InvalidId) as e:
+        raise ValueError("Invalid cursor") from e
+    if payload.get('filters') != filters:
+        raise ValueError("Cursor does not match the current filters")
+    return after
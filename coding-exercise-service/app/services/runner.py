@@ -0,0 +1,1013 @@
+"""
+Warm runner process for the code execution worker pool.
+
+This script is started by WorkerPool as a long-lived process. It pre-imports
+commonly used modules once and then serves jobs read from stdin. Every job is
+executed in a fresh child forked from this warm parent, so submissions never
+share state with each other but also never pay interpreter startup cost.
+
+Frames on stdin/stdout are a 4-byte big-endian length followed by a JSON
+payload. A job may be answered by "event" frames (progress reports) before
+its final response frame. Only the standard library may be used here.
+"""
+import codecs
+import hashlib
+import json
+import os
+import select
+import signal
+import socket
+import struct
+import sys
+import tempfile
+import time
+import traceback
+
+try:
+    import resource
+except ImportError:  # Windows: the worker pool is disabled there anyway
+    resource = None
+
+# Modules imported here are shared (copy-on-write) by every forked child
+import builtins
+import bisect
+import collections
+import functools
+import heapq
+import itertools
+import math
+import random
+import re
+import string
+
+HEADER = struct.Struct('>I')
+READ_CHUNK = 65536
+
+# Stdout kept per case when it is digested for matching as it streams; the
+# rest is only counted
+PREVIEW_BYTES = 65536
+TRUNCATION_MARKER = "\n... [output truncated]"
+
+# Share of the memory limit a SIGKILLed child's peak RSS must reach for the
+# kill to be reported as the memory limit
+MEMORY_KILL_MARGIN = 0.9
+
+
+def read_frame(stream):
+    """Read one length-prefixed JSON frame, or None on EOF."""
+    header = stream.read(HEADER.size)
+    if len(header) < HEADER.size:
+        return None
+    (length,) = HEADER.unpack(header)
+    payload = stream.read(length)
+    if len(payload) < length:
+        return None
+    return json.loads(payload.decode('utf-8'))
+
+
+def write_frame(stream, message):
+    """Write one length-prefixed JSON frame."""
+    payload = json.dumps(message).encode('utf-8')
+    stream.write(HEADER.pack(len(payload)) + payload)
+    stream.flush()
+
+
+def _run_code(source, namespace, filename):
+    """
+    Execute source in namespace, printing any traceback to stderr.
+
+    Returns:
+        tuple: (finished, status) where finished is False if the code
+        raised or called sys.exit, and status is the process exit code
+    """
+    try:
+        exec(compile(source, filename, 'exec'), namespace)
+        return True, 0
+    except SystemExit as e:
+        if e.code is None:
+            return False, 0
+        elif isinstance(e.code, int):
+            return False, e.code
+        print(e.code, file=sys.stderr)
+        return False, 1
+    except BaseException:
+        # Hide the runner's own frame so tracebacks start at the submission
+        etype, value, tb = sys.exc_info()
+        traceback.print_exception(etype, value, tb.tb_next)
+        return False, 1
+
+
+def _exit(status):
+    """Flush stdio and leave a forked child without running cleanup."""
+    try:
+        sys.stdout.flush()
+        sys.stderr.flush()
+    finally:
+        os._exit(status)
+
+
+def cpu_rlimit(cpu_time):
+    """The whole seconds of RLIMIT_CPU a CPU time limit is applied as."""
+    return max(1, int(-(-cpu_time // 1)))
+
+
+def apply_limits(limits):
+    """
+    Set resource limits on the current (child) process. Also used as the
+    preexec_fn of cold interpreters.
+
+    Args:
+        limits (dict): Optional "cpu_time" (seconds), "memory" (bytes of
+            address space) and "file_size" (bytes per written file); the
+            "output" cap is enforced by the reading parent, not here
+    """
+    if resource is None:
+        return
+    if limits.get('cpu_time'):
+        # The soft limit raises SIGXCPU; the hard limit one second later
+        # guarantees the kill if the signal is caught
+        seconds = cpu_rlimit(limits['cpu_time'])
+        resource.setrlimit(resource.RLIMIT_CPU, (seconds, seconds + 1))
+    if limits.get('memory'):
+        resource.setrlimit(resource.RLIMIT_AS, (limits['memory'], limits['memory']))
+    if limits.get('file_size'):
+        resource.setrlimit(resource.RLIMIT_FSIZE, (limits['file_size'], limits['file_size']))
+
+
+def _fork(target, inherited_fds, limits=None):
+    """
+    Fork a child with stdin on /dev/null and stdout/stderr on fresh pipes.
+
+    Args:
+        target (callable): Run in the child; must not return
+        inherited_fds (tuple): Parent descriptors the child closes first
+        limits (dict): Resource limits applied in the child
+
+    Returns:
+        tuple: (pid, stdout read fd, stderr read fd)
+    """
+    out_r, out_w = os.pipe()
+    err_r, err_w = os.pipe()
+    pid = os.fork()
+
+    if pid == 0:
+        try:
+            for fd in inherited_fds:
+                os.close(fd)
+            devnull = os.open(os.devnull, os.O_RDONLY)
+            os.dup2(devnull, 0)
+            os.dup2(out_w, 1)
+            os.dup2(err_w, 2)
+            for fd in (devnull, out_r, out_w, err_r, err_w):
+                os.close(fd)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            if limits:
+                apply_limits(limits)
+        except BaseException:
+            os._exit(1)
+        try:
+            target()
+        finally:
+            _exit(1)
+
+    os.close(out_w)
+    os.close(err_w)
+    return pid, out_r, err_r
+
+
+def _decode(data):
+    return data.decode('utf-8', errors='replace')
+
+
+class OutputCapture:
+    """
+    Bounded capture of one output stream.
+
+    Every byte is counted but only the first keep bytes are stored, so a
+    child printing in a loop cannot grow the parent's memory.
+    """
+
+    def __init__(self, keep=None):
+        self.keep = keep
+        self.total = 0
+        self._chunks = []
+        self._kept = 0
+
+    def feed(self, data):
+        self.total += len(data)
+        if self.keep is None:
+            self._chunks.append(data)
+        elif self._kept < self.keep:
+            data = data[:self.keep - self._kept]
+            self._chunks.append(data)
+            self._kept += len(data)
+
+    @property
+    def truncated(self):
+        return self.keep is not None and self.total > self.keep
+
+    def text(self):
+        text = _decode(b''.join(self._chunks))
+        return text + TRUNCATION_MARKER if self.truncated else text
+
+
+class _StrippedStream:
+    """
+    A stream decoded and stripped of surrounding whitespace as it arrives.
+
+    Only whitespace that may still turn out to be trailing is held back, so
+    a large output never has to be stored; subclasses get the stripped text
+    piece by piece through _consume.
+    """
+
+    def __init__(self):
+        self._leading = True
+        self._pending = ''
+        self._decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+
+    def feed(self, data):
+        self.feed_text(self._decoder.decode(data))
+
+    def feed_text(self, text):
+        if self._leading:
+            text = text.lstrip()
+            if not text:
+                return
+            self._leading = False
+        text = self._pending + text
+        body = text.rstrip()
+        self._pending = text[len(body):]
+        self._consume(body)
+
+    def _flush(self):
+        self.feed_text(self._decoder.decode(b'', final=True))
+
+
+class StreamingMatcher(_StrippedStream):
+    """
+    Check a stream against an expected output as it arrives.
+
+    Equivalent to output.strip() == expected, without storing the output.
+    """
+
+    def __init__(self, expected):
+        super().__init__()
+        self.expected = expected
+        self._pos = 0
+        # A stripped output can never equal padded expected output
+        self._failed = expected != expected.strip()
+
+    def feed_text(self, text):
+        if not self._failed:
+            super().feed_text(text)
+
+    def _consume(self, body):
+        if self.expected[self._pos:self._pos + len(body)] != body:
+            self._failed = True
+            return
+        self._pos += len(body)
+
+    def finish(self):
+        """Flush the decoder and return whether the whole stream matched."""
+        self._flush()
+        return not self._failed and self._pos == len(self.expected)
+
+
+def output_digest(text):
+    """SHA-256 of a text, as OutputDigest reports it for a stripped stream."""
+    return hashlib.sha256(text.encode('utf-8', errors='surrogatepass')).hexdigest()
+
+
+class OutputDigest(_StrippedStream):
+    """
+    SHA-256 of a stream with surrounding whitespace stripped, computed as
+    it arrives.
+
+    The runner reports this instead of matching, so expected outputs never
+    enter a process the submission can inspect: output.strip() == expected
+    exactly when the digest equals output_digest(expected).
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._hash = hashlib.sha256()
+
+    def _consume(self, body):
+        self._hash.update(body.encode('utf-8'))
+
+    def hexdigest(self):
+        """Flush the decoder and return the digest of the whole stream."""
+        self._flush()
+        return self._hash.hexdigest()
+
+
+class _Captured:
+    """
+    Bounded capture of a process's stdout and stderr pipes.
+
+    Stdout and stderr go through bounded captures; once together they pass
+    max_output the process is flagged and killed by the supervisor. With a
+    digest, stdout is digested as it streams and only a preview of it is
+    kept.
+    """
+
+    def __init__(self, out_fd, err_fd, limits=None, digest=None):
+        self.out_fd = out_fd
+        self.err_fd = err_fd
+        self.fds = [out_fd, err_fd]
+        self.open_fds = list(self.fds)
+        self.limits = limits or {}
+        self.max_output = self.limits.get('output') or None
+        self.digest = digest
+        keep = self.max_output
+        if digest is not None:
+            keep = min(PREVIEW_BYTES, keep or PREVIEW_BYTES)
+        self.captures = {out_fd: OutputCapture(keep), err_fd: OutputCapture(self.max_output)}
+        self.output_exceeded = False
+        self.timed_out = False
+        self.returncode = None
+        self.cpu_time = 0.0
+        self.wall_time = 0.0
+        self.peak_rss_kb = 0
+
+    def read(self, fd):
+        data = os.read(fd, READ_CHUNK)
+        if not data:
+            self.open_fds.remove(fd)
+            return
+        self.captures[fd].feed(data)
+        if fd == self.out_fd and self.digest is not None:
+            self.digest.feed(data)
+        if self.max_output and sum(c.total for c in self.captures.values()) > self.max_output:
+            self.output_exceeded = True
+
+    def drain(self, fd):
+        """Read what is left in a pipe without waiting for more, then close it."""
+        os.set_blocking(fd, False)
+        try:
+            while fd in self.open_fds:
+                self.read(fd)
+        except BlockingIOError:
+            pass
+        self.close(fd)
+
+    def close(self, fd=None):
+        """Close one of the pipes, or all that are left."""
+        for closing in ([fd] if fd is not None else list(self.fds)):
+            os.close(closing)
+            self.fds.remove(closing)
+            if closing in self.open_fds:
+                self.open_fds.remove(closing)
+
+    def text(self, fd):
+        """Captured stdout or stderr, marked if it was truncated."""
+        return self.captures[fd].text()
+
+    def result(self):
+        stderr = self.text(self.err_fd)
+        if self.output_exceeded:
+            limit = 'output'
+        else:
+            limit = detect_limit_exceeded(self.returncode, stderr, self.timed_out, self.cpu_time,
+                                          self.peak_rss_kb, self.limits)
+        result = _case_result(
+            self.returncode,
+            self.text(self.out_fd),
+            stderr,
+            self.timed_out,
+            limit,
+            self.cpu_time,
+            self.wall_time,
+            self.peak_rss_kb
+        )
+        if self.digest is not None:
+            result['stdout_digest'] = self.digest.hexdigest()
+        return result
+
+
+def max_rss_kb(usage):
+    """Peak resident set size from an rusage, in kilobytes."""
+    # ru_maxrss is in kilobytes on Linux but bytes on macOS
+    return usage.ru_maxrss // 1024 if sys.platform == 'darwin' else usage.ru_maxrss
+
+
+class _Child(_Captured):
+    """A forked child being supervised: its pipes, deadline and usage."""
+
+    def __init__(self, index, target, inherited_fds, timeout, limits=None):
+        self.index = index
+        self.started = time.monotonic()
+        self.deadline = self.started + timeout
+        self.pid, out_fd, err_fd = _fork(target, inherited_fds, limits)
+        super().__init__(out_fd, err_fd, limits)
+
+    def poll(self):
+        """Reap the child if it has exited; returns True once reaped."""
+        pid, status, usage = os.wait4(self.pid, os.WNOHANG)
+        if pid == 0:
+            return False
+        self._reaped(status, usage)
+        return True
+
+    def kill(self, timed_out=True):
+        self.timed_out = timed_out
+        try:
+            os.kill(self.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        _, status, usage = os.wait4(self.pid, 0)
+        self._reaped(status, usage)
+
+    def _reaped(self, status, usage):
+        self.returncode = os.waitstatus_to_exitcode(status)
+        self.cpu_time = usage.ru_utime + usage.ru_stime
+        self.wall_time = time.monotonic() - self.started
+        self.peak_rss_kb = max_rss_kb(usage)
+        self.close()
+
+
+def detect_limit_exceeded(returncode, stderr, timed_out, cpu_time=None, peak_rss_kb=None, limits=None):
+    """
+    Name the resource limit that ended a child, if any.
+
+    SIGXCPU only comes from the CPU limit, but anything can send SIGKILL:
+    a kill is put down to the CPU limit only when the child's measured CPU
+    time reached it, and to memory when its peak RSS came within
+    MEMORY_KILL_MARGIN of the memory limit (the OOM killer, e.g. a
+    container's, kills with SIGKILL; RLIMIT_AS itself only fails
+    allocations). Any other kill is reported as 'killed'.
+    """
+    if timed_out:
+        return None
+    if returncode == -signal.SIGXCPU:
+        return 'cpu_time'
+    if returncode == -signal.SIGKILL:
+        limits = limits or {}
+        if limits.get('cpu_time') and cpu_time is not None and cpu_time >= cpu_rlimit(limits['cpu_time']):
+            return 'cpu_time'
+        if limits.get('memory') and peak_rss_kb and peak_rss_kb * 1024 >= limits['memory'] * MEMORY_KILL_MARGIN:
+            return 'memory'
+        return 'killed'
+    if returncode == -signal.SIGXFSZ:
+        return 'file_size'
+    last_line = stderr.rstrip().rsplit('\n', 1)[-1]
+    if last_line.startswith('MemoryError'):
+        return 'memory'
+    if 'File too large' in last_line:
+        # Python ignores SIGXFSZ, so the write fails with EFBIG instead
+        return 'file_size'
+    return None
+
+
+def _case_result(returncode, stdout, stderr, timed_out=False, limit_exceeded=None,
+                 cpu_time=0.0, wall_time=0.0, peak_rss_kb=0):
+    return {
+        "returncode": returncode,
+        "stdout": stdout,
+        "stderr": stderr,
+        "timed_out": timed_out,
+        "limit_exceeded": limit_exceeded,
+        "cpu_time": round(cpu_time, 6),
+        "wall_time": round(wall_time, 6),
+        "peak_rss_kb": peak_rss_kb
+    }
+
+
+# How often children that closed their pipes are checked for exit
+REAP_INTERVAL = 0.0005
+
+
+def _supervise(jobs, parallelism, inherited_fds, timeout, on_done, limits=None):
+    """
+    Run jobs in forked children, at most parallelism at a time.
+
+    Output of every running child is read as it arrives; a child that
+    passes its deadline is killed and reported as timed out, and one that
+    passes the output cap is killed and reported as over the limit.
+
+    Args:
+        jobs (list): (index, target) pairs, started in order
+        parallelism (int): Maximum number of children alive at once
+        inherited_fds (tuple): Descriptors children must close
+        timeout (float): Wall-clock limit per child
+        on_done (callable): Called with each finished _Child; returning
+            True stops any jobs that have not started yet
+        limits (dict): Resource limits applied in every child
+
+    Returns:
+        list: Indexes of jobs that were never started
+    """
+    pending = list(reversed(jobs))
+    running = []
+    skipped = []
+
+    while pending or running:
+        while pending and len(running) < parallelism:
+            index, target = pending.pop()
+            sibling_fds = tuple(fd for child in running for fd in child.fds)
+            running.append(_Child(index, target, inherited_fds + sibling_fds, timeout, limits))
+
+        fd_owner = {fd: child for child in running for fd in child.open_fds}
+        wait = min(child.deadline for child in running) - time.monotonic()
+        if any(not child.open_fds for child in running):
+            wait = min(wait, REAP_INTERVAL)
+
+        if wait > 0:
+            if fd_owner:
+                ready, _, _ = select.select(list(fd_owner), [], [], wait)
+                for fd in ready:
+                    fd_owner[fd].read(fd)
+                for child in running:
+                    if child.output_exceeded and child.returncode is None:
+                        child.kill(timed_out=False)
+            else:
+                time.sleep(wait)
+
+        now = time.monotonic()
+        for child in list(running):
+            done = child.returncode is not None or (not child.open_fds and child.poll())
+            if not done and now >= child.deadline:
+                child.kill()
+                done = True
+            if done:
+                running.remove(child)
+                if on_done(child) and pending:
+                    skipped = [index for index, _ in reversed(pending)]
+                    pending = []
+
+    return skipped
+
+
+def run_job(job, protocol_fds, emit=None, control=None):
+    """
+    Fork a child, run the job's source in it and collect its output.
+
+    Args:
+        job (dict): {"source": str, "timeout": float, "limits": dict}
+        protocol_fds (tuple): File descriptors the child must not inherit
+        emit (callable): Unused; single programs report no progress
+        control (file): Unused; single programs cannot be cancelled
+
+    Returns:
+        dict: returncode, stdout, stderr, timed_out flag, the limit that
+        was exceeded (if any), and wall/CPU time and peak RSS
+    """
+    def target():
+        namespace = {'__name__': '__main__', '__builtins__': builtins}
+        _, status = _run_code(job['source'], namespace, '<submission>')
+        _exit(status)
+
+    finished = []
+    _supervise([(0, target)], 1, protocol_fds, job['timeout'], finished.append,
+               limits=job.get('limits'))
+    return finished[0].result()
+
+
+def _anonymous_file():
+    """A file with no name on disk: memfd where available, else a tempfile."""
+    if hasattr(os, 'memfd_create'):
+        return os.fdopen(os.memfd_create('runner-capture'), 'w+b')
+    return tempfile.TemporaryFile()
+
+
+def _fork_case(namespace, fds, inherited_fds, limits=None):
+    """
+    Fork a child of the loaded submission that evaluates one input.
+
+    Args:
+        namespace (dict): The loaded submission's globals
+        fds (list): The case's input file and the write ends of its
+            stdout and stderr pipes, as received from the runner
+        inherited_fds (tuple): Descriptors the child closes first
+        limits (dict): Resource limits applied in the child
+
+    Returns:
+        int: The child's pid
+    """
+    source_fd, out_w, err_w = fds
+    sys.stdout.flush()
+    sys.stderr.flush()
+    pid = os.fork()
+
+    if pid == 0:
+        try:
+            for fd in inherited_fds:
+                os.close(fd)
+            signal.set_wakeup_fd(-1)
+            signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+            if limits:
+                apply_limits(limits)
+            with os.fdopen(source_fd, 'rb') as source:
+                input_data = source.read().decode('utf-8', errors='surrogatepass')
+            devnull = os.open(os.devnull, os.O_RDONLY)
+            os.dup2(devnull, 0)
+            os.dup2(out_w, 1)
+            os.dup2(err_w, 2)
+            for fd in (devnull, out_w, err_w):
+                os.close(fd)
+        except BaseException:
+            os._exit(1)
+        status = 1
+        try:
+            _, status = _run_code(f"print({input_data})", namespace, '<test case>')
+        finally:
+            _exit(status)
+
+    for fd in fds:
+        os.close(fd)
+    return pid
+
+
+def _serve_cases(namespace, channel, limits=None):
+    """
+    Fork a child of the loaded submission for every case the runner sends,
+    with limits applied.
+
+    Each request is a JSON {"index": int} carrying the case's input file
+    and the write ends of its stdout and stderr pipes; {"kill": int} kills
+    a case. The exit status and resource usage of every case are sent back
+    as it is reaped. Runs until the runner kills this process.
+    """
+    wake_r, wake_w = os.pipe()
+    os.set_blocking(wake_w, False)
+    signal.set_wakeup_fd(wake_w)
+    signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+    cases = {}
+
+    while True:
+        ready, _, _ = select.select([channel, wake_r], [], [])
+        if wake_r in ready:
+            os.read(wake_r, READ_CHUNK)
+        while cases:
+            pid, status, usage = os.wait4(-1, os.WNOHANG)
+            if pid == 0:
+                break
+            if pid not in cases:
+                # A process the submission forked itself
+                continue
+            channel.send(json.dumps({
+                "index": cases.pop(pid),
+                "returncode": os.waitstatus_to_exitcode(status),
+                "cpu_time": round(usage.ru_utime + usage.ru_stime, 6),
+                "peak_rss_kb": max_rss_kb(usage)
+            }).encode('utf-8'))
+        if channel not in ready:
+            continue
+
+        message, fds, _, _ = socket.recv_fds(channel, READ_CHUNK, 3)
+        request = json.loads(message.decode('utf-8')) if message else {}
+        if 'kill' in request:
+            for pid, index in cases.items():
+                if index == request['kill']:
+                    os.kill(pid, signal.SIGKILL)
+        elif 'index' in request and len(fds) == 3:
+            pid = _fork_case(namespace, fds, (channel.fileno(), wake_r, wake_w), limits)
+            cases[pid] = request['index']
+        else:
+            for fd in fds:
+                os.close(fd)
+
+
+def _load_and_serve(code, channel, case_limits=None):
+    """
+    Load the submission once, then run the cases the runner asks for,
+    each with case_limits applied.
+
+    Runs in the loaded child, which the submission controls from the
+    moment its module-level code starts, so nothing sent from here is
+    trusted beyond what the submission could produce itself (see
+    run_batch). A submission that raises or exits at module level ends
+    this process with its exit status.
+    """
+    os.setpgid(0, 0)
+    namespace = {'__name__': '__main__', '__builtins__': builtins}
+    finished, status = _run_code(code, namespace, '<submission>')
+    if not finished:
+        _exit(status)
+
+    # Module-level output, which prefixes every case's output, ends here:
+    # the runner reads stdout up to the "loaded" message and stray output
+    # later on goes to stderr
+    sys.stdout.flush()
+    os.dup2(2, 1)
+    channel.send(b'{"loaded": true}')
+    _serve_cases(namespace, channel, case_limits)
+
+
+def _number(value):
+    """A usage figure reported by the loaded child, or 0 if it is not one."""
+    if type(value) in (int, float) and math.isfinite(value) and value >= 0:
+        return value
+    return 0
+
+
+class _Case(_Captured):
+    """
+    A test case run by the loaded submission, as seen from the runner.
+
+    The runner creates the case's pipes and hands their write ends to the
+    loaded child, which forks the case onto them; output, the output cap
+    and the deadline are measured here, out of the submission's reach.
+    Only the exit status and resource usage are reported by the loaded
+    child, and those a submission controls anyway.
+    """
+
+    def __init__(self, index, timeout, limits=None, digest=None):
+        out_fd, self.out_w = os.pipe()
+        err_fd, self.err_w = os.pipe()
+        super().__init__(out_fd, err_fd, limits, digest)
+        self.index = index
+        self.started = time.monotonic()
+        self.deadline = self.started + timeout
+        self.reported = False
+
+    def start(self, channel, input_data):
+        """Send the case to the loaded child; False if it cannot take it."""
+        source = _anonymous_file()
+        try:
+            source.write(input_data.encode('utf-8', errors='surrogatepass'))
+            source.flush()
+            source.seek(0)
+            socket.send_fds(channel, [json.dumps({"index": self.index}).encode('utf-8')],
+                            [source.fileno(), self.out_w, self.err_w])
+            return True
+        except OSError:
+            return False
+        finally:
+            source.close()
+            os.close(self.out_w)
+            os.close(self.err_w)
+
+    def report(self, report):
+        returncode = report.get('returncode')
+        self.returncode = returncode if type(returncode) is int else 1
+        self.cpu_time = _number(report.get('cpu_time'))
+        self.peak_rss_kb = int(_number(report.get('peak_rss_kb')))
+        self.reported = True
+
+    @property
+    def done(self):
+        return self.reported and not self.open_fds
+
+    def stop(self, channel, timed_out=True):
+        """Give up on the case and ask the loaded child to kill it."""
+        try:
+            channel.send(json.dumps({"kill": self.index}).encode('utf-8'))
+        except OSError:
+            pass
+        self.timed_out = timed_out
+        self.returncode = -signal.SIGKILL
+        self.finish()
+
+    def finish(self):
+        self.wall_time = time.monotonic() - self.started
+        self.close()
+
+
+def _read_reports(channel, limit):
+    """Up to limit messages from the loaded child; malformed ones are dropped."""
+    reports = []
+    for _ in range(limit):
+        try:
+            data = channel.recv(READ_CHUNK)
+        except OSError:
+            break
+        try:
+            report = json.loads(data.decode('utf-8'))
+        except ValueError:
+            continue
+        if isinstance(report, dict):
+            reports.append(report)
+    return reports
+
+
+def run_batch(job, protocol_fds, emit=None, control=None):
+    """
+    Run every test-case input against one loaded copy of the submission.
+
+    The user's code is compiled and executed once in a loaded child; each
+    input is then evaluated in a fork of that child, so cases are isolated
+    from each other and individually time limited. Up to job["parallelism"]
+    cases run at the same time. With job["digest"], case results carry the
+    "stdout_digest" of their stripped stdout and only a preview of it; the
+    service matches digests against its expected outputs, which are never
+    sent here. With job["stream"], every case is also reported through emit
+    as soon as it finishes, and a {"cancel": true} frame from the service
+    (sent e.g. after too many failures) stops new cases from starting: the
+    cases never started come back with skipped=True.
+
+    The submission controls the loaded child and every process forked from
+    it, so none of them holds anything a result is built from: this
+    process creates each case's stdout and stderr pipes and hands over
+    only their write ends, then reads and digests the output and enforces
+    the deadline and output cap itself. The loaded child reports nothing
+    but exit statuses and resource usage, which are the submission's own
+    to choose; the batch's CPU time comes from wait4 on the loaded child.
+
+    Args:
+        job (dict): {"code": str, "inputs": [str], "timeout": float,
+                     "parallelism": int, "digest": bool, "limits": dict,
+                     "stream": bool}
+        protocol_fds (tuple): File descriptors the child must not inherit
+        emit (callable): Writes an event frame back to the service
+        control (file): The service's frame stream, read for cancel frames
+
+    Returns:
+        dict: {"results": [dict], "wall_time": float, "cpu_time": float}
+        with one runner result per input, in input order
+    """
+    code = job['code']
+    channel, loader_channel = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+
+    timeout = job['timeout']
+    limits = job.get('limits') or {}
+    parallelism = max(1, job.get('parallelism', 1))
+    rounds = -(-len(job['inputs']) // parallelism)
+    # Every case gets the job's CPU limit afresh. The loaded child lives
+    # through the whole batch and forks every case, so its own CPU limit
+    # covers the batch's backstop deadline instead; its module-level code
+    # is held to one timeout by the wall-clock deadline
+    loader_limits = dict(limits)
+    if limits.get('cpu_time'):
+        loader_limits['cpu_time'] = timeout * (rounds + 1) + 1
+
+    def target():
+        # The loaded child's copy of this process still references the
+        # job; leave it no other case's input to find
+        job.clear()
+        _load_and_serve(code, loader_channel, limits)
+
+    loader = _Child(0, target, protocol_fds + (channel.fileno(),), timeout, loader_limits)
+    loader_channel.close()
+    channel.setblocking(False)
+    try:
+        # Also done by the child; whichever runs first wins
+        os.setpgid(loader.pid, loader.pid)
+    except OSError:
+        pass
+
+    def stop_loader(timed_out):
+        # The whole process group, so cases the loaded child was asked to
+        # kill but did not go too
+        try:
+            os.killpg(loader.pid, signal.SIGKILL)
+        except OSError:
+            pass
+        loader.kill(timed_out)
+
+    # Bound only now: the loaded child inherits this frame
+    inputs = job['inputs']
+    if not (emit is not None and job.get('stream')):
+        control = None
+    pending = collections.deque(range(len(inputs)))
+    running = {}
+    records = {}
+    prelude = None
+    stopped = False
+
+    while loader.returncode is None:
+        if prelude is not None:
+            while pending and not stopped and len(running) < parallelism:
+                index = pending.popleft()
+                digest = None
+                if job.get('digest'):
+                    digest = OutputDigest()
+                    digest.feed_text(prelude)
+                case = _Case(index, timeout, limits, digest)
+                running[index] = case
+                if not case.start(channel, inputs[index]):
+                    stop_loader(timed_out=False)
+                    break
+            if loader.returncode is not None or not running and (stopped or not pending):
+                break
+
+        fd_owner = {fd: loader for fd in loader.open_fds}
+        fd_owner.update((fd, case) for case in running.values() for fd in case.open_fds)
+        wait = min([loader.deadline] + [case.deadline for case in running.values()]) - time.monotonic()
+        if not loader.open_fds:
+            wait = min(wait, REAP_INTERVAL)
+
+        if wait > 0:
+            watched = list(fd_owner) + [channel] + ([control] if control is not None else [])
+            ready, _, _ = select.select(watched, [], [], wait)
+            for fd in ready:
+                if fd in fd_owner:
+                    fd_owner[fd].read(fd)
+            if control is not None and control in ready:
+                # Any frame (or the service going away) stops the batch
+                # from starting more cases; one is all that is sent
+                read_frame(control)
+                stopped = True
+                control = None
+            if channel in ready:
+                for report in _read_reports(channel, len(running) + 1):
+                    index = report.get('index')
+                    if prelude is None and report.get('loaded') is True:
+                        loader.drain(loader.out_fd)
+                        prelude = loader.text(loader.out_fd)
+                        # Backstop in case the loaded child itself wedges
+                        loader.deadline = time.monotonic() + timeout * (rounds + 1) + 1
+                    elif type(index) is int and index in running:
+                        running[index].report(report)
+
+        if loader.output_exceeded:
+            stop_loader(timed_out=False)
+            break
+
+        now = time.monotonic()
+        for index, case in list(running.items()):
+            if case.output_exceeded:
+                case.stop(channel, timed_out=False)
+            elif now >= case.deadline and not case.done:
+                case.stop(channel)
+            elif case.done:
+                case.finish()
+            else:
+                continue
+            del running[index]
+            record = case.result()
+            record['stdout'] = prelude + record['stdout']
+            records[index] = record
+            if emit is not None and job.get('stream'):
+                emit({"event": "case", "index": index, "result": record})
+
+        if not loader.open_fds and loader.poll():
+            break
+        if now >= loader.deadline:
+            stop_loader(timed_out=True)
+
+    if loader.returncode is None:
+        stop_loader(timed_out=False)
+    for case in running.values():
+        case.finish()
+    channel.close()
+
+    prelude_err = loader.text(loader.err_fd)
+    if prelude is None:
+        # The program never finished loading (it exited, raised, timed out
+        # or hit a limit at module level): every case sees the same outcome,
+        # as if it had been run on its own
+        prelude_out = loader.text(loader.out_fd)
+        limit = 'output' if loader.output_exceeded else detect_limit_exceeded(
+            loader.returncode, prelude_err, loader.timed_out, loader.cpu_time, loader.peak_rss_kb, loader_limits)
+        results = [_case_result(loader.returncode, prelude_out, prelude_err, loader.timed_out, limit)
+                   for _ in inputs]
+        return {"results": results, "wall_time": round(loader.wall_time, 6), "cpu_time": round(loader.cpu_time, 6)}
+
+    never_started = set(pending) if stopped else set()
+    results = []
+    for i in range(len(inputs)):
+        record = records.get(i)
+        if record is not None:
+            record['stderr'] = prelude_err + record['stderr']
+            results.append(record)
+        elif i in never_started:
+            skipped = _case_result(None, "", "")
+            skipped['skipped'] = True
+            results.append(skipped)
+        else:
+            results.append(_case_result(loader.returncode or -1, prelude,
+                                        prelude_err or "Execution aborted", loader.timed_out))
+
+    return {
+        "results": results,
+        "wall_time": round(loader.wall_time, 6),
+        "cpu_time": round(loader.cpu_time, 6)
+    }
+
+
+JOB_HANDLERS = {
+    'source': run_job,
+    'batch': run_batch
+}
+
+
+def main():
+    # Keep the protocol channel on private descriptors and point fd 1 at
+    # stderr so stray prints can never corrupt a frame
+    protocol_in_fd = os.dup(0)
+    protocol_out_fd = os.dup(1)
+    os.dup2(2, 1)
+    protocol_in = os.fdopen(protocol_in_fd, 'rb')
+    protocol_out = os.fdopen(protocol_out_fd, 'wb')
+
+    write_frame(protocol_out, {"ready": True, "pid": os.getpid()})
+
+    while True:
+        job = read_frame(protocol_in)
+        if job is None:
+            break
+        if job.get('cancel'):
+            # Sent for a batch that finished before it was read
+            continue
+        try:
+            handler = JOB_HANDLERS[job.get('kind', 'source')]
+            response = handler(job, (protocol_in_fd, protocol_out_fd),
+                               lambda event: write_frame(protocol_out, event), protocol_in)
+        except Exception as e:
+            response = {"returncode": 1, "stdout": "", "stderr": str(e), "timed_out": False}
+        write_frame(protocol_out, response)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,258 @@
+import atexit
+import queue
+import threading
+import time
+from collections import deque
+from bson.objectid import ObjectId
+from app.services.metrics import summarize
+
+# Sentinel asking the writer thread to flush what it has and stop
+_STOP = object()
+
+# MongoDB's duplicate key error code
+DUPLICATE_KEY = 11000
+
+
+class SubmissionRecorder:
+    """
+    Write-behind recorder for submission documents.
+
+    In "batched" mode documents go into a bounded in-memory queue drained
+    by a background thread, which writes them with unordered insert_many
+    once batch_size documents are waiting or flush_interval seconds have
+    passed since the first one. When the queue is full, record() waits up to
+    put_timeout seconds and then writes the document itself, so submissions
+    are slowed down rather than dropped. Pending documents are flushed at
+    exit. "sync" mode writes every document with insert_one, as before.
+
+    A batch that fails as a whole (e.g. the connection drops) is retried up
+    to max_retries times; a duplicate _id on a retry means an earlier
+    attempt stored the document, so it counts as written. Documents still
+    not written after the last retry, or rejected by the server, are
+    counted in stats()["failed"] (with the last error) and dropped.
+
+    before_write, if given, is called with every list of documents about to
+    be written and may rewrite them in place (submitted code is moved into
+    content-addressed blobs this way). It is retried on its own and must be
+    safe to call again; if it keeps failing the documents are written as
+    they are (submissions then keep their code inline until
+    compact_submission_code.py moves it). on_written, if given, is called
+    with every list of documents that was written (derived data such as
+    exercise statistics hangs off it); its errors are counted but never
+    affect the submissions themselves.
+    """
+
+    def __init__(self, collection, mode='sync', batch_size=100, flush_interval=0.5,
+                 capacity=10000, put_timeout=1.0, max_retries=3, sample_size=1000,
+                 before_write=None, on_written=None):
+        self.collection = collection
+        self.before_write = before_write
+        self.on_written = on_written
+        self.mode = mode
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.capacity = capacity
+        self.put_timeout = put_timeout
+        self.max_retries = max_retries
+        self._queue = queue.Queue(maxsize=capacity)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._batch_sizes = deque(maxlen=sample_size)
+        self._flush_times = deque(maxlen=sample_size)
+        self._counters = {"recorded": 0, "written": 0, "batches": 0, "failed": 0,
+                          "retries": 0, "backpressure_waits": 0, "inline_writes": 0,
+                          "before_write_errors": 0, "on_written_errors": 0}
+        self._last_error = None
+
+    def init_app(self, app):
+        self.mode = app.config.get('SUBMISSION_WRITER_MODE', self.mode)
+        self.batch_size = app.config.get('SUBMISSION_WRITER_BATCH_SIZE', self.batch_size)
+        self.flush_interval = app.config.get('SUBMISSION_WRITER_FLUSH_INTERVAL', self.flush_interval)
+        self.put_timeout = app.config.get('SUBMISSION_WRITER_PUT_TIMEOUT', self.put_timeout)
+        capacity = app.config.get('SUBMISSION_WRITER_CAPACITY', self.capacity)
+        if capacity != self.capacity and self._thread is None:
+            self.capacity = capacity
+            self._queue = queue.Queue(maxsize=capacity)
+
+    @property
+    def batched(self):
+        return self.mode == 'batched'
+
+    def record(self, submission):
+        """
+        Save a submission document, now or in a later batch.
+
+        The document's _id is assigned here, so it is known to the caller
+        even before the write happens.
+
+        Args:
+            submission (dict): Submission document
+
+        Returns:
+            ObjectId: The submission's _id
+        """
+        submission.setdefault('_id', ObjectId())
+        with self._lock:
+            self._counters['recorded'] += 1
+
+        if not self.batched:
+            self._prepare([submission])
+            self.collection().insert_one(submission)
+            with self._lock:
+                self._counters['written'] += 1
+            self._notify([submission])
+            return submission['_id']
+
+        self._start_writer()
+        try:
+            self._queue.put_nowait(submission)
+        except queue.Full:
+            # Backpressure: wait for the writer to catch up, then give up on
+            # buffering and write inline rather than lose the submission
+            with self._lock:
+                self._counters['backpressure_waits'] += 1
+            try:
+                self._queue.put(submission, timeout=self.put_timeout)
+            except queue.Full:
+                self._write([submission])
+                with self._lock:
+                    self._counters['inline_writes'] += 1
+        return submission['_id']
+
+    def _start_writer(self):
+        # The writer starts lazily so it lives in the serving process
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="submission-writer", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is _STOP:
+                break
+            batch = [first]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    document = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if document is _STOP:
+                    stopping = True
+                    break
+                batch.append(document)
+            self._write(batch)
+
+        # Drain anything recorded after the stop request
+        leftover = []
+        while True:
+            try:
+                document = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if document is not _STOP:
+                leftover.append(document)
+        for start in range(0, len(leftover), self.batch_size):
+            self._write(leftover[start:start + self.batch_size])
+
+    def _prepare(self, batch):
+        # Errors here come from another collection (e.g. code_blobs), so
+        # they say nothing about which submissions were written
+        if self.before_write is None:
+            return
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.before_write(batch)
+                return
+            except Exception as e:
+                self._last_error = str(e)
+                if attempt < self.max_retries:
+                    with self._lock:
+                        self._counters['retries'] += 1
+                    time.sleep(0.1 * (attempt + 1))
+        with self._lock:
+            self._counters['before_write_errors'] += 1
+
+    def _write(self, batch):
+        started = time.monotonic()
+        self._prepare(batch)
+        pending = list(range(len(batch)))
+        failed_indexes = set()
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.collection().insert_many([batch[i] for i in pending], ordered=False)
+                pending = []
+                break
+            except Exception as e:
+                self._last_error = str(e)
+                # Unordered bulk errors report which documents failed; the
+                # rest were written and must not be retried
+                details = getattr(e, 'details', None) or {}
+                if details.get('writeErrors') is not None:
+                    failed_indexes = {
+                        pending[error['index']] for error in details['writeErrors']
+                        if not (attempt and error.get('code') == DUPLICATE_KEY)
+                    }
+                    pending = []
+                    break
+                if attempt < self.max_retries:
+                    with self._lock:
+                        self._counters['retries'] += 1
+                    time.sleep(0.1 * (attempt + 1))
+        failed_indexes.update(pending)
+        failed = len(failed_indexes)
+
+        with self._lock:
+            self._counters['batches'] += 1
+            self._counters['written'] += len(batch) - failed
+            self._counters['failed'] += failed
+            self._batch_sizes.append(len(batch))
+            self._flush_times.append(time.monotonic() - started)
+
+        self._notify([document for i, document in enumerate(batch) if i not in failed_indexes])
+
+    def _notify(self, documents):
+        if self.on_written is None or not documents:
+            return
+        try:
+            self.on_written(documents)
+        except Exception as e:
+            with self._lock:
+                self._counters['on_written_errors'] += 1
+                self._last_error = str(e)
+
+    def close(self):
+        """Flush pending documents and stop the writer thread."""
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "pending": self._queue.qsize(),
+                "capacity": self.capacity,
+                "recorded": self._counters['recorded'],
+                "written": self._counters['written'],
+                "failed": self._counters['failed'],
+                "batches": self._counters['batches'],
+                "retries": self._counters['retries'],
+                "backpressure_waits": self._counters['backpressure_waits'],
+                "inline_writes": self._counters['inline_writes'],
+                "before_write_errors": self._counters['before_write_errors'],
+                "on_written_errors": self._counters['on_written_errors'],
+                "last_error": self._last_error,
+                "batch_size": summarize(self._batch_sizes),
+                "flush_time": summarize(self._flush_times)
+            }
@@ -0,0 +1,207 @@
+import hashlib
+import threading
+from collections import OrderedDict
+import gridfs
+from pymongo import UpdateOne
+from app.services.runner import TRUNCATION_MARKER
+
+# Test-case fields that may be stored out of line; a stored field is
+# replaced by "<field>_blob": {"sha256": ..., "size": ...}
+PAYLOAD_FIELDS = ('input', 'expected_output')
+
+
+def blob_field(field):
+    return f'{field}_blob'
+
+
+def preview(text, limit):
+    """Cut text down to limit characters, marking it as truncated."""
+    if text is None or not limit or len(text) <= limit:
+        return text
+    return text[:limit] + TRUNCATION_MARKER
+
+
+class TestCaseStore:
+    """
+    Out-of-line storage for large test-case payloads.
+
+    Inputs and expected outputs longer than inline_limit bytes are written
+    to a GridFS bucket under their SHA-256, so identical payloads are
+    stored once and writes are idempotent, and the exercise document keeps
+    only the reference. Every exercise read (listing, hints, the exercise
+    cache, the recommendation service) therefore stays small; the judge
+    and the public projection of visible test cases resolve references,
+    through an LRU cache bounded in bytes.
+    Small payloads stay inline.
+    """
+
+    # Not a test class, whatever pytest's naming rules say
+    __test__ = False
+
+    def __init__(self, database, inline_limit=16 * 1024, cache_bytes=64 * 1024 * 1024,
+                 bucket='test_case_blobs'):
+        self.database = database
+        self.inline_limit = inline_limit
+        self.cache_bytes = cache_bytes
+        self.bucket = bucket
+        self._fs = None
+        self._cache = OrderedDict()
+        self._cached_bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "stored": 0, "deduplicated": 0}
+
+    def init_app(self, app):
+        self.inline_limit = app.config.get('TEST_CASE_INLINE_LIMIT_KB', self.inline_limit // 1024) * 1024
+        self.cache_bytes = app.config.get('TEST_CASE_CACHE_MB', self.cache_bytes // (1024 * 1024)) * 1024 * 1024
+
+    @property
+    def fs(self):
+        if self._fs is None:
+            self._fs = gridfs.GridFS(self.database(), collection=self.bucket)
+        return self._fs
+
+    def externalize(self, test_cases):
+        """
+        Move a set of test cases' large payloads out of line.
+
+        Args:
+            test_cases (list): Test cases as submitted, payloads inline
+
+        Returns:
+            list: Test cases to store; the input list is not modified
+        """
+        stored = []
+        for test_case in test_cases:
+            test_case = dict(test_case)
+            for field in PAYLOAD_FIELDS:
+                value = test_case.get(field)
+                if not isinstance(value, str) or not self.inline_limit:
+                    continue
+                data = value.encode('utf-8')
+                if len(data) <= self.inline_limit:
+                    continue
+                test_case[blob_field(field)] = {"sha256": self._put(data), "size": len(data)}
+                del test_case[field]
+            stored.append(test_case)
+        return stored
+
+    def _put(self, data):
+        digest = hashlib.sha256(data).hexdigest()
+        if self.fs.exists(digest):
+            with self._lock:
+                self._stats['deduplicated'] += 1
+            return digest
+        try:
+            self.fs.put(data, _id=digest)
+            with self._lock:
+                self._stats['stored'] += 1
+        except gridfs.errors.FileExists:
+            # Another writer stored the same payload first
+            pass
+        return digest
+
+    def resolve(self, test_cases):
+        """
+        Load the out-of-line payloads of a set of stored test cases.
+
+        Test cases that are fully inline are returned as they are; the rest
+        are copied with their payloads filled in and "out_of_line" set, so
+        callers know not to copy them into other documents whole.
+
+        Raises:
+            gridfs.errors.NoFile: If a referenced payload is missing
+        """
+        resolved = []
+        for test_case in test_cases:
+            if not any(blob_field(field) in test_case for field in PAYLOAD_FIELDS):
+                resolved.append(test_case)
+                continue
+            test_case = dict(test_case)
+            for field in PAYLOAD_FIELDS:
+                reference = test_case.pop(blob_field(field), None)
+                if reference is not None:
+                    test_case[field] = self._get(reference['sha256'])
+            test_case['out_of_line'] = True
+            resolved.append(test_case)
+        return resolved
+
+    def _get(self, digest):
+        with self._lock:
+            entry = self._cache.get(digest)
+            if entry is not None:
+                self._cache.move_to_end(digest)
+                self._stats['hits'] += 1
+                return entry[0]
+            self._stats['misses'] += 1
+
+        data = self.fs.get(digest).read()
+        text = data.decode('utf-8')
+
+        # Charged at the stored (UTF-8) size, which is what the blob
+        # reference records too
+        size = len(data)
+        if size <= self.cache_bytes:
+            with self._lock:
+                if digest not in self._cache:
+                    self._cache[digest] = (text, size)
+                    self._cached_bytes += size
+                while self._cached_bytes > self.cache_bytes:
+                    _, (_, evicted_size) = self._cache.popitem(last=False)
+                    self._cached_bytes -= evicted_size
+                    self._stats['evictions'] += 1
+        return text
+
+    def stats(self):
+        with self._lock:
+            lookups = self._stats['hits'] + self._stats['misses']
+            return {
+                "inline_limit": self.inline_limit,
+                "cached_payloads": len(self._cache),
+                "cached_bytes": self._cached_bytes,
+                "cache_bytes": self.cache_bytes,
+                "hits": self._stats['hits'],
+                "misses": self._stats['misses'],
+                "hit_ratio": round(self._stats['hits'] / lookups, 4) if lookups else None,
+                "evictions": self._stats['evictions'],
+                "stored": self._stats['stored'],
+                "deduplicated": self._stats['deduplicated']
+            }
+
+
+def externalize_exercises(db, store, batch_size=100, on_rewritten=None):
+    """
+    Move the large test-case payloads of every stored exercise out of line.
+
+    Exercises are streamed and rewritten in bulk; ones with nothing to move
+    are left untouched, so the migration can be re-run safely.
+
+    Args:
+        on_rewritten (callable): Called with the _id of every rewritten
+            exercise once it is written, e.g. to drop cached copies (a
+            rewritten exercise's verdict cache keys change)
+
+    Returns:
+        int: Number of exercises rewritten
+    """
+    count = 0
+    updates = {}
+
+    def flush():
+        db.exercises.bulk_write(list(updates.values()), ordered=False)
+        if on_rewritten is not None:
+            for exercise_id in updates:
+                on_rewritten(exercise_id)
+        return len(updates)
+
+    for exercise in db.exercises.find({}, {'test_cases': 1}).batch_size(batch_size):
+        test_cases = exercise.get('test_cases', [])
+        stored = store.externalize(test_cases)
+        if stored == test_cases:
+            continue
+        updates[exercise['_id']] = UpdateOne({'_id': exercise['_id']}, {'$set': {'test_cases': stored}})
+        if len(updates) >= batch_size:
+            count += flush()
+            updates = {}
+    if updates:
+        count += flush()
+    return count
@@ -0,0 +1,122 @@
+import copy
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+
+def normalize_code(code):
+    """
+    Normalize source so resubmissions differing only in line endings share
+    a key.
+
+    compile() reads "\\r\\n" and "\\r" as "\\n", so this cannot change
+    behaviour. Whitespace is kept as is: trailing spaces can sit inside a
+    string literal or turn a backslash continuation into a syntax error.
+    """
+    return code.replace('\r\n', '\n').replace('\r', '\n')
+
+
+def test_cases_version(test_cases):
+    """
+    Fingerprint of an exercise's test-case set; changes when any case does.
+
+    Payloads stored out of line are represented by their references, which
+    are content hashes.
+    """
+    canonical = json.dumps(
+        [[tc.get('input', tc.get('input_blob')), tc.get('expected_output', tc.get('expected_output_blob')),
+          tc.get('is_hidden', False)] for tc in test_cases],
+        separators=(',', ':')
+    )
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class VerdictCache:
+    """
+    Content-addressed LRU cache of judgements.
+
+    Keys hash the normalized code, the language, the exercise's test-case
+    set version and its time limit, so editing an exercise's test cases or
+    re-deriving its time limit makes its old entries unreachable;
+    invalidate_exercise also drops them eagerly.
+    """
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._keys_by_exercise = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0, "cpu_time_saved": 0.0}
+
+    def init_app(self, app):
+        self.max_entries = app.config.get('VERDICT_CACHE_SIZE', self.max_entries)
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    @staticmethod
+    def make_key(exercise, language, code):
+        digest = hashlib.sha256()
+        for part in (str(exercise['_id']), language.lower(),
+                     test_cases_version(exercise.get('test_cases', [])),
+                     str(exercise.get('time_limit')),
+                     normalize_code(code)):
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def get(self, key):
+        """Return a copy of the cached judgement, or None on a miss."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            self._stats['cpu_time_saved'] += entry['judgement']['timing'].get('cpu_time') or 0.0
+            return copy.deepcopy(entry['judgement'])
+
+    def put(self, key, exercise_id, judgement):
+        if not self.enabled:
+            return
+        exercise_id = str(exercise_id)
+        with self._lock:
+            self._entries[key] = {"exercise_id": exercise_id, "judgement": copy.deepcopy(judgement)}
+            self._entries.move_to_end(key)
+            self._keys_by_exercise.setdefault(exercise_id, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._discard(*self._entries.popitem(last=False))
+                self._stats['evictions'] += 1
+
+    def _discard(self, key, entry):
+        keys = self._keys_by_exercise.get(entry['exercise_id'])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_exercise[entry['exercise_id']]
+
+    def invalidate_exercise(self, exercise_id):
+        """Drop every cached judgement for an exercise."""
+        with self._lock:
+            for key in self._keys_by_exercise.pop(str(exercise_id), set()):
+                self._entries.pop(key, None)
+                self._stats['invalidations'] += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self._stats['hits'] + self._stats['misses']
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self._stats['hits'],
+                "misses": self._stats['misses'],
+                "hit_ratio": round(self._stats['hits'] / lookups, 4) if lookups else None,
+                "evictions": self._stats['evictions'],
+                "invalidations": self._stats['invalidations'],
+                "cpu_time_saved": round(self._stats['cpu_time_saved'], 4)
+            }
@@ -0,0 +1,186 @@
+import os
+import queue
+import select
+import subprocess
+import sys
+import threading
+
+from app.services import runner
+
+RUNNER_PATH = os.path.abspath(runner.__file__)
+
+# Extra time allowed for the runner to report back after the job timeout
+RESPONSE_GRACE = 5
+
+
+class WorkerError(Exception):
+    """Raised when a runner process dies or stops responding."""
+
+
+class RunnerWorker:
+    """A single warm runner process and the pipes used to talk to it."""
+
+    def __init__(self, max_jobs):
+        self.max_jobs = max_jobs
+        self.jobs_done = 0
+        self.process = subprocess.Popen(
+            [sys.executable, RUNNER_PATH],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            close_fds=True
+        )
+        hello = self._read(RESPONSE_GRACE)
+        if not hello.get('ready'):
+            self.close()
+            raise WorkerError("Runner failed to start")
+
+    @property
+    def alive(self):
+        return self.process.poll() is None
+
+    @property
+    def exhausted(self):
+        return self.jobs_done >= self.max_jobs
+
+    def run(self, job, timeout, on_event=None):
+        """
+        Send a job to the runner and wait for its response.
+
+        Args:
+            job (dict): Job payload understood by the runner
+            timeout (float): Seconds to wait for the response (or for
+                each event frame before it)
+            on_event (callable): Called with every event frame the runner
+                sends before its response; returning True asks the job to
+                stop starting new work
+
+        Returns:
+            dict: Raw runner response
+        """
+        try:
+            runner.write_frame(self.process.stdin, job)
+        except (BrokenPipeError, OSError) as e:
+            raise WorkerError(f"Runner unavailable: {e}")
+        self.jobs_done += 1
+        cancelled = False
+        response = self._read(timeout)
+        while 'event' in response:
+            if on_event is not None and on_event(response) and not cancelled:
+                cancelled = True
+                try:
+                    runner.write_frame(self.process.stdin, {"cancel": True})
+                except (BrokenPipeError, OSError):
+                    pass
+            response = self._read(timeout)
+        return response
+
+    def _read(self, timeout):
+        ready, _, _ = select.select([self.process.stdout], [], [], timeout)
+        if not ready:
+            raise WorkerError("Runner did not respond")
+        response = runner.read_frame(self.process.stdout)
+        if response is None:
+            raise WorkerError("Runner exited unexpectedly")
+        return response
+
+    def close(self):
+        if self.alive:
+            self.process.kill()
+        self.process.wait()
+        for stream in (self.process.stdin, self.process.stdout):
+            try:
+                stream.close()
+            except OSError:
+                pass
+
+
+class WorkerPool:
+    """
+    Pool of pre-started runner processes (fork-server style).
+
+    Each runner stays warm between jobs and forks a fresh child per job.
+    Runners are recycled after max_jobs_per_worker jobs, or immediately
+    when they crash or stop responding.
+    """
+
+    def __init__(self, size=4, max_jobs_per_worker=200):
+        self.size = size
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._started = False
+
+    @staticmethod
+    def supported():
+        """The runner relies on os.fork, which is POSIX only."""
+        return hasattr(os, 'fork')
+
+    def start(self):
+        """Start the runner processes if they are not running yet."""
+        with self._lock:
+            if self._started:
+                return
+            for _ in range(self.size):
+                self._idle.put(self._spawn())
+            self._started = True
+
+    def run(self, job, timeout, on_event=None):
+        """
+        Execute a job in a forked child of a warm runner.
+
+        Args:
+            job (dict): Job payload; "kind" selects the runner handler
+                ("source" for a single program, "batch" for test cases)
+            timeout (float): Time the job itself may take
+            on_event (callable): Receives progress events sent by the job;
+                returning True cancels the rest of it
+
+        Returns:
+            dict: Raw runner response
+        """
+        self.start()
+        worker = self._idle.get()
+        try:
+            if worker is not None and not worker.alive:
+                worker.close()
+                worker = None
+            if worker is None:
+                worker = RunnerWorker(self.max_jobs_per_worker)
+            return worker.run(job, timeout + RESPONSE_GRACE, on_event)
+        except Exception:
+            # Also covers errors raised by on_event: frames may be left
+            # unread, so the runner cannot be trusted with another job
+            if worker is not None:
+                worker.close()
+                worker = None
+            raise
+        finally:
+            self._idle.put(self._recycle(worker))
+
+    def _spawn(self):
+        # A slot whose runner failed to start is kept as None and retried
+        # on next use, so the pool never shrinks
+        try:
+            return RunnerWorker(self.max_jobs_per_worker)
+        except (WorkerError, OSError):
+            return None
+
+    def _recycle(self, worker):
+        if worker is not None and worker.alive and not worker.exhausted:
+            return worker
+        if worker is not None:
+            worker.close()
+        return self._spawn()
+
+    def shutdown(self):
+        """Stop every idle runner process."""
+        with self._lock:
+            while True:
+                try:
+                    worker = self._idle.get_nowait()
+                except queue.Empty:
+                    break
+                if worker is not None:
+                    worker.close()
+            self._started = False
@@ -0,0 +1,94 @@
+"""
+Per-case overhead of the cold execution path, before and after moving code
+delivery off the filesystem.
+
+"tempfile" replays the previous implementation: write the program to a
+NamedTemporaryFile, run it with subprocess.run and unlink it. "stdin" is the
+current CodeExecutionService._execute_cold, which sends the program over the
+interpreter's stdin pipe. "pool" (POSIX only) is the warm fork-server path,
+for reference.
+
+Usage (from the service directory):
+    python -m benchmarks.cold_execution [--cases 200] [--json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.code_execution import CodeExecutionService  # noqa: E402
+from app.services.runner import apply_limits  # noqa: E402
+from app.services.worker_pool import WorkerPool  # noqa: E402
+
+CODE = "def solve(a, b):\n    return a + b\n"
+INPUT = "solve(2, 3)"
+
+
+def run_tempfile(code, input_data, limits, timeout=5):
+    """The cold path as it was: one file create, run and unlink per case."""
+    with tempfile.NamedTemporaryFile(suffix='.py', mode='w', delete=False) as f:
+        f.write(code)
+        f.write(f"\n\nprint({input_data})")
+        temp_file = f.name
+    try:
+        result = subprocess.run(
+            [sys.executable, temp_file],
+            capture_output=True,
+            text=True,
+            timeout=timeout,
+            preexec_fn=(lambda: apply_limits(limits)) if os.name == 'posix' else None
+        )
+    finally:
+        os.unlink(temp_file)
+    return result.stdout.strip()
+
+
+def measure(func, cases):
+    samples = []
+    for _ in range(cases):
+        started = time.perf_counter()
+        output = func()
+        samples.append(time.perf_counter() - started)
+        assert output == "5", output
+    samples.sort()
+    return {
+        "cases": cases,
+        "mean_ms": round(statistics.mean(samples) * 1000, 3),
+        "p50_ms": round(samples[len(samples) // 2] * 1000, 3),
+        "p95_ms": round(samples[int(0.95 * (len(samples) - 1))] * 1000, 3)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--cases', type=int, default=200)
+    parser.add_argument('--json', action='store_true', help="Print machine-readable results")
+    args = parser.parse_args()
+
+    cold = CodeExecutionService(pool_size=0)
+    results = {
+        "tempfile": measure(lambda: run_tempfile(CODE, INPUT, cold.limits), args.cases),
+        "stdin": measure(lambda: cold.execute_python(CODE, INPUT)['output'], args.cases)
+    }
+    if WorkerPool.supported():
+        warm = CodeExecutionService(pool_size=1)
+        warm.execute_python(CODE, INPUT)
+        results["pool"] = measure(lambda: warm.execute_python(CODE, INPUT)['output'], args.cases)
+        warm.pool.shutdown()
+
+    if args.json:
+        print(json.dumps(results))
+        return
+    for name, stats in results.items():
+        print(f"{name:>8}: mean {stats['mean_ms']:.2f} ms  p50 {stats['p50_ms']:.2f} ms  "
+              f"p95 {stats['p95_ms']:.2f} ms  ({stats['cases']} cases)")
+
+
+if __name__ == '__main__':
+    main()
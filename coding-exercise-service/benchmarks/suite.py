@@ -0,0 +1,181 @@
+"""
+Offline benchmark of code execution and judging, for regression tracking.
+
+Drives CodeExecutionService.execute_python ("execute" mode, one call per test
+case) and the submit path ("submit" mode: judge_code, then the submission
+document and client response, without the database write) with a synthetic
+corpus. No MongoDB is needed.
+
+Corpus kinds:
+    fast     correct solution that returns immediately
+    cpu      correct solution that burns CPU for a while
+    timeout  infinite loop, ends on the execution timeout
+    output   prints a large amount of text before answering
+    syntax   does not compile
+
+For every mode and kind it reports submissions/sec, latency percentiles (ms)
+and per-case overhead: submission latency minus the CPU time used by the
+submission itself, divided by its number of test cases.
+
+Usage (from the service directory):
+    python -m benchmarks.suite [--mode submit] [--kinds fast,cpu] \\
+        [--submissions 50] [--concurrency 4] [--pool-size 4] [--json out.json]
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import code_executor, verdict_cache  # noqa: E402
+from app.services.judge import judge_code, create_submission_document, visible_response  # noqa: E402
+from app.services.metrics import summarize  # noqa: E402
+
+CASES_PER_EXERCISE = 5
+USER_ID = '0' * 24
+
+CORPUS = {
+    "fast": "def solve(a, b):\n    return a + b\n",
+    "cpu": (
+        "def solve(a, b):\n"
+        "    total = 0\n"
+        "    for i in range(300000):\n"
+        "        total += i % 7\n"
+        "    return a + b\n"
+    ),
+    "timeout": "def solve(a, b):\n    while True:\n        pass\n",
+    "output": (
+        "def solve(a, b):\n"
+        "    for i in range(2000):\n"
+        "        print('x' * 100)\n"
+        "    return a + b\n"
+    ),
+    "syntax": "def solve(a, b)\n    return a + b\n"
+}
+
+
+def make_exercise(kind):
+    """A synthetic exercise whose test cases call solve(a, b)."""
+    return {
+        "_id": f"{'0' * 16}{list(CORPUS).index(kind):08x}",
+        "test_cases": [
+            {"input": f"solve({i}, {i + 1})", "expected_output": str(2 * i + 1), "is_hidden": i % 2 == 1}
+            for i in range(CASES_PER_EXERCISE)
+        ]
+    }
+
+
+def run_submit(kind, exercise):
+    started = time.perf_counter()
+    judgement = judge_code(exercise, 'python', CORPUS[kind])
+    submission = create_submission_document(USER_ID, exercise['_id'], 'python', CORPUS[kind], judgement)
+    visible_response(submission)
+    latency = time.perf_counter() - started
+    cpu_time = judgement['timing'].get('cpu_time')
+    if cpu_time is None:
+        cpu_time = sum(result.get('cpu_time', 0.0) for result in judgement['results'])
+    return latency, cpu_time
+
+
+def run_execute(kind, exercise):
+    started = time.perf_counter()
+    cpu_time = 0.0
+    for test_case in exercise['test_cases']:
+        result = code_executor.execute_python(CORPUS[kind], test_case['input'])
+        cpu_time += result.get('cpu_time', 0.0)
+    return time.perf_counter() - started, cpu_time
+
+
+def benchmark(mode, kind, submissions, concurrency):
+    exercise = make_exercise(kind)
+    run = run_submit if mode == 'submit' else run_execute
+    cases = len(exercise['test_cases'])
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        samples = list(executor.map(lambda _: run(kind, exercise), range(submissions)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "mode": mode,
+        "kind": kind,
+        "submissions": submissions,
+        "cases_per_submission": cases,
+        "concurrency": concurrency,
+        "wall_time_s": round(elapsed, 4),
+        "submissions_per_sec": round(submissions / elapsed, 3),
+        "latency_ms": summarize([latency * 1000 for latency, _ in samples]),
+        "overhead_per_case_ms": summarize([max(0.0, latency - cpu_time) * 1000 / cases
+                                           for latency, cpu_time in samples])
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--mode', choices=('submit', 'execute', 'both'), default='both')
+    parser.add_argument('--kinds', default=','.join(CORPUS), help="Comma-separated corpus kinds")
+    parser.add_argument('--submissions', type=int, default=20, help="Submissions per kind")
+    parser.add_argument('--concurrency', type=int, default=4, help="Submissions in flight at once")
+    parser.add_argument('--pool-size', type=int, default=4, help="Warm runners, 0 for cold interpreters")
+    parser.add_argument('--timeout', type=int, default=2, help="Execution timeout per case in seconds")
+    parser.add_argument('--parallel-cases', type=int, default=4)
+    parser.add_argument('--verdict-cache', action='store_true', help="Keep the verdict cache enabled")
+    parser.add_argument('--json', metavar='PATH', help="Also write the results as JSON ('-' for stdout)")
+    args = parser.parse_args()
+
+    kinds = [kind.strip() for kind in args.kinds.split(',') if kind.strip()]
+    unknown = [kind for kind in kinds if kind not in CORPUS]
+    if unknown:
+        parser.error(f"Unknown kinds: {', '.join(unknown)}")
+    modes = ('execute', 'submit') if args.mode == 'both' else (args.mode,)
+
+    # Configure the service instances the submit path uses, as the app would
+    config = {
+        'EXECUTION_TIMEOUT': args.timeout,
+        'EXECUTION_POOL_SIZE': args.pool_size,
+        'EXECUTION_MAX_PARALLEL_CASES': args.parallel_cases,
+        'VERDICT_CACHE_SIZE': 10000 if args.verdict_cache else 0
+    }
+    code_executor.init_app(SimpleNamespace(config=config))
+    verdict_cache.init_app(SimpleNamespace(config=config))
+
+    # Warm the runner pool so start-up is not measured
+    code_executor.execute_python(CORPUS['fast'], "solve(1, 2)")
+
+    results = []
+    for mode in modes:
+        for kind in kinds:
+            result = benchmark(mode, kind, args.submissions, args.concurrency)
+            results.append(result)
+            print(f"{mode:>7} {kind:>8}: {result['submissions_per_sec']:8.2f} sub/s  "
+                  f"p50 {result['latency_ms']['p50']:9.2f} ms  p95 {result['latency_ms']['p95']:9.2f} ms  "
+                  f"p99 {result['latency_ms']['p99']:9.2f} ms  "
+                  f"overhead/case {result['overhead_per_case_ms']['p50']:7.2f} ms", file=sys.stderr)
+
+    if code_executor.pool is not None:
+        code_executor.pool.shutdown()
+
+    if args.json:
+        report = {
+            "timestamp": datetime.utcnow().isoformat() + 'Z',
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "config": config,
+            "results": results
+        }
+        if args.json == '-':
+            print(json.dumps(report, indent=2))
+        else:
+            with open(args.json, 'w') as f:
+                json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
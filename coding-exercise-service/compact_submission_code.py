@@ -0,0 +1,30 @@
+"""
+Move the code of existing submissions into content-addressed blobs.
+
+Each distinct source is stored once in code_blobs and submissions keep only its
+code_hash. Submissions are compacted in batches and an interrupted run can be
+restarted:
+    python compact_submission_code.py [--batch-size 1000]
+
+With --recount, reference counts are recomputed from the submissions and
+unreferenced blobs are deleted afterwards (run it while no submissions are
+being written).
+"""
+import argparse
+import json
+from app import create_app, mongo, code_store
+from app.services.code_store import compact_submissions, recount_refs
+
+app = create_app()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--recount', action='store_true', help="Recompute reference counts afterwards")
+    args = parser.parse_args()
+
+    with app.app_context():
+        summary = compact_submissions(mongo.db, code_store, args.batch_size)
+        if args.recount:
+            summary['recount'] = recount_refs(mongo.db, args.batch_size)
+        print(json.dumps(summary, indent=2))
@@ -0,0 +1,25 @@
+"""
+Move large test-case payloads of stored exercises out of line.
+
+Inputs and expected outputs above TEST_CASE_INLINE_LIMIT_KB are written to the
+test_case_blobs GridFS bucket and replaced by references. Safe to re-run:
+    python externalize_test_cases.py
+
+Running services keep serving their cached copies of a rewritten exercise
+until EXERCISE_CACHE_TTL expires.
+"""
+from app import create_app, mongo, test_case_store, exercise_cache, verdict_cache
+from app.services.test_case_store import externalize_exercises
+
+app = create_app()
+
+
+def invalidate(exercise_id):
+    exercise_cache.invalidate(exercise_id)
+    verdict_cache.invalidate_exercise(exercise_id)
+
+
+if __name__ == '__main__':
+    with app.app_context():
+        count = externalize_exercises(mongo.db, test_case_store, on_rewritten=invalidate)
+        print(f"Rewrote {count} exercises")
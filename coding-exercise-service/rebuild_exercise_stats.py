@@ -0,0 +1,16 @@
+"""
+Rebuild exercise statistics and per-user progress from all submissions.
+
+Run once after deploying materialized statistics, or whenever they need to be
+recomputed:
+    python rebuild_exercise_stats.py
+"""
+from app import create_app, mongo
+from app.services.exercise_stats import rebuild_exercise_stats
+
+app = create_app()
+
+if __name__ == '__main__':
+    with app.app_context():
+        count = rebuild_exercise_stats(mongo.db)
+        print(f"Replayed {count} submissions")
@@ -0,0 +1,103 @@
+import signal
+import pytest
+from app.services.code_execution import CodeExecutionService
+from app.services.runner import detect_limit_exceeded
+
+METRICS = ('wall_time', 'cpu_time', 'peak_rss_kb')
+
+
+@pytest.fixture
+def executor():
+    return CodeExecutionService(timeout=1, pool_size=0, output_limit_kb=4)
+
+
+@pytest.mark.parametrize('code, input_data', [
+    ("def f(x):\n    return x", "f(1)"),
+    ("import time\ndef f():\n    time.sleep(5)", "f()"),
+    ("def f():\n    print('x' * 10000)", "f()"),
+    ("def f():\n    raise KeyError(1)", "f()"),
+])
+def test_cold_results_carry_resource_usage(executor, code, input_data):
+    result = executor.execute_python(code, input_data)
+
+    assert all(metric in result for metric in METRICS)
+    assert result['cpu_time'] > 0 and result['peak_rss_kb'] > 0
+
+
+def test_cold_batch_sums_cpu_time(executor):
+    execution = executor.execute_python_batch("def f(x):\n    return x", ["f(1)", "f(2)"], expected=["1", "2"])
+
+    assert execution['cpu_time'] == pytest.approx(sum(r['cpu_time'] for r in execution['results']), abs=1e-5)
+
+
+def test_cold_cpu_limit_follows_the_effective_timeout():
+    executor = CodeExecutionService(timeout=5, pool_size=0)
+    code = "import resource\ndef limit():\n    return resource.getrlimit(resource.RLIMIT_CPU)[0]"
+
+    assert executor.execute_python(code, "limit()")['output'] == "5"
+    assert executor.execute_python_batch(code, ["limit()"], timeout=2)['results'][0]['output'] == "2"
+
+
+def test_cold_batch_starts_the_next_case_when_any_slot_frees():
+    executor = CodeExecutionService(timeout=5, pool_size=0, max_concurrency=2, max_parallel_cases=2)
+    code = "import time\ndef f(x):\n    if x == 0:\n        time.sleep(1)\n    return x"
+    order = []
+
+    execution = executor.execute_python_batch(code, [f"f({i})" for i in range(4)],
+                                              on_result=lambda index, result: order.append(index))
+
+    # Cases 2 and 3 take the fast slot without waiting for case 0
+    assert order[-1] == 0
+    assert [result['output'] for result in execution['results']] == ["0", "1", "2", "3"]
+
+
+def test_cold_batch_skips_cases_after_max_failures():
+    executor = CodeExecutionService(timeout=5, pool_size=0, max_concurrency=1, max_parallel_cases=1)
+    execution = executor.execute_python_batch("def f(x):\n    return -1", [f"f({i})" for i in range(3)],
+                                              expected=["0", "1", "2"], max_failures=1)
+
+    assert not execution['results'][0].get('skipped')
+    assert [result.get('skipped') for result in execution['results'][1:]] == [True, True]
+
+
+LIMITS = {'cpu_time': 2, 'memory': 256 * 1024 * 1024}
+
+
+@pytest.mark.parametrize('returncode, cpu_time, peak_rss_kb, expected', [
+    (-signal.SIGXCPU, 2.0, 10000, 'cpu_time'),
+    (-signal.SIGKILL, 3.01, 10000, 'cpu_time'),
+    (-signal.SIGKILL, 0.2, 250 * 1024, 'memory'),
+    (-signal.SIGKILL, 0.2, 10000, 'killed'),
+    (-signal.SIGKILL, None, None, 'killed'),
+    (1, 0.2, 10000, None),
+])
+def test_sigkill_is_only_a_cpu_limit_when_the_cpu_time_reached_it(returncode, cpu_time, peak_rss_kb, expected):
+    assert detect_limit_exceeded(returncode, "", False, cpu_time, peak_rss_kb, LIMITS) == expected
+
+
+def test_cold_kill_is_not_reported_as_cpu_time(executor):
+    result = executor.execute_python("import os, signal\ndef f():\n    os.kill(os.getpid(), signal.SIGKILL)", "f()")
+
+    assert result['limit_exceeded'] == 'killed'
+    assert result['error'] == "Process was killed"
+
+
+def test_cold_cpu_limit_is_reported_as_cpu_time():
+    executor = CodeExecutionService(timeout=5, pool_size=0, cpu_time_limit=1)
+    result = executor.execute_python("def f():\n    while True:\n        pass", "f()")
+
+    assert result['limit_exceeded'] == 'cpu_time'
+
+
+def test_reconfiguring_the_pool_registers_one_exit_hook(monkeypatch):
+    hooks = []
+    monkeypatch.setattr('app.services.code_execution.atexit.register', hooks.append)
+    monkeypatch.setattr('app.services.code_execution.WorkerPool.supported', staticmethod(lambda: True))
+    executor = CodeExecutionService()
+    for size in (2, 0, 3):
+        executor._configure_pool(size, 100)
+
+    assert hooks == [executor.shutdown_pool]
+    assert executor.pool.size == 3
+    executor.shutdown_pool()
+    assert executor.pool is None
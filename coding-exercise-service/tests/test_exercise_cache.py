@@ -0,0 +1,64 @@
+import hashlib
+from bson.objectid import ObjectId
+from app.services.exercise_cache import ExerciseCache, public_projection
+from app.services.test_case_store import TestCaseStore
+
+
+class FakeStore(TestCaseStore):
+    """A TestCaseStore whose GridFS bucket is a dict."""
+
+    def __init__(self, inline_limit):
+        super().__init__(lambda: None, inline_limit=inline_limit)
+        self.blobs = {}
+        self.loaded = []
+
+    def _put(self, data):
+        digest = hashlib.sha256(data).hexdigest()
+        self.blobs[digest] = data.decode('utf-8')
+        return digest
+
+    def _get(self, digest):
+        self.loaded.append(digest)
+        return self.blobs[digest]
+
+
+def exercise(store):
+    return {
+        '_id': ObjectId(),
+        'title': 'Echo',
+        'solution_code': {'python': 'print(input())'},
+        'test_cases': store.externalize([
+            {'input': 'x' * 64, 'expected_output': 'y' * 64, 'is_hidden': False},
+            {'input': 'short', 'expected_output': 'short', 'is_hidden': False},
+            {'input': 'h' * 64, 'expected_output': 'h' * 64, 'is_hidden': True}
+        ])
+    }
+
+
+def test_public_projection_resolves_visible_out_of_line_cases():
+    store = FakeStore(inline_limit=16)
+    document = exercise(store)
+    assert 'input_blob' in document['test_cases'][0]
+
+    public = public_projection(document, store.resolve)
+
+    assert 'solution_code' not in public
+    assert public['test_cases'] == [
+        {'input': 'x' * 64, 'expected_output': 'y' * 64, 'is_hidden': False},
+        {'input': 'short', 'expected_output': 'short', 'is_hidden': False}
+    ]
+    # The hidden case's payload is never loaded
+    assert store.loaded == [hashlib.sha256(b'x' * 64).hexdigest(), hashlib.sha256(b'y' * 64).hexdigest()]
+
+
+def test_cache_projects_with_its_resolver():
+    store = FakeStore(inline_limit=16)
+    document = exercise(store)
+    cache = ExerciseCache(lambda exercise_id: document, resolve=store.resolve)
+
+    public = cache.get_public(document['_id'])
+
+    assert public['test_cases'][0]['input'] == 'x' * 64
+    assert all('input_blob' not in tc and 'out_of_line' not in tc for tc in public['test_cases'])
+    # The full document keeps its references for the judge
+    assert 'input_blob' in cache.get(document['_id'])['test_cases'][0]
@@ -0,0 +1,146 @@
+from datetime import datetime, timedelta
+from bson.objectid import ObjectId
+from pymongo.errors import BulkWriteError
+from app.services.exercise_stats import record_submission_stats
+
+START = datetime(2026, 1, 1)
+
+
+def matches(document, query):
+    for field, condition in query.items():
+        if field == '$or':
+            if not any(matches(document, clause) for clause in condition):
+                return False
+        elif document.get(field) != condition:
+            return False
+    return True
+
+
+def apply_update(document, update, inserting):
+    for operator, fields in update.items():
+        for path, value in fields.items():
+            *parents, field = path.split('.')
+            target = document
+            for parent in parents:
+                target = target.setdefault(parent, {})
+            current = target.get(field)
+            if operator == '$inc':
+                target[field] = (current or 0) + value
+            elif operator == '$set' or (operator == '$setOnInsert' and inserting):
+                target[field] = value
+            elif operator == '$max':
+                target[field] = value if current is None else max(current, value)
+            elif operator == '$min':
+                target[field] = value if current is None else min(current, value)
+
+
+class FakeCollection:
+    """find, bulk_write of UpdateOne and insert_many, with an optional unique key."""
+
+    def __init__(self, unique=None):
+        self.documents = []
+        self.unique = unique
+        self.before_bulk_write = None
+
+    def find(self, query, projection=None):
+        return [dict(document) for document in self.documents if matches(document, query)]
+
+    def insert_many(self, documents, ordered=True):
+        self.documents.extend(documents)
+
+    def bulk_write(self, operations, ordered=True):
+        if self.before_bulk_write is not None:
+            hook, self.before_bulk_write = self.before_bulk_write, None
+            hook()
+        errors = []
+        for i, operation in enumerate(operations):
+            query, update = operation._filter, operation._doc
+            found = next((document for document in self.documents if matches(document, query)), None)
+            if found is not None:
+                apply_update(found, update, inserting=False)
+                continue
+            document = {field: value for field, value in query.items() if not field.startswith('$')}
+            if self.unique and any(all(other.get(key) == document.get(key) for key in self.unique)
+                                   for other in self.documents):
+                errors.append({"index": i, "code": 11000, "errmsg": "duplicate key"})
+                continue
+            apply_update(document, update, inserting=True)
+            self.documents.append(document)
+        if errors:
+            raise BulkWriteError({"writeErrors": errors})
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.exercise_progress = FakeCollection(unique=('user_id', 'exercise_id'))
+        self.exercise_stats = FakeCollection()
+        self.user_events = FakeCollection()
+
+
+ALICE, BOB, EXERCISE = ObjectId(), ObjectId(), ObjectId()
+
+
+def submission(user_id, passed, minute, failed_case=None):
+    return {
+        '_id': ObjectId(),
+        'user_id': user_id,
+        'exercise_id': EXERCISE,
+        'passed_all': passed,
+        'submitted_at': START + timedelta(minutes=minute),
+        'results': [{'test_case_id': failed_case, 'passed': False}] if failed_case is not None else []
+    }
+
+
+def stats(db):
+    (document,) = db.exercise_stats.documents
+    return {key: value for key, value in document.items() if key not in ('_id', 'updated_at')}
+
+
+def progress(db, user_id):
+    (document,) = db.exercise_progress.find({'user_id': user_id})
+    return document
+
+
+BATCH = [submission(ALICE, False, 0, failed_case=1), submission(BOB, True, 1), submission(ALICE, True, 2)]
+
+EXPECTED = {
+    'attempts': 3, 'passes': 2, 'distinct_users': 2, 'first_attempt_passes': 1, 'solved_users': 2,
+    'attempts_to_solve': {'1': 1, '2': 1}, 'test_case_failures': {'1': 1}
+}
+
+
+def test_batch_is_folded_per_user_and_exercise():
+    db = FakeDatabase()
+    record_submission_stats(db, BATCH)
+
+    assert stats(db) == EXPECTED
+    alice = progress(db, ALICE)
+    assert (alice['attempts'], alice['passed'], alice['passed_at']) == (2, True, BATCH[2]['submitted_at'])
+    assert alice['first_submitted_at'] == BATCH[0]['submitted_at']
+    assert alice['last_submission_id'] == BATCH[2]['_id']
+    assert sorted(event['user_id'] for event in db.user_events.documents) == sorted([ALICE, BOB])
+
+
+def test_same_batch_twice_counts_once():
+    db = FakeDatabase()
+    record_submission_stats(db, BATCH)
+    record_submission_stats(db, BATCH)
+
+    assert stats(db) == EXPECTED
+    assert progress(db, ALICE)['attempts'] == 2
+    assert len(db.user_events.documents) == 2
+
+
+def test_progress_changed_after_reading_is_read_again():
+    db = FakeDatabase()
+    record_submission_stats(db, [submission(ALICE, False, 0)])
+    later = [submission(ALICE, True, 5)]
+
+    # Another process folds a submission in between this one's read and write
+    db.exercise_progress.before_bulk_write = lambda: record_submission_stats(db, [submission(ALICE, False, 3)])
+    record_submission_stats(db, later)
+
+    assert progress(db, ALICE)['attempts'] == 3
+    assert stats(db)['attempts'] == 3
+    assert stats(db)['distinct_users'] == 1
+    assert stats(db)['attempts_to_solve'] == {'3': 1}
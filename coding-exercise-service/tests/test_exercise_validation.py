@@ -0,0 +1,28 @@
+from app import code_executor
+from app.services.exercise_validation import derive_time_limit, validate_exercise
+
+
+def test_derive_time_limit():
+    assert derive_time_limit([]) is None
+    assert derive_time_limit([0.01, 0.02]) == 1.0
+    assert derive_time_limit([0.5, 0.71]) == 2.2
+    assert derive_time_limit([4.0], maximum=5) == 5
+
+
+def test_time_limit_follows_cpu_time_not_cold_start_wall_time(monkeypatch):
+    # A cold interpreter spends most of its wall time starting up
+    def execute(code, inputs, expected=None):
+        return {"results": [{"success": True, "output": output, "error": None,
+                             "wall_time": 2.5, "cpu_time": 0.4 + i / 10}
+                            for i, output in enumerate(expected)]}
+
+    monkeypatch.setattr(code_executor, 'execute_python_batch', execute)
+    validation = validate_exercise({
+        'solution_code': {'python': "def double(x):\n    return 2 * x"},
+        'test_cases': [{'input': "double(1)", 'expected_output': "2"},
+                       {'input': "double(2)", 'expected_output': "4"}]
+    })
+
+    assert validation['status'] == "passed"
+    assert validation['reference_time'] == 0.5
+    assert validation['time_limit'] == 1.5
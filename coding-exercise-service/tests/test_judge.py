@@ -0,0 +1,70 @@
+import pytest
+from bson.objectid import ObjectId
+from app import code_executor
+from app.services.judge import check_syntax, judge_code, resolve_max_failures
+
+
+def exercise(count, max_failures=None):
+    return {
+        '_id': ObjectId(),
+        'test_cases': [{'input': f"double({i})", 'expected_output': str(2 * i), 'is_hidden': False}
+                       for i in range(count)],
+        'max_failures': max_failures
+    }
+
+
+@pytest.mark.parametrize('request_data, exercise_value, expected', [
+    ({}, None, None),
+    ({}, 3, 3),
+    ({'max_failures': 2}, 3, 2),
+    ({'max_failures': '2'}, None, 2),
+    ({'max_failures': None}, 3, None),
+    ({'fail_fast': True, 'max_failures': 5}, 3, 1),
+])
+def test_resolve_max_failures(request_data, exercise_value, expected):
+    assert resolve_max_failures(request_data, {'max_failures': exercise_value}) == expected
+
+
+@pytest.mark.parametrize('value', [0, -1, 1.5, '1.5', 'abc', True, [1]])
+def test_resolve_max_failures_rejects_anything_but_a_positive_int(value):
+    with pytest.raises(ValueError, match="max_failures must be a positive integer"):
+        resolve_max_failures({'max_failures': value}, {})
+    with pytest.raises(ValueError, match="The exercise's max_failures"):
+        resolve_max_failures({}, {'max_failures': value})
+
+
+def test_check_syntax():
+    assert check_syntax("def double(x):\n    return 2 * x") is None
+    assert 'SyntaxError' in check_syntax("def double(x)\n    return 2 * x")
+    assert 'SyntaxError' in check_syntax("x = '\0'")
+
+
+def test_code_that_does_not_compile_is_never_run(monkeypatch):
+    def run(*args, **kwargs):
+        raise AssertionError("nothing should run")
+    monkeypatch.setattr(code_executor, 'execute_python_batch', run)
+    reported = []
+
+    judgement = judge_code(exercise(3), 'python', "def double(x)\n    return 2 * x", on_case=reported.append)
+
+    assert 'SyntaxError' in judgement['compile_error']
+    assert judgement['results'][0]['error'] == judgement['compile_error']
+    assert [result.get('skipped', False) for result in judgement['results']] == [False, True, True]
+    assert reported == judgement['results'][:1]
+
+
+def test_max_failures_skips_the_remaining_cases():
+    judgement = judge_code(exercise(12, max_failures=1), 'python', "def double(x):\n    return -1",
+                           max_failures=1)
+    results = judgement['results']
+
+    assert not any(result['passed'] for result in results)
+    assert not results[0].get('skipped')
+    assert results[-1].get('skipped') is True
+    assert all(result.get('skipped') for result in results if 'actual' not in result)
+
+
+def test_passing_code_runs_every_case_despite_max_failures():
+    judgement = judge_code(exercise(6), 'python', "def double(x):\n    return 2 * x", max_failures=1)
+
+    assert [result['passed'] for result in judgement['results']] == [True] * 6
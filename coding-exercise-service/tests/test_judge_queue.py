@@ -0,0 +1,57 @@
+import threading
+import time
+from flask import Flask
+from app.services.admission import AdmissionController
+from app.services.judge_queue import JudgeQueue
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+def test_eviction_never_drops_queued_or_running_jobs():
+    judge_queue = JudgeQueue(workers=1, max_retained=1, max_pending=0, max_per_owner=0)
+    judge_queue.init_app(Flask(__name__))
+    release = threading.Event()
+
+    running = judge_queue.submit('a', release.wait, 5)
+    wait_for(lambda: judge_queue.get(running)['status'] == 'running')
+    queued = [judge_queue.submit('a', lambda n: n, n) for n in range(3)]
+
+    assert judge_queue.get(running)['status'] == 'running'
+    assert [judge_queue.get(job_id)['status'] for job_id in queued] == ['queued'] * 3
+    assert judge_queue.position(queued[-1]) == 2
+
+    release.set()
+    wait_for(lambda: judge_queue.stats()['completed'] == 4)
+
+    # Only the most recently finished job is left
+    assert judge_queue.get(running) is None
+    assert [judge_queue.get(job_id) for job_id in queued[:2]] == [None, None]
+    assert judge_queue.get(queued[-1])['result'] == 2
+
+
+def test_queued_jobs_wait_for_an_admission_slot():
+    admission = AdmissionController(max_active=1, max_per_user=1)
+    judge_queue = JudgeQueue(workers=2, max_pending=0, max_per_owner=0, admission=admission)
+    judge_queue.init_app(Flask(__name__))
+
+    # A synchronous judging holds the only slot
+    ticket = admission.acquire('a')
+    first = judge_queue.submit('a', lambda: 1)
+    second = judge_queue.submit('b', lambda: 2)
+    wait_for(lambda: admission.stats()['waiting'] == 2)
+
+    assert [judge_queue.get(job_id)['status'] for job_id in (first, second)] == ['queued', 'queued']
+    assert [judge_queue.position(job_id) for job_id in (first, second)] == [0, 0]
+
+    admission.release(ticket)
+    wait_for(lambda: judge_queue.stats()['completed'] == 2)
+
+    assert judge_queue.get(first)['result'] == 1
+    assert judge_queue.position(first) is None
+    assert admission.stats()['active'] == 0
+    assert admission.stats()['admitted'] == 3
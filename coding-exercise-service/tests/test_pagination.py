@@ -0,0 +1,47 @@
+import base64
+import json
+import pytest
+from bson.objectid import ObjectId
+from app.services.pagination import encode_cursor, decode_cursor
+
+
+def test_cursor_round_trips():
+    last_id = ObjectId()
+    filters = {'topic': 'algorithms', 'difficulty': 'easy'}
+
+    token = encode_cursor(last_id, filters)
+
+    assert decode_cursor(token, dict(reversed(list(filters.items())))) == last_id
+    assert '=' not in token
+
+
+def test_cursor_is_bound_to_its_filters():
+    token = encode_cursor(ObjectId(), {'topic': 'algorithms'})
+
+    with pytest.raises(ValueError, match="filters"):
+        decode_cursor(token, {'topic': 'strings'})
+    with pytest.raises(ValueError, match="filters"):
+        decode_cursor(token, {})
+
+
+def test_edited_cursor_cannot_drop_its_filters():
+    token = encode_cursor(ObjectId(), {'topic': 'algorithms'})
+    payload = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    payload['filters'] = {}
+    forged = base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+
+    with pytest.raises(ValueError):
+        decode_cursor(forged, {'topic': 'algorithms'})
+
+
+@pytest.mark.parametrize('token', [
+    'not base64!',
+    base64.urlsafe_b64encode(b'not json').decode(),
+    base64.urlsafe_b64encode(b'[]').decode(),
+    base64.urlsafe_b64encode(b'{"filters": {}}').decode(),
+    base64.urlsafe_b64encode(b'{"after": "nope", "filters": {}}').decode(),
+    base64.urlsafe_b64encode(b'\xff\xfe').decode()
+])
+def test_malformed_cursor_is_rejected(token):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor(token, {})
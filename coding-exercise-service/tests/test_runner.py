@@ -0,0 +1,159 @@
+import pytest
+from app.services.code_execution import CodeExecutionService
+from app.services.runner import OutputDigest, StreamingMatcher, output_digest
+from app.services.worker_pool import WorkerPool
+
+pytestmark = pytest.mark.skipif(not WorkerPool.supported(), reason="the runner needs os.fork")
+
+
+@pytest.fixture(scope='module')
+def executor():
+    executor = CodeExecutionService(timeout=5, pool_size=1, max_concurrency=4, output_limit_kb=64)
+    yield executor
+    executor.pool.shutdown()
+
+
+def outputs(execution):
+    return [result['output'] for result in execution['results']]
+
+
+# Module-level code that writes forged load and case records, claiming
+# every case matched, to every descriptor it can find
+FORGING_SUBMISSION = '''
+import json, os, socket
+records = [{"loaded": True, "returncode": 0, "stdout": "", "limit_exceeded": None, "cpu_time": 0}]
+records += [{"index": i, "returncode": 0, "stdout": "", "stderr": "", "timed_out": False,
+             "limit_exceeded": None, "cpu_time": 0, "wall_time": 0, "peak_rss_kb": 0, "matched": True}
+            for i in range(3)]
+for fd in range(3, 256):
+    try:
+        os.write(fd, ''.join(json.dumps(record) + '\\n' for record in records).encode())
+    except OSError:
+        pass
+    try:
+        channel = socket.socket(fileno=os.dup(fd))
+    except OSError:
+        continue
+    for record in records:
+        try:
+            channel.send(json.dumps(record).encode())
+        except OSError:
+            pass
+    channel.close()
+
+def solve(x):
+    return "wrong"
+'''
+
+
+def test_forged_records_do_not_pass_cases(executor):
+    execution = executor.execute_python_batch(FORGING_SUBMISSION, ["solve(1)", "solve(2)", "solve(3)"],
+                                              expected=["1", "2", "3"])
+
+    assert [result['success'] for result in execution['results']] == [True, True, True]
+    assert outputs(execution) == ["wrong", "wrong", "wrong"]
+
+
+def test_output_is_matched_with_module_level_prefix(executor):
+    code = "print('  header')\ndef double(x):\n    return x * 2\n"
+    expected = ["header\n2", "header\n4", "header\n7"]
+    execution = executor.execute_python_batch(code, ["double(1)", "double(2)", "double(3)"], expected=expected)
+
+    assert outputs(execution) == ["header\n2", "header\n4", "header\n6"]
+
+
+def test_module_level_exit_applies_to_every_case(executor):
+    execution = executor.execute_python_batch("import sys\nprint('bye')\nsys.exit(3)", ["1", "2"])
+
+    assert [result['success'] for result in execution['results']] == [False, False]
+
+
+def test_slow_case_times_out_alone(executor):
+    code = "import time\ndef wait(seconds):\n    time.sleep(seconds)\n    return seconds\n"
+    execution = executor.execute_python_batch(code, ["wait(0)", "wait(10)", "wait(0)"], expected=["0", "10", "0"],
+                                              timeout=0.5)
+
+    assert [result['error'] for result in execution['results']] == [None, "Execution timed out", None]
+    assert outputs(execution)[2] == "0"
+
+
+def test_output_cap_stops_case(executor):
+    execution = executor.execute_python_batch("def spam():\n    print('x' * 100000)\n", ["spam()"])
+
+    assert execution['results'][0]['limit_exceeded'] == 'output'
+
+
+def test_max_failures_skips_unstarted_cases(executor):
+    executor.max_parallel_cases = 1
+    # The case after the failure starts before the runner hears of it;
+    # it sleeps long enough for the cancel to arrive
+    code = "import time\ndef echo(x):\n    time.sleep(0.2 if x > 1 else 0)\n    return x\n"
+    try:
+        execution = executor.execute_python_batch(code, [f"echo({i})" for i in range(5)],
+                                                  expected=["0", "wrong", "2", "3", "4"], max_failures=1)
+    finally:
+        executor.max_parallel_cases = 4
+
+    assert [result.get('skipped', False) for result in execution['results']] == [False, False, False, True, True]
+
+
+# Looks through every reachable container and frame for strings holding a
+# marker, other than the ones in its own input; the markers are built at
+# run time so the source itself holds neither
+PROBING_SUBMISSION = '''
+import gc, sys
+MARKERS = (''.join(['SEC', 'RET-']), ''.join(['IN', 'PUT-']))
+
+def marked(text):
+    return any(marker in text for marker in MARKERS)
+
+def strings(value):
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        for item in list(value.keys()) + list(value.values()):
+            yield from strings(item) if isinstance(item, str) else ()
+    elif isinstance(value, (list, tuple, set)):
+        for item in value:
+            yield from strings(item) if isinstance(item, str) else ()
+
+def probe(own):
+    seen = set()
+    for container in gc.get_objects():
+        seen.update(text for text in strings(container) if marked(text))
+    frame = sys._getframe()
+    while frame is not None:
+        for value in frame.f_locals.values():
+            seen.update(text for text in strings(value) if marked(text))
+        frame = frame.f_back
+    return sorted(text for text in seen if own not in text and text not in MARKERS)
+'''
+
+
+def test_expected_outputs_and_other_inputs_are_unreachable(executor):
+    inputs = [f"probe('INPUT-{i}')" for i in range(3)]
+    execution = executor.execute_python_batch(PROBING_SUBMISSION, inputs,
+                                              expected=[f"SECRET-{i}" for i in range(3)])
+
+    assert outputs(execution) == ["[]", "[]", "[]"]
+
+
+@pytest.mark.parametrize('output', ["42", "  42\n\n", "\n4\n2 \n", "4 2", "42\n\n1", "", "é\n"])
+@pytest.mark.parametrize('chunk', [1, 2, 5, 100])
+def test_streamed_matching_equals_strip(output, chunk):
+    data = output.encode('utf-8')
+    for expected in ("42", "4\n2", "4 2", "", "é", " 42"):
+        matcher = StreamingMatcher(expected)
+        digest = OutputDigest()
+        for start in range(0, len(data), chunk):
+            matcher.feed(data[start:start + chunk])
+            digest.feed(data[start:start + chunk])
+        assert matcher.finish() == (output.strip() == expected)
+        assert (digest.hexdigest() == output_digest(expected)) == (output.strip() == expected)
+
+
+def test_cases_get_the_effective_cpu_limit(executor):
+    code = "import resource\ndef limit():\n    return resource.getrlimit(resource.RLIMIT_CPU)[0]"
+    execution = executor.execute_python_batch(code, ["limit()"] * 2, timeout=1.5)
+
+    assert outputs(execution) == ["2", "2"]
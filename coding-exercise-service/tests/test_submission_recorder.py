@@ -0,0 +1,181 @@
+import threading
+import time
+import pytest
+from pymongo.errors import AutoReconnect, BulkWriteError
+from app.services.submission_recorder import SubmissionRecorder
+
+
+class FakeCollection:
+    """
+    Keeps inserted documents; insert_many raises the queued errors first.
+    An (error, count) entry stores the first count documents, then raises.
+    """
+
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.documents = []
+
+    def insert_many(self, documents, ordered=True):
+        stored = {document['_id'] for document in self.documents if '_id' in document}
+        duplicates = [i for i, document in enumerate(documents) if document.get('_id') in stored]
+        if self.errors:
+            error = self.errors.pop(0)
+            if isinstance(error, tuple):
+                error, count = error
+                self.documents.extend(documents[:count])
+                raise error
+            failed = {entry['index'] for entry in getattr(error, 'details', {}).get('writeErrors', [])}
+            self.documents.extend(document for i, document in enumerate(documents) if i not in failed)
+            raise error
+        self.documents.extend(document for i, document in enumerate(documents) if i not in duplicates)
+        if duplicates:
+            raise bulk_error(*duplicates)
+
+    def insert_one(self, document):
+        self.documents.append(document)
+
+
+def bulk_error(*indexes):
+    return BulkWriteError({
+        "writeErrors": [{"index": index, "code": 11000, "errmsg": "duplicate key"} for index in indexes],
+        "nInserted": 0
+    })
+
+
+def record_batch(collection, count=4, **options):
+    written = []
+    recorder = SubmissionRecorder(lambda: collection, mode='batched', max_retries=1,
+                                  on_written=written.extend, **options)
+    submissions = [{"n": i} for i in range(count)]
+    for submission in submissions:
+        recorder.record(submission)
+    recorder.close()
+    return recorder.stats(), submissions, written
+
+
+class BlockingCollection(FakeCollection):
+    """A collection whose inserts wait until release is set."""
+
+    def __init__(self):
+        super().__init__()
+        self.release = threading.Event()
+
+    def insert_many(self, documents, ordered=True):
+        self.release.wait(5)
+        super().insert_many(documents, ordered)
+
+
+def test_batches_are_cut_at_batch_size_and_flushed_on_close():
+    collection = FakeCollection()
+    stats, submissions, written = record_batch(collection, count=10, batch_size=4, flush_interval=5)
+
+    assert collection.documents == submissions
+    assert all('_id' in submission for submission in submissions)
+    assert stats['written'] == 10 and stats['pending'] == 0
+    assert stats['batches'] == 3
+    assert stats['batch_size']['max'] == 4
+
+
+def test_full_queue_writes_inline_instead_of_dropping():
+    collection = BlockingCollection()
+    recorder = SubmissionRecorder(lambda: collection, mode='batched', batch_size=1, capacity=1,
+                                  put_timeout=0.01)
+    # The writer takes the first document and blocks on it; the second
+    # fills the queue, so the third has nowhere to go
+    recorder.record({"n": 0})
+    while recorder.stats()['pending']:
+        time.sleep(0.001)
+    recorder.record({"n": 1})
+    threading.Timer(0.2, collection.release.set).start()
+    recorder.record({"n": 2})
+    recorder.close()
+
+    stats = recorder.stats()
+    assert sorted(document['n'] for document in collection.documents) == [0, 1, 2]
+    assert stats['backpressure_waits'] == 1
+    assert stats['inline_writes'] == 1
+    assert stats['written'] == 3
+
+
+def test_partial_insert_failure_counts_only_written_documents():
+    collection = FakeCollection([bulk_error(1, 3)])
+    stats, submissions, written = record_batch(collection)
+
+    assert (stats['written'], stats['failed'], stats['retries']) == (2, 2, 0)
+    assert written == [submissions[0], submissions[2]]
+    assert collection.documents == written
+
+
+def test_insert_failure_is_retried_then_counted():
+    collection = FakeCollection([AutoReconnect(), AutoReconnect()])
+    stats, _, written = record_batch(collection)
+
+    assert (stats['written'], stats['failed'], stats['retries']) == (0, 4, 1)
+    assert written == [] and collection.documents == []
+
+
+def test_retry_after_a_partially_applied_insert_counts_duplicates_as_written():
+    # The connection drops after two documents were stored; the retry gets
+    # duplicate key errors for those two
+    collection = FakeCollection([(AutoReconnect(), 2)])
+    stats, submissions, written = record_batch(collection)
+
+    assert (stats['written'], stats['failed'], stats['retries']) == (4, 0, 1)
+    assert written == submissions
+    assert collection.documents == submissions
+
+
+def test_duplicate_on_first_attempt_is_a_failure():
+    collection = FakeCollection([bulk_error(0)])
+    stats, submissions, written = record_batch(collection, count=2)
+
+    assert (stats['written'], stats['failed']) == (1, 1)
+    assert written == submissions[1:]
+
+
+def test_before_write_errors_are_not_read_as_submission_failures():
+    collection = FakeCollection()
+    calls = []
+
+    def before_write(batch):
+        # e.g. the code_blobs bulk write failing on its first blob
+        calls.append(len(batch))
+        raise bulk_error(0)
+
+    stats, submissions, written = record_batch(collection, before_write=before_write)
+
+    assert calls == [4, 4]
+    assert (stats['written'], stats['failed'], stats['before_write_errors']) == (4, 0, 1)
+    assert written == submissions and collection.documents == submissions
+
+
+def test_before_write_is_retried_alone():
+    collection = FakeCollection()
+    attempts = []
+
+    def before_write(batch):
+        attempts.append(len(batch))
+        if len(attempts) == 1:
+            raise AutoReconnect()
+        for document in batch:
+            document['prepared'] = True
+
+    stats, submissions, written = record_batch(collection, before_write=before_write)
+
+    assert (stats['written'], stats['retries'], stats['before_write_errors']) == (4, 1, 0)
+    assert all(document['prepared'] for document in collection.documents)
+
+
+@pytest.mark.parametrize('mode', ['sync', 'batched'])
+def test_on_written_errors_do_not_fail_submissions(mode):
+    collection = FakeCollection()
+
+    def on_written(documents):
+        raise RuntimeError("stats unavailable")
+
+    recorder = SubmissionRecorder(lambda: collection, mode=mode, on_written=on_written)
+    recorder.record({"n": 0})
+    recorder.close()
+
+    assert recorder.stats()['written'] == 1
+    assert recorder.stats()['on_written_errors'] == 1
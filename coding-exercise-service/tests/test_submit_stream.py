@@ -0,0 +1,94 @@
+import json
+import pytest
+from bson.objectid import ObjectId
+from flask_jwt_extended import create_access_token
+from app import create_app, admission, exercise_cache
+from app.config import Config
+from app.routes import exercises as routes
+
+EXERCISE = {
+    '_id': ObjectId(),
+    'test_cases': [
+        {'input': '1', 'expected_output': '1', 'is_hidden': False},
+        {'input': '2', 'expected_output': '2', 'is_hidden': True}
+    ]
+}
+
+
+class TestConfig(Config):
+    TESTING = True
+    # Nothing listens here, so index creation fails at once
+    MONGO_URI = 'mongodb://127.0.0.1:1/test?serverSelectionTimeoutMS=50&connectTimeoutMS=50'
+    EXECUTION_POOL_SIZE = 0
+    ADMISSION_MAX_PER_USER = 1
+
+
+@pytest.fixture(scope='module')
+def app():
+    return create_app(TestConfig)
+
+
+@pytest.fixture
+def client(app, monkeypatch):
+    monkeypatch.setattr(exercise_cache, 'get', lambda exercise_id: EXERCISE)
+    return app.test_client()
+
+
+@pytest.fixture
+def headers(app):
+    with app.app_context():
+        return {'Authorization': f"Bearer {create_access_token(identity='user-1')}"}
+
+
+def submit(client, headers, **fields):
+    body = dict({'exercise_id': str(EXERCISE['_id']), 'language': 'python', 'code': 'x = 1'}, **fields)
+    return client.post('/api/exercises/submit/stream', json=body, headers=headers)
+
+
+def test_stream_sends_visible_cases_then_summary(client, headers, monkeypatch):
+    def judge(user_id, exercise, language, code, max_failures, on_case):
+        assert max_failures == 2
+        on_case({"test_case_id": 0, "passed": True, "hidden": False})
+        on_case({"test_case_id": 1, "passed": True, "hidden": True})
+        return {"passed": True, "results": []}
+    monkeypatch.setattr(routes, 'process_submission', judge)
+
+    response = submit(client, headers, max_failures=2)
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    assert lines == [
+        {"event": "case", "result": {"test_case_id": 0, "passed": True, "hidden": False}},
+        {"event": "summary", "passed": True, "results": []}
+    ]
+
+
+def test_stream_reports_judging_errors(client, headers, monkeypatch):
+    def judge(*args):
+        raise RuntimeError("runner crashed")
+    monkeypatch.setattr(routes, 'process_submission', judge)
+
+    lines = submit(client, headers).get_data(as_text=True).splitlines()
+
+    assert [json.loads(line) for line in lines] == [{"event": "error", "message": "runner crashed"}]
+
+
+@pytest.mark.parametrize('value', ['abc', '1.5'])
+def test_stream_rejects_bad_max_failures(client, headers, value):
+    response = submit(client, headers, max_failures=value)
+
+    assert response.status_code == 400
+    assert 'message' in response.get_json()
+
+
+def test_stream_is_rejected_by_admission_before_it_starts(client, headers):
+    ticket = admission.acquire('user-1')
+    try:
+        response = submit(client, headers)
+    finally:
+        admission.release(ticket)
+
+    assert response.status_code == 429
+    assert response.get_json()['reason'] == 'user_limit'
+    assert 'Retry-After' in response.headers
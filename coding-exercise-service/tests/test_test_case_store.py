@@ -0,0 +1,73 @@
+import io
+from bson.objectid import ObjectId
+from app.services.test_case_store import TestCaseStore, externalize_exercises
+
+
+class FakeGridFS:
+    def __init__(self):
+        self.files = {}
+
+    def exists(self, digest):
+        return digest in self.files
+
+    def put(self, data, _id):
+        self.files[_id] = data
+
+    def get(self, digest):
+        return io.BytesIO(self.files[digest])
+
+
+class FakeExercises:
+    def __init__(self, documents):
+        self.documents = {document['_id']: document for document in documents}
+        self.writes = []
+
+    def find(self, query, projection):
+        class Cursor(list):
+            def batch_size(self, size):
+                return self
+        return Cursor(dict(document) for document in self.documents.values())
+
+    def bulk_write(self, updates, ordered=True):
+        self.writes.append(len(updates))
+        for update in updates:
+            self.documents[update._filter['_id']].update(update._doc['$set'])
+
+
+class FakeDatabase:
+    def __init__(self, exercises):
+        self.exercises = FakeExercises(exercises)
+
+
+def store(**options):
+    test_case_store = TestCaseStore(lambda: None, **options)
+    test_case_store._fs = FakeGridFS()
+    return test_case_store
+
+
+def test_cache_is_bounded_in_encoded_bytes():
+    # Six characters, 18 bytes in UTF-8
+    payload = '\U0001f600é' * 3
+    test_case_store = store(inline_limit=4, cache_bytes=20)
+    cases = test_case_store.externalize([{'input': payload, 'expected_output': payload + 'x'}])
+
+    resolved = test_case_store.resolve(cases)
+
+    assert resolved[0]['input'] == payload and resolved[0]['expected_output'] == payload + 'x'
+    stats = test_case_store.stats()
+    # 18 + 19 bytes do not fit in 20 (12 + 13 characters would have)
+    assert (stats['cached_payloads'], stats['cached_bytes'], stats['evictions']) == (1, 19, 1)
+
+
+def test_externalize_reports_rewritten_exercises():
+    small = {'_id': ObjectId(), 'test_cases': [{'input': '1', 'expected_output': '1'}]}
+    large = [{'_id': ObjectId(), 'test_cases': [{'input': 'x' * 100, 'expected_output': '1'}]} for _ in range(3)]
+    db = FakeDatabase([small] + large)
+    rewritten = []
+
+    count = externalize_exercises(db, store(inline_limit=16), batch_size=2, on_rewritten=rewritten.append)
+
+    assert count == 3
+    assert db.exercises.writes == [2, 1]
+    assert rewritten == [exercise['_id'] for exercise in large]
+    assert all('input_blob' in db.exercises.documents[exercise['_id']]['test_cases'][0] for exercise in large)
@@ -0,0 +1,42 @@
+import io
+from contextlib import redirect_stdout
+import pytest
+from app.services.verdict_cache import VerdictCache, normalize_code
+
+EXERCISE = {"_id": "64b000000000000000000001", "test_cases": [{"input": "1", "expected_output": "1"}],
+            "time_limit": 2}
+
+
+def run(code):
+    """What the code prints, or the name of the error it fails with."""
+    output = io.StringIO()
+    try:
+        with redirect_stdout(output):
+            exec(compile(code, '<submission>', 'exec'), {})
+    except Exception as e:
+        return type(e).__name__
+    return output.getvalue()
+
+
+@pytest.mark.parametrize('first, second', [
+    # Trailing spaces inside a triple-quoted string are part of its value
+    ('s = """a  \nb"""\nprint(repr(s))', 's = """a\nb"""\nprint(repr(s))'),
+    # A space after a backslash continuation is a syntax error
+    ('x = 1 + \\ \n2\nprint(x)', 'x = 1 + \\\n2\nprint(x)'),
+    ('print("""\n\n""")', 'print("""\n""")'),
+])
+def test_codes_that_behave_differently_get_different_keys(first, second):
+    assert run(first) != run(second)
+    assert VerdictCache.make_key(EXERCISE, 'python', first) != VerdictCache.make_key(EXERCISE, 'python', second)
+
+
+@pytest.mark.parametrize('code', [
+    's = """a\r\nb"""\r\nprint(repr(s))\r\n',
+    's = """a\rb"""\rprint(repr(s))\r',
+])
+def test_line_endings_share_a_key(code):
+    unix = code.replace('\r\n', '\n').replace('\r', '\n')
+
+    assert normalize_code(code) == unix
+    assert run(code) == run(unix)
+    assert VerdictCache.make_key(EXERCISE, 'python', code) == VerdictCache.make_key(EXERCISE, 'python', unix)
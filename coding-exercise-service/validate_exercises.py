@@ -0,0 +1,44 @@
+"""
+Validate reference solutions and derive per-exercise time limits.
+
+Runs every exercise's solution_code['python'] against all of its test cases,
+storing the result and the derived time limit on the exercise:
+    python validate_exercises.py [--unvalidated]
+
+Or inserts new exercises from NDJSON (one exercise per line, '-' for stdin),
+validating each batch before it is written:
+    python validate_exercises.py --ingest exercises.ndjson [--reject-failed]
+"""
+import argparse
+import json
+import sys
+from app import create_app, mongo
+from app.services.exercise_validation import ingest_exercises, validate_exercises
+
+app = create_app()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--ingest', metavar='PATH', help="NDJSON file of new exercises ('-' for stdin)")
+    parser.add_argument('--unvalidated', action='store_true', help="Only validate exercises never validated")
+    parser.add_argument('--reject-failed', action='store_true', help="Do not ingest exercises that fail validation")
+    parser.add_argument('--no-validate', action='store_true', help="Ingest without running the solutions")
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=4, help="Exercises validated at once")
+    args = parser.parse_args()
+
+    factor = app.config.get('VALIDATION_TIME_LIMIT_FACTOR', 3.0)
+    minimum = app.config.get('VALIDATION_MIN_TIME_LIMIT', 1.0)
+
+    with app.app_context():
+        if args.ingest:
+            stream = sys.stdin if args.ingest == '-' else open(args.ingest, encoding='utf-8')
+            with stream:
+                summary = ingest_exercises(mongo.db, stream, args.batch_size, args.workers,
+                                           validate=not args.no_validate, reject_failed=args.reject_failed,
+                                           factor=factor, minimum=minimum)
+            print(json.dumps(summary, indent=2))
+        else:
+            query = {'validation': {'$exists': False}} if args.unvalidated else {}
+            counts = validate_exercises(mongo.db, query, args.batch_size, args.workers, factor, minimum)
+            print(f"Validated {sum(counts.values())} exercises: {json.dumps(counts)}")
@@ -3,10 +3,20 @@ from flask_pymongo import PyMongo
 from flask_jwt_extended import JWTManager
 from flask_cors import CORS
 from app.config import Config
+from app.models.recommendation import ensure_recommendation_indexes, ensure_user_event_indexes
+from app.services.co_occurrence import ItemSimilarity
+from app.services.course_catalog import CourseCatalog
+from app.services.precomputed_recommendations import PrecomputedRecommendations
+from app.services.recommendation_cache import RecommendationCache
 
 # Initialize extensions **outside** create_app() to avoid circular imports
 mongo = PyMongo()
 jwt = JWTManager()
+course_catalog = CourseCatalog(lambda: mongo.db.courses)
+recommendation_cache = RecommendationCache(lambda: mongo.db.user_events)
+precomputed_recommendations = PrecomputedRecommendations(lambda: mongo.db)
+course_similarity = ItemSimilarity(lambda: mongo.db.progress, 'course_id')
+exercise_similarity = ItemSimilarity(lambda: mongo.db.exercise_progress, 'exercise_id')
 
 def create_app(config_class=Config):
     app = Flask(__name__)
@@ -18,6 +28,26 @@ def create_app(config_class=Config):
     # Initialize extensions with app
     mongo.init_app(app)
     jwt.init_app(app)
+    course_catalog.init_app(app)
+    recommendation_cache.init_app(app)
+    precomputed_recommendations.init_app(app)
+    course_similarity.init_app(app)
+    exercise_similarity.init_app(app)
+
+    # Index the catalog's change polling relies on
+    with app.app_context():
+        try:
+            mongo.db.courses.create_index('updated_at')
+        except Exception as e:
+            app.logger.warning(f"Could not create course indexes: {e}")
+        try:
+            ensure_user_event_indexes(mongo.db, app.config.get('USER_EVENTS_RETENTION', 86400))
+        except Exception as e:
+            app.logger.warning(f"Could not create user event indexes: {e}")
+        try:
+            ensure_recommendation_indexes(mongo.db)
+        except Exception as e:
+            app.logger.warning(f"Could not create recommendation indexes: {e}")
 
     # Import blueprints inside the function to avoid circular imports
     from app.routes.recommendations import recommendation_bp
@@ -8,4 +8,31 @@ class Config:
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY', 'dev-jwt-secret')
     
     # MongoDB settings
-    MONGO_URI = os.environ.get('MONGO_URI')
\ No newline at end of file
+    MONGO_URI = os.environ.get('MONGO_URI')
+
+    # Course catalog settings
+    COURSE_CATALOG_ENABLED = os.environ.get('COURSE_CATALOG_ENABLED', 'true').lower() == 'true'  # Rank courses from the in-memory catalog
+    COURSE_CATALOG_REFRESH_INTERVAL = int(os.environ.get('COURSE_CATALOG_REFRESH_INTERVAL', 30))  # Seconds between polls for updated courses
+    COURSE_CATALOG_FULL_RELOAD_INTERVAL = int(os.environ.get('COURSE_CATALOG_FULL_RELOAD_INTERVAL', 600))  # Seconds between full reloads (picks up deletions)
+
+    # Recommendation cache settings
+    RECOMMENDATION_CACHE_ENABLED = os.environ.get('RECOMMENDATION_CACHE_ENABLED', 'true').lower() == 'true'  # Cache results per (user, endpoint, limit)
+    RECOMMENDATION_CACHE_SIZE = int(os.environ.get('RECOMMENDATION_CACHE_SIZE', 10000))  # Cached results kept (least recently used evicted first)
+    RECOMMENDATION_CACHE_TTL = int(os.environ.get('RECOMMENDATION_CACHE_TTL', 300))  # Seconds a result is served as fresh
+    RECOMMENDATION_CACHE_STALE_WHILE_REVALIDATE = os.environ.get('RECOMMENDATION_CACHE_STALE_WHILE_REVALIDATE', 'true').lower() == 'true'  # Serve stale results while recomputing in the background
+    RECOMMENDATION_CACHE_MAX_STALE = int(os.environ.get('RECOMMENDATION_CACHE_MAX_STALE', 3600))  # Oldest result served while revalidating, in seconds
+    RECOMMENDATION_EVENTS_POLL_INTERVAL = int(os.environ.get('RECOMMENDATION_EVENTS_POLL_INTERVAL', 2))  # Seconds between polls of user_events
+    USER_EVENTS_RETENTION = int(os.environ.get('USER_EVENTS_RETENTION', 86400))  # Seconds user events are kept
+
+    # Precomputed recommendation settings
+    PRECOMPUTED_RECOMMENDATIONS_ENABLED = os.environ.get('PRECOMPUTED_RECOMMENDATIONS_ENABLED', 'true').lower() == 'true'  # Serve results of precompute_recommendations.py when fresh
+    PRECOMPUTE_LIMIT = int(os.environ.get('PRECOMPUTE_LIMIT', 20))  # Courses and exercises precomputed per user
+    PRECOMPUTED_MAX_AGE = int(os.environ.get('PRECOMPUTED_MAX_AGE', 86400))  # Oldest precomputed results served, in seconds (capped at USER_EVENTS_RETENTION)
+
+    # Collaborative filtering settings
+    COLLABORATIVE_ENABLED = os.environ.get('COLLABORATIVE_ENABLED', 'true').lower() == 'true'  # Blend item-item co-occurrence into scores
+    COLLABORATIVE_WEIGHT = float(os.environ.get('COLLABORATIVE_WEIGHT', 1.0))  # Multiplier of the collaborative score
+    COLLABORATIVE_NEIGHBORS = int(os.environ.get('COLLABORATIVE_NEIGHBORS', 50))  # Most similar items kept per item
+    COLLABORATIVE_MIN_COUNT = int(os.environ.get('COLLABORATIVE_MIN_COUNT', 2))  # Users two items must share to count as similar
+    COLLABORATIVE_REFRESH_INTERVAL = int(os.environ.get('COLLABORATIVE_REFRESH_INTERVAL', 60))  # Seconds between incremental updates
+    COLLABORATIVE_REBUILD_INTERVAL = int(os.environ.get('COLLABORATIVE_REBUILD_INTERVAL', 3600))  # Seconds between full rebuilds
\ No newline at end of file
@@ -7,20 +7,25 @@ recommendation_schema = {
     "item_type": str,  # Type of the recommended item (course, exercise, article, etc.)
     "reason": str,  # Reason for the recommendation
     "score": float,  # Relevance score (0-1)
+    "rank": int,  # Position in the user's recommendations of this item type, best first
     "created_at": datetime,
+    "computed_at": datetime,  # Batch run that last produced it (see precompute_recommendations.py)
     "viewed": bool,  # Whether the user has viewed this recommendation
     "clicked": bool  # Whether the user has clicked on this recommendation
 }
 
-def create_recommendation_document(user_id, item_id, item_type, reason, score):
+def create_recommendation_document(user_id, item_id, item_type, reason, score, rank=0):
     """Create a new recommendation document."""
+    now = datetime.utcnow()
     return {
         "user_id": user_id,
         "item_id": item_id,
         "item_type": item_type,
         "reason": reason,
         "score": score,
-        "created_at": datetime.utcnow(),
+        "rank": rank,
+        "created_at": now,
+        "computed_at": now,
         "viewed": False,
         "clicked": False
     }
@@ -50,4 +55,23 @@ def create_learning_path_document(user_id, goal, estimated_duration, items=None)
         "estimated_duration": estimated_duration,
         "created_at": datetime.utcnow(),
         "items": items or []
-    }
\ No newline at end of file
+    }
+
+# Changes to a user's recommendation inputs, written by the user-management
+# (progress) and coding exercise (first passing submission) services and
+# read by RecommendationCache
+user_event_schema = {
+    "user_id": "ObjectId",
+    "source": str,  # What changed: progress, exercise_progress or profile
+    "at": datetime
+}
+
+def ensure_user_event_indexes(db, retention):
+    """Expire user events after retention seconds; they only matter until polled."""
+    db.user_events.create_index('at', expireAfterSeconds=retention)
+    db.user_events.create_index([('user_id', 1), ('at', 1)])
+
+def ensure_recommendation_indexes(db):
+    """Create the indexes used to write and serve precomputed recommendations."""
+    db.recommendations.create_index([('user_id', 1), ('item_type', 1), ('item_id', 1)], unique=True)
+    db.recommendations.create_index([('user_id', 1), ('item_type', 1), ('rank', 1)])
\ No newline at end of file
@@ -1,6 +1,6 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from app import mongo
+from app import mongo, course_catalog, recommendation_cache, course_similarity, exercise_similarity
 from bson.objectid import ObjectId
 from app.services.recommendation_engine import RecommendationEngine
 
@@ -17,8 +17,11 @@ def get_course_recommendations():
     # Get query parameters
     limit = int(request.args.get('limit', 5))
     
-    # Get recommendations
-    recommendations = recommendation_engine.recommend_courses_for_user(user_id, limit)
+    # Get recommendations, cached per user until their inputs change
+    recommendations = recommendation_cache.get(
+        user_id, 'courses', limit,
+        lambda: recommendation_engine.recommend_courses_for_user(user_id, limit)
+    )
     
     return jsonify({"recommendations": recommendations}), 200
 
@@ -30,8 +33,11 @@ def get_exercise_recommendations():
     # Get query parameters
     limit = int(request.args.get('limit', 5))
     
-    # Get recommendations
-    recommendations = recommendation_engine.recommend_exercises_for_user(user_id, limit)
+    # Get recommendations, cached per user until their inputs change
+    recommendations = recommendation_cache.get(
+        user_id, 'exercises', limit,
+        lambda: recommendation_engine.recommend_exercises_for_user(user_id, limit)
+    )
     
     # Format recommendations for the response
     formatted_recommendations = []
@@ -104,7 +110,8 @@ def get_learning_path(path_id):
                     'difficulty': course.get('difficulty')
                 }
         elif item['item_type'] == 'exercise':
-            exercise = mongo.db.exercises.find_one({'_id': ObjectId(item['item_id'])})
+            exercise = mongo.db.exercises.find_one({'_id': ObjectId(item['item_id'])},
+                                                   {'title': 1, 'description': 1, 'difficulty': 1})
             if exercise:
                 item['details'] = {
                     'title': exercise.get('title'),
@@ -133,4 +140,43 @@ def mark_learning_path_item_complete(path_id, item_index):
     if result.modified_count == 0:
         return jsonify({"message": "Learning path item not found or already completed"}), 404
     
-    return jsonify({"message": "Learning path item marked as completed"}), 200
\ No newline at end of file
+    return jsonify({"message": "Learning path item marked as completed"}), 200
+
+@recommendation_bp.route('/catalog/stats', methods=['GET'])
+@jwt_required()
+def get_catalog_stats():
+    return jsonify(course_catalog.stats()), 200
+
+
+@recommendation_bp.route('/cache/stats', methods=['GET'])
+@jwt_required()
+def get_cache_stats():
+    return jsonify(recommendation_cache.stats()), 200
+
+def _similar_items(similarity, item_id):
+    limit = int(request.args.get('limit', 10))
+    matrix = similarity.matrix()
+    similar = matrix.similar(item_id, limit) if matrix is not None else []
+    return jsonify({
+        "similar": [{"_id": similar_id, "similarity": weight} for similar_id, weight in similar]
+    }), 200
+
+@recommendation_bp.route('/courses/<course_id>/similar', methods=['GET'])
+@jwt_required()
+def get_similar_courses(course_id):
+    # Courses most often taken by the users who took this one
+    return _similar_items(course_similarity, course_id)
+
+@recommendation_bp.route('/exercises/<exercise_id>/similar', methods=['GET'])
+@jwt_required()
+def get_similar_exercises(exercise_id):
+    # Exercises most often attempted by the users who attempted this one
+    return _similar_items(exercise_similarity, exercise_id)
+
+@recommendation_bp.route('/collaborative/stats', methods=['GET'])
+@jwt_required()
+def get_collaborative_stats():
+    return jsonify({
+        "courses": course_similarity.stats(),
+        "exercises": exercise_similarity.stats()
+    }), 200
\ No newline at end of file
@@ -0,0 +1,501 @@
+import threading
+import time
+from datetime import timedelta
+import numpy as np
+from bson.objectid import ObjectId
+
+# Seconds of records re-read on every incremental refresh: ObjectIds from
+# different processes are only ordered to the second, so a record can be
+# committed with an _id below one already applied
+SOURCE_LOOKBACK = 5
+
+# Ordered item pairs generated per step of a build, which bounds its memory
+# (16 bytes per pair while counting)
+MAX_PAIRS_PER_STEP = 4_000_000
+
+
+def _baskets(user_index, item_index, n_users):
+    """
+    Group (user, item) index pairs into per-user baskets, CSR-style:
+    basket u is items[indptr[u]:indptr[u + 1]], without duplicates.
+    """
+    order = np.lexsort((item_index, user_index))
+    users = user_index[order]
+    items = item_index[order]
+    keep = np.ones(len(users), dtype=bool)
+    keep[1:] = (users[1:] != users[:-1]) | (items[1:] != items[:-1])
+    users = users[keep]
+    items = items[keep]
+    indptr = np.zeros(n_users + 1, dtype=np.int64)
+    np.cumsum(np.bincount(users, minlength=n_users), out=indptr[1:])
+    return indptr, items
+
+
+def _pair_keys(indptr, items, n_items):
+    """
+    Every ordered pair (i, j), i != j, of items sharing a basket, for the
+    baskets delimited by indptr, encoded as i * n_items + j.
+    """
+    sizes = np.diff(indptr)
+    # Each item of a basket is paired with the whole basket
+    repeats = np.repeat(sizes, sizes)
+    left = np.repeat(items[indptr[0]:indptr[-1]], repeats)
+    starts = np.repeat(np.repeat(indptr[:-1], sizes), repeats)
+    offsets = np.arange(len(left)) - np.repeat(np.cumsum(repeats) - repeats, repeats)
+    right = items[starts + offsets]
+    keep = left != right
+    return left[keep].astype(np.int64) * n_items + right[keep]
+
+
+def _merge(keys, counts):
+    """Sum the counts of equal keys; keys is a concatenation of sorted runs."""
+    if not len(keys):
+        return keys, counts
+    # A stable sort is a timsort, which merges the sorted runs in linear passes
+    order = np.argsort(keys, kind='stable')
+    keys = keys[order]
+    counts = counts[order]
+    starts = np.flatnonzero(np.concatenate([[True], keys[1:] != keys[:-1]]))
+    return keys[starts], np.add.reduceat(counts, starts)
+
+
+def co_occurrence_counts(indptr, items, n_items):
+    """
+    Count how many baskets each ordered pair of distinct items shares.
+
+    Baskets are processed a range at a time, so at most about
+    MAX_PAIRS_PER_STEP pairs are materialized at once however many users
+    there are; each range is reduced to distinct pairs before being merged
+    into the running totals.
+
+    Returns:
+        tuple: Sorted pair keys (i * n_items + j) and their counts
+    """
+    keys = np.empty(0, dtype=np.int64)
+    counts = np.empty(0, dtype=np.int64)
+    pending_keys, pending_counts, pending = [], [], 0
+    cumulative = np.cumsum(np.diff(indptr) ** 2)
+    n_users = len(indptr) - 1
+    start = 0
+    while start < n_users:
+        done = cumulative[start - 1] if start else 0
+        end = max(start + 1, int(np.searchsorted(cumulative, done + MAX_PAIRS_PER_STEP, side='right')))
+        step_keys, step_counts = np.unique(_pair_keys(indptr[start:end + 1], items, n_items), return_counts=True)
+        pending_keys.append(step_keys)
+        pending_counts.append(step_counts)
+        pending += len(step_keys)
+        # Merging only once the pending pairs outnumber the totals keeps the
+        # merges' cost linear overall
+        if pending >= max(MAX_PAIRS_PER_STEP, len(keys)):
+            keys, counts = _merge(np.concatenate([keys] + pending_keys), np.concatenate([counts] + pending_counts))
+            pending_keys, pending_counts, pending = [], [], 0
+        start = end
+    if pending_keys:
+        keys, counts = _merge(np.concatenate([keys] + pending_keys), np.concatenate([counts] + pending_counts))
+    return keys, counts
+
+
+def _top_neighbours(rows, cols, counts, item_counts, n_items, neighbors):
+    """
+    The neighbors most similar items of every item, CSR-style, from
+    co-occurrence entries sorted by row. Similarity is cosine over the
+    item-user incidence: co-occurrences / sqrt(users of i * users of j).
+    """
+    weights = counts / np.sqrt(item_counts[rows].astype(float) * item_counts[cols])
+    # Cosine similarities are in (0, 1], so this orders by row, then by
+    # descending weight; the stable sort leaves ties in column order
+    order = np.argsort(rows + (1 - weights) / 2, kind='stable')
+    rows = rows[order]
+    row_starts = np.zeros(n_items + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n_items), out=row_starts[1:])
+    keep = np.arange(len(rows)) - row_starts[rows] < neighbors
+    indptr = np.zeros(n_items + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows[keep], minlength=n_items), out=indptr[1:])
+    return indptr, cols[order][keep], weights[order][keep]
+
+
+class CoOccurrenceMatrix:
+    """
+    Item-item co-occurrence counts ("users who took X also took Y") and
+    each item's most similar items.
+
+    Counts are stored CSR-style (indptr/indices/counts, one row per item);
+    pairs seen by fewer than min_count users are dropped. The neighbour
+    lists (nbr_indptr/nbr_indices/nbr_weights) keep the top neighbors items
+    of each row by cosine similarity, which is all lookups and scoring read.
+
+    Updates (see updated) are kept as per-row deltas on top of the CSR
+    arrays, and only the rows they touch get new neighbour lists. Until the
+    next full build, rows that were not touched keep similarities computed
+    with the item popularity of the last one, and pairs below min_count at
+    that build count only the updates.
+    """
+
+    def __init__(self, ids, item_counts, indptr, indices, counts, neighbors=50, min_count=2):
+        self.ids = ids
+        self.positions = {item_id: i for i, item_id in enumerate(ids)}
+        self.item_counts = item_counts
+        self.indptr = indptr
+        self.indices = indices
+        self.counts = counts
+        self.neighbors = neighbors
+        self.min_count = min_count
+        self.delta = {}
+        self.patched = {}
+        rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+        self.nbr_indptr, self.nbr_indices, self.nbr_weights = _top_neighbours(
+            rows, indices, counts, item_counts, len(ids), neighbors
+        )
+        self._aligned = None
+
+    @classmethod
+    def from_pairs(cls, user_ids, item_ids, neighbors=50, min_count=2):
+        """
+        Build the matrix from (user, item) pairs.
+
+        Args:
+            user_ids (list): User of each pair
+            item_ids (list): Item of each pair; repeated pairs count once
+        """
+        positions = {}
+        item_index = np.fromiter((positions.setdefault(item_id, len(positions)) for item_id in item_ids),
+                                 dtype=np.int64, count=len(item_ids))
+        ids = list(positions)
+        users = {}
+        user_index = np.fromiter((users.setdefault(user_id, len(users)) for user_id in user_ids),
+                                 dtype=np.int64, count=len(user_ids))
+        n_items = len(ids)
+
+        indptr, items = _baskets(user_index, item_index, len(users))
+        item_counts = np.bincount(items, minlength=n_items)
+        keys, counts = co_occurrence_counts(indptr, items, n_items)
+        keep = counts >= min_count
+        keys, counts = keys[keep], counts[keep]
+        rows = keys // max(n_items, 1)
+        row_ptr = np.zeros(n_items + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=n_items), out=row_ptr[1:])
+        return cls(ids, item_counts, row_ptr, keys % max(n_items, 1), counts, neighbors, min_count)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def nnz(self):
+        return len(self.counts) + sum(len(row) for row in self.delta.values())
+
+    def neighbours(self, i):
+        """Indexes and similarities of item i's most similar items, best first."""
+        if i in self.patched:
+            return self.patched[i]
+        if i >= len(self.nbr_indptr) - 1:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        start, end = self.nbr_indptr[i], self.nbr_indptr[i + 1]
+        return self.nbr_indices[start:end], self.nbr_weights[start:end]
+
+    def similar(self, item_id, limit=10):
+        """
+        The items most often taken by the users who took item_id.
+
+        Returns:
+            list: (item ID, similarity) pairs, most similar first
+        """
+        i = self.positions.get(item_id)
+        if i is None:
+            return []
+        indices, weights = self.neighbours(i)
+        return [(self.ids[j], float(w)) for j, w in zip(indices[:limit], weights[:limit])]
+
+    def scores(self, seed_ids):
+        """
+        Collaborative score of every item for a user who took seed_ids: the
+        summed similarity to each seed of which the item is a neighbour.
+
+        Returns:
+            numpy.ndarray: One score per item, in matrix order
+        """
+        scores = np.zeros(len(self.ids))
+        for seed_id in seed_ids:
+            i = self.positions.get(seed_id)
+            if i is not None:
+                indices, weights = self.neighbours(i)
+                # A row never lists an item twice, so fancy-index adding is exact
+                scores[indices] += weights
+        return scores
+
+    def align(self, item_ids):
+        """
+        Matrix index of each of item_ids, -1 for items the matrix does not
+        know. The alignment of the last list passed is kept, so aligning a
+        catalog snapshot's IDs costs nothing after the first request.
+        """
+        aligned = self._aligned
+        if aligned is not None and aligned[0] is item_ids:
+            return aligned[1]
+        index = np.fromiter((self.positions.get(item_id, -1) for item_id in item_ids),
+                            dtype=np.int64, count=len(item_ids))
+        self._aligned = (item_ids, index)
+        return index
+
+    def scores_for(self, seed_ids, item_ids):
+        """Collaborative scores of item_ids, in their order (0 for unknown items)."""
+        index = self.align(item_ids)
+        if not len(index):
+            return np.zeros(0)
+        scores = self.scores(seed_ids)
+        return np.where(index >= 0, scores[index], 0.0)
+
+    def _row(self, i):
+        """Item i's co-occurrence counts, base and delta, as {j: count}."""
+        row = {}
+        if i < len(self.indptr) - 1:
+            start, end = self.indptr[i], self.indptr[i + 1]
+            row = dict(zip(self.indices[start:end].tolist(), self.counts[start:end].tolist()))
+        for j, count in self.delta.get(i, {}).items():
+            row[j] = row.get(j, 0) + count
+        return row
+
+    def updated(self, additions):
+        """
+        A copy of the matrix with new (user, item) pairs applied.
+
+        Args:
+            additions (list): (items the user already had, items added)
+                pairs of ID lists, one per user
+
+        Returns:
+            CoOccurrenceMatrix: The updated matrix; this one is unchanged,
+            so readers holding it are unaffected
+        """
+        matrix = object.__new__(CoOccurrenceMatrix)
+        matrix.__dict__.update(self.__dict__)
+        matrix.ids = list(self.ids)
+        matrix.positions = dict(self.positions)
+        matrix.item_counts = self.item_counts.copy()
+        matrix.delta = dict(self.delta)
+        matrix.patched = dict(self.patched)
+        matrix._aligned = None
+
+        new_counts = {}
+        touched = set()
+        for before, added in additions:
+            basket = [matrix.positions[item_id] for item_id in before if item_id in matrix.positions]
+            for item_id in added:
+                i = matrix.positions.get(item_id)
+                if i is None:
+                    i = matrix.positions[item_id] = len(matrix.ids)
+                    matrix.ids.append(item_id)
+                if i in basket:
+                    continue
+                new_counts[i] = new_counts.get(i, 0) + 1
+                for j in basket:
+                    for row, col in ((i, j), (j, i)):
+                        if row not in touched:
+                            matrix.delta[row] = dict(matrix.delta.get(row, {}))
+                        matrix.delta[row][col] = matrix.delta[row].get(col, 0) + 1
+                        touched.add(row)
+                basket.append(i)
+
+        if len(matrix.ids) > len(matrix.item_counts):
+            matrix.item_counts = np.concatenate([
+                matrix.item_counts, np.zeros(len(matrix.ids) - len(matrix.item_counts), dtype=matrix.item_counts.dtype)
+            ])
+        for i, count in new_counts.items():
+            matrix.item_counts[i] += count
+
+        for i in touched:
+            row = {j: count for j, count in matrix._row(i).items() if count >= matrix.min_count}
+            if not row:
+                matrix.patched[i] = (np.empty(0, dtype=np.int64), np.empty(0))
+                continue
+            cols = np.fromiter(row, dtype=np.int64, count=len(row))
+            counts = np.fromiter(row.values(), dtype=float, count=len(row))
+            weights = counts / np.sqrt(float(matrix.item_counts[i]) * matrix.item_counts[cols])
+            order = np.lexsort((cols, -weights))[:matrix.neighbors]
+            matrix.patched[i] = (cols[order], weights[order])
+        return matrix
+
+
+class ItemSimilarity:
+    """
+    Item-item collaborative filtering over a per-user progress collection
+    (one document per user and item, e.g. progress for courses or
+    exercise_progress for exercises).
+
+    The co-occurrence matrix is built in a background thread, so requests
+    never wait for it (matrix returns None until the first build is done).
+    Afterwards new records are applied incrementally every refresh_interval
+    seconds: each refresh re-reads the last SOURCE_LOOKBACK seconds of _ids
+    and skips the records already applied, so late commits are not missed.
+    The matrix is rebuilt from scratch every rebuild_interval seconds, which
+    also corrects similarities of rows the increments did not touch, and as
+    soon as the collection's oldest record changes: a collection that was
+    cleared and refilled (e.g. by rebuild_exercise_stats.py) holds the same
+    pairs under new _ids, which must not be counted again.
+    """
+
+    def __init__(self, collection, item_field, weight=1.0, neighbors=50, min_count=2, refresh_interval=60,
+                 rebuild_interval=3600, enabled=True):
+        self.collection = collection
+        self.item_field = item_field
+        self.weight = weight
+        self.neighbors = neighbors
+        self.min_count = min_count
+        self.refresh_interval = refresh_interval
+        self.rebuild_interval = rebuild_interval
+        self.enabled = enabled
+        self.app = None
+        self._matrix = None
+        self._first_id = None
+        self._last_id = None
+        self._applied = set()
+        self._last_poll = 0.0
+        self._last_build = 0.0
+        self._lock = threading.Lock()
+        self._stats = {"builds": 0, "updates": 0, "records_applied": 0, "build_time": None}
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('COLLABORATIVE_ENABLED', self.enabled)
+        self.weight = app.config.get('COLLABORATIVE_WEIGHT', self.weight)
+        self.neighbors = app.config.get('COLLABORATIVE_NEIGHBORS', self.neighbors)
+        self.min_count = app.config.get('COLLABORATIVE_MIN_COUNT', self.min_count)
+        self.refresh_interval = app.config.get('COLLABORATIVE_REFRESH_INTERVAL', self.refresh_interval)
+        self.rebuild_interval = app.config.get('COLLABORATIVE_REBUILD_INTERVAL', self.rebuild_interval)
+
+    def matrix(self, wait=False):
+        """
+        Return the current matrix, starting a refresh in the background if
+        one is due.
+
+        Args:
+            wait (bool): Build the matrix in this thread if there is none
+                yet, instead of returning None
+        """
+        if not self.enabled:
+            return None
+        if wait and self._matrix is None:
+            with self._lock:
+                if self._matrix is None:
+                    self.refresh(full=True)
+            return self._matrix
+
+        now = time.monotonic()
+        if self._matrix is not None and now - self._last_poll < self.refresh_interval:
+            return self._matrix
+        if self._lock.acquire(blocking=False):
+            app = self.app
+
+            def run():
+                try:
+                    if app is not None:
+                        with app.app_context():
+                            self.refresh()
+                    else:
+                        self.refresh()
+                except Exception as e:
+                    if app is not None:
+                        app.logger.warning(f"Could not refresh {self.item_field} similarities: {e}")
+                finally:
+                    self._last_poll = time.monotonic()
+                    self._lock.release()
+
+            threading.Thread(target=run, daemon=True).start()
+        return self._matrix
+
+    def boost(self, seed_ids, item_ids, wait=False):
+        """
+        The weighted collaborative scores to add to the content scores of
+        item_ids, for a user who took seed_ids.
+
+        Returns:
+            numpy.ndarray: One score per item, or None while there is no
+            matrix (or the weight is 0)
+        """
+        if not self.weight:
+            return None
+        matrix = self.matrix(wait)
+        if matrix is None:
+            return None
+        return self.weight * matrix.scores_for(seed_ids, item_ids)
+
+    def refresh(self, full=False):
+        """
+        Bring the matrix up to date: a full build if there is none yet, full
+        is set, the rebuild interval has passed or the collection was
+        rewritten, otherwise apply the records inserted since the last
+        refresh.
+        """
+        now = time.monotonic()
+        if full or self._matrix is None or now - self._last_build >= self.rebuild_interval or self._rewritten():
+            self._build(now)
+        else:
+            self._apply_new()
+        self._last_poll = now
+
+    def _window(self):
+        """The lowest _id re-read by incremental refreshes, or None to read everything."""
+        if self._last_id is None:
+            return None
+        return ObjectId.from_datetime(self._last_id.generation_time - timedelta(seconds=SOURCE_LOOKBACK))
+
+    def _rewritten(self):
+        oldest = self.collection().find_one({}, {'_id': 1}, sort=[('_id', 1)])
+        return (oldest['_id'] if oldest else None) != self._first_id
+
+    def _build(self, now):
+        started = time.perf_counter()
+        user_ids, item_ids, record_ids = [], [], []
+        for record in self.collection().find({}, {'user_id': 1, self.item_field: 1}):
+            user_ids.append(str(record['user_id']))
+            item_ids.append(str(record[self.item_field]))
+            record_ids.append(record['_id'])
+        self._matrix = CoOccurrenceMatrix.from_pairs(user_ids, item_ids, self.neighbors, self.min_count)
+        self._first_id = min(record_ids) if record_ids else None
+        self._last_id = max(record_ids) if record_ids else None
+        window = self._window()
+        self._applied = {record_id for record_id in record_ids if window is not None and record_id >= window}
+        self._last_build = now
+        self._stats['builds'] += 1
+        self._stats['build_time'] = round(time.perf_counter() - started, 3)
+
+    def _apply_new(self):
+        window = self._window()
+        query = {'_id': {'$gte': window}} if window is not None else {}
+        added = {}
+        new_ids = set()
+        for record in self.collection().find(query, {'user_id': 1, self.item_field: 1}).sort('_id', 1):
+            if record['_id'] in self._applied:
+                continue
+            added.setdefault(record['user_id'], []).append(str(record[self.item_field]))
+            new_ids.add(record['_id'])
+        if not added:
+            return
+
+        # What these users had already, i.e. what the matrix has seen: an
+        # item they had is not counted again (CoOccurrenceMatrix.updated
+        # skips items already in a basket)
+        before = {}
+        for record in self.collection().find({'user_id': {'$in': list(added)}}, {'user_id': 1, self.item_field: 1}):
+            if (window is not None and record['_id'] < window) or record['_id'] in self._applied:
+                before.setdefault(record['user_id'], []).append(str(record[self.item_field]))
+
+        self._matrix = self._matrix.updated([(before.get(user_id, []), items) for user_id, items in added.items()])
+        self._applied |= new_ids
+        self._last_id = max([self._last_id, *new_ids]) if self._last_id is not None else max(new_ids)
+        # Records below the new window are never read again
+        window = self._window()
+        self._applied = {record_id for record_id in self._applied if record_id >= window}
+        self._stats['updates'] += 1
+        self._stats['records_applied'] += len(new_ids)
+
+    def stats(self):
+        matrix = self._matrix
+        return {
+            "enabled": self.enabled,
+            "weight": self.weight,
+            "items": len(matrix) if matrix is not None else 0,
+            "pairs": matrix.nnz if matrix is not None else 0,
+            "neighbors": self.neighbors,
+            "min_count": self.min_count,
+            **self._stats
+        }
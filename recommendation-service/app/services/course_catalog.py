@@ -0,0 +1,217 @@
+import threading
+import time
+import numpy as np
+from app.services.scoring import CourseMatrix, CourseRecord, top_k
+from app.services.text_index import TextIndex, rank_matches
+
+# The course fields CourseRecord is built from
+RECORD_PROJECTION = {
+    'difficulty': 1,
+    'category': 1,
+    'tags': 1,
+    'title': 1,
+    'description': 1,
+    'estimated_duration': 1,
+    'updated_at': 1,
+    'modules.content_items.learning_style': 1
+}
+
+
+def _postings(records, keys):
+    index = {}
+    for position, record in enumerate(records):
+        for key in keys(record):
+            index.setdefault(key, []).append(position)
+    return {key: np.array(positions, dtype=np.intp) for key, positions in index.items()}
+
+
+class CatalogSnapshot:
+    """
+    An immutable view of the catalog: course records in catalog (_id)
+    order, their score matrix, inverted indexes from difficulty, tag and
+    category to positions in that order and a text index over category,
+    tags, title and description.
+    """
+
+    def __init__(self, records):
+        self.records = records
+        self.matrix = CourseMatrix(records)
+        self.by_difficulty = _postings(records, lambda record: (record.difficulty,))
+        self.by_tag = _postings(records, lambda record: record.tags)
+        self.by_category = _postings(records, lambda record: () if record.category is None else (record.category,))
+        self.text = TextIndex([record.terms for record in records])
+
+    def __len__(self):
+        return len(self.records)
+
+    def recommend(self, learning_style=None, interests=None, difficulty=None, exclude_ids=(),
+                  in_progress_ids=(), limit=5, boost=None):
+        """
+        Rank the catalog for a user without touching the database.
+
+        Candidates are the courses of the given difficulty (all courses
+        without one) minus exclude_ids; they are scored exactly like
+        RecommendationEngine scores course documents, plus boost (one
+        extra score per course in catalog order, e.g. collaborative
+        scores) if given.
+
+        Returns:
+            list: (course ID, score) pairs, best first
+        """
+        if difficulty:
+            candidates = self.by_difficulty.get(difficulty, np.empty(0, dtype=np.intp))
+        else:
+            candidates = np.arange(len(self.records))
+        excluded = [self.matrix.positions[course_id] for course_id in exclude_ids
+                    if course_id in self.matrix.positions]
+        if excluded:
+            candidates = np.setdiff1d(candidates, excluded, assume_unique=True)
+
+        scores = self.matrix.score(learning_style, interests, in_progress_ids)
+        if boost is not None:
+            scores = scores + boost
+        scores = scores[candidates]
+        return [(self.matrix.ids[candidates[i]], float(scores[i])) for i in top_k(scores, limit)]
+
+    def match_goal(self, goal, difficulties, limit=None):
+        """
+        Rank the courses relevant to a learning goal, per difficulty, with
+        one search of the text index.
+
+        Args:
+            goal (str): Free text, matched token by token (tokens of three
+                or more characters also match words they begin)
+            difficulties (iterable): The difficulty buckets wanted
+            limit (int): Courses kept per bucket
+
+        Returns:
+            dict: Difficulty to list of CourseRecord, most relevant first
+        """
+        matched, scores = self.text.search(goal)
+        empty = np.empty(0, dtype=np.intp)
+        return {
+            difficulty: [self.records[i] for i in rank_matches(
+                matched, scores, self.by_difficulty.get(difficulty, empty), limit
+            )]
+            for difficulty in difficulties
+        }
+
+
+class CourseCatalog:
+    """
+    In-memory course catalog used for candidate generation and scoring.
+
+    Holds a compact CourseRecord per course instead of whole documents.
+    The catalog is loaded once, then kept current by polling for courses
+    whose updated_at moved past the newest one seen (at most every
+    refresh_interval seconds, on the request that notices); a full reload
+    every full_reload_interval seconds picks up deleted courses and writes
+    that did not touch updated_at. Requests keep using the current snapshot
+    while another request refreshes it.
+
+    Change streams would need a replica set, which the deployment's
+    standalone MongoDB is not, so polling is the only refresh mechanism.
+    """
+
+    def __init__(self, collection, refresh_interval=30, full_reload_interval=600, enabled=True):
+        self.collection = collection
+        self.refresh_interval = refresh_interval
+        self.full_reload_interval = full_reload_interval
+        self.enabled = enabled
+        self._records = {}
+        self._snapshot = None
+        self._high_water = None
+        self._last_poll = 0.0
+        self._last_full_reload = 0.0
+        self._lock = threading.Lock()
+        self._stats = {"full_reloads": 0, "polls": 0, "courses_updated": 0}
+
+    def init_app(self, app):
+        self.enabled = app.config.get('COURSE_CATALOG_ENABLED', self.enabled)
+        self.refresh_interval = app.config.get('COURSE_CATALOG_REFRESH_INTERVAL', self.refresh_interval)
+        self.full_reload_interval = app.config.get('COURSE_CATALOG_FULL_RELOAD_INTERVAL', self.full_reload_interval)
+
+    def snapshot(self):
+        """Return the current catalog snapshot, refreshing it if it is due."""
+        now = time.monotonic()
+        if self._snapshot is not None and now - self._last_poll < self.refresh_interval:
+            return self._snapshot
+
+        # Only the first load makes requests wait; later refreshes are done
+        # by one request while the others use the snapshot they have
+        if self._lock.acquire(blocking=self._snapshot is None):
+            try:
+                if self._snapshot is None or time.monotonic() - self._last_poll >= self.refresh_interval:
+                    self.refresh()
+            finally:
+                self._lock.release()
+        return self._snapshot
+
+    def refresh(self, full=False):
+        """
+        Bring the catalog up to date.
+
+        Args:
+            full (bool): Reload every course instead of polling for changes;
+                implied when the full reload interval has passed
+        """
+        now = time.monotonic()
+        if full or self._snapshot is None or now - self._last_full_reload >= self.full_reload_interval:
+            records = {}
+            high_water = None
+            for course in self.collection().find({}, RECORD_PROJECTION).sort('_id', 1):
+                records[str(course['_id'])] = CourseRecord.from_document(course)
+                high_water = self._newer(high_water, course.get('updated_at'))
+            self._records = records
+            self._high_water = high_water
+            self._last_full_reload = now
+            self._stats['full_reloads'] += 1
+            changed = True
+        else:
+            # $gte re-reads the newest course, so writes landing within the
+            # same timestamp are not missed
+            if self._high_water is None:
+                query = {'updated_at': {'$ne': None}}
+            else:
+                query = {'updated_at': {'$gte': self._high_water}}
+            changed = False
+            for course in self.collection().find(query, RECORD_PROJECTION).sort('_id', 1):
+                record = CourseRecord.from_document(course)
+                self._high_water = self._newer(self._high_water, course.get('updated_at'))
+                current = self._records.get(record.id)
+                if current is None or self._key(current) != self._key(record):
+                    self._records[record.id] = record
+                    self._stats['courses_updated'] += 1
+                    changed = True
+            self._stats['polls'] += 1
+
+        if changed or self._snapshot is None:
+            self._snapshot = CatalogSnapshot(list(self._records.values()))
+        self._last_poll = now
+
+    @staticmethod
+    def _newer(high_water, updated_at):
+        if updated_at is None:
+            return high_water
+        return updated_at if high_water is None or updated_at > high_water else high_water
+
+    @staticmethod
+    def _key(record):
+        return (record.difficulty, record.category, record.tags, record.styles, record.terms,
+                record.estimated_duration)
+
+    def stats(self):
+        snapshot = self._snapshot
+        return {
+            "enabled": self.enabled,
+            "courses": len(snapshot) if snapshot is not None else 0,
+            "tags": len(snapshot.by_tag) if snapshot is not None else 0,
+            "categories": len(snapshot.by_category) if snapshot is not None else 0,
+            "terms": len(snapshot.text.vocabulary) if snapshot is not None else 0,
+            "high_water": self._high_water,
+            "refresh_interval": self.refresh_interval,
+            "full_reload_interval": self.full_reload_interval,
+            "full_reloads": self._stats['full_reloads'],
+            "polls": self._stats['polls'],
+            "courses_updated": self._stats['courses_updated']
+        }
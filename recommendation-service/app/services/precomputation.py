@@ -0,0 +1,257 @@
+import multiprocessing
+import time
+from datetime import datetime
+import numpy as np
+from pymongo import UpdateOne
+from app import create_app, mongo, course_catalog, course_similarity, exercise_similarity
+from app.models.recommendation import create_recommendation_document
+from app.services.precomputed_recommendations import COURSE, EXERCISE
+from app.services.scoring import EXERCISE_SUMMARY_PROJECTION, ExerciseMatrix, submission_histories, top_k
+
+
+def course_reason(record, learning_style, interests, difficulty):
+    """Why a course was recommended, from the score components it got."""
+    lowered = [interest.lower() for interest in interests or []]
+    matched = [interest for interest in lowered
+               if interest in record.tags or (record.category and interest in record.category)]
+    if matched:
+        return f"Matches your interest in {matched[0]}"
+    if learning_style and record.styles.get(learning_style):
+        return f"Suits your {learning_style} learning style"
+    if difficulty and record.difficulty == difficulty:
+        return f"At your {difficulty} level"
+    return "Recommended for you"
+
+
+def exercise_reason(exercise, interests, difficulty):
+    """Why an exercise was recommended."""
+    topic = (exercise.get('topic') or '').lower()
+    for interest in interests or []:
+        if topic and interest.lower() in topic:
+            return f"Practice for your interest in {interest.lower()}"
+    if difficulty and exercise.get('difficulty') == difficulty:
+        return f"At your {difficulty} level"
+    return "Recommended for you"
+
+
+class BatchRecommender:
+    """
+    Ranks courses and exercises for many users at a time, exactly as
+    RecommendationEngine ranks them for one.
+
+    The catalog snapshot, every exercise and the item similarities are
+    loaded once; for each chunk of users the profiles, course progress and
+    exercise progress are read with one query each, so a chunk costs three
+    queries however large it is.
+    """
+
+    def __init__(self, db, snapshot, course_similarity=None, exercise_similarity=None):
+        self.db = db
+        self.snapshot = snapshot
+        self.course_similarity = course_similarity
+        self.exercise_similarity = exercise_similarity
+        self.exercises = list(db.exercises.find({}, EXERCISE_SUMMARY_PROJECTION))
+        self.exercise_ids = [str(exercise['_id']) for exercise in self.exercises]
+        self.exercise_matrix = ExerciseMatrix(self.exercises)
+        self.exercise_positions = {exercise_id: i for i, exercise_id in enumerate(self.exercise_ids)}
+        self.exercises_by_difficulty = {}
+        for i, exercise in enumerate(self.exercises):
+            self.exercises_by_difficulty.setdefault(exercise.get('difficulty'), []).append(i)
+        self.exercises_by_difficulty = {
+            difficulty: np.array(positions, dtype=np.intp)
+            for difficulty, positions in self.exercises_by_difficulty.items()
+        }
+
+    def recommend(self, user_ids, limit):
+        """
+        Rank courses and exercises for a chunk of users.
+
+        Args:
+            user_ids (list): User ObjectIds; unknown users are skipped
+            limit (int): Recommendations per user and item type
+
+        Returns:
+            dict: {user ID string: {COURSE: [...], EXERCISE: [...]}}, each a
+            list of (item ID, score, reason) tuples, best first
+        """
+        users = list(self.db.users.find(
+            {'_id': {'$in': user_ids}},
+            {'learning_style': 1, 'difficulty_preference': 1, 'interests': 1}
+        ))
+        completed_courses = {}
+        in_progress_courses = {}
+        for progress in self.db.progress.find({'user_id': {'$in': user_ids}},
+                                              {'user_id': 1, 'course_id': 1, 'completed': 1}):
+            if progress.get('completed') is True:
+                target = completed_courses
+            elif progress.get('completed') is False:
+                target = in_progress_courses
+            else:
+                continue
+            target.setdefault(progress['user_id'], []).append(str(progress['course_id']))
+        attempted_exercises = {}
+        completed_exercises = {}
+        for progress in self.db.exercise_progress.find({'user_id': {'$in': user_ids}},
+                                                       {'user_id': 1, 'exercise_id': 1, 'passed': 1}):
+            attempted_exercises.setdefault(progress['user_id'], []).append(str(progress['exercise_id']))
+            if progress.get('passed') is True:
+                completed_exercises.setdefault(progress['user_id'], []).append(str(progress['exercise_id']))
+        # Users without progress documents yet, see submission_histories
+        missing = [user_id for user_id in user_ids if user_id not in attempted_exercises]
+        if missing:
+            for user_id, (attempted, passed) in submission_histories(self.db, missing).items():
+                attempted_exercises[user_id] = attempted
+                completed_exercises[user_id] = passed
+
+        results = {}
+        for user in users:
+            learning_style = user.get('learning_style')
+            difficulty = user.get('difficulty_preference')
+            interests = user.get('interests', [])
+
+            completed = completed_courses.get(user['_id'], [])
+            in_progress = in_progress_courses.get(user['_id'], [])
+            boost = None
+            if self.course_similarity is not None:
+                boost = self.course_similarity.boost(completed + in_progress, self.snapshot.matrix.ids, wait=True)
+
+            courses = []
+            for course_id, score in self.snapshot.recommend(
+                learning_style, interests, difficulty, completed, in_progress, limit, boost
+            ):
+                record = self.snapshot.records[self.snapshot.matrix.positions[course_id]]
+                courses.append((course_id, score, course_reason(record, learning_style, interests, difficulty)))
+
+            results[str(user['_id'])] = {
+                COURSE: courses,
+                EXERCISE: self._recommend_exercises(interests, difficulty,
+                                                    attempted_exercises.get(user['_id'], []),
+                                                    completed_exercises.get(user['_id'], []), limit)
+            }
+        return results
+
+    def _recommend_exercises(self, interests, difficulty, attempted_ids, completed_ids, limit):
+        if difficulty:
+            candidates = self.exercises_by_difficulty.get(difficulty, np.empty(0, dtype=np.intp))
+        else:
+            candidates = np.arange(len(self.exercises))
+        excluded = [self.exercise_positions[exercise_id] for exercise_id in completed_ids
+                    if exercise_id in self.exercise_positions]
+        if excluded:
+            candidates = np.setdiff1d(candidates, excluded, assume_unique=True)
+
+        scores = self.exercise_matrix.score(interests)
+        if self.exercise_similarity is not None:
+            boost = self.exercise_similarity.boost(attempted_ids, self.exercise_ids, wait=True)
+            if boost is not None:
+                scores = scores + boost
+        scores = scores[candidates]
+        recommendations = []
+        for i in top_k(scores, limit):
+            exercise = self.exercises[candidates[i]]
+            recommendations.append((str(exercise['_id']), float(scores[i]),
+                                    exercise_reason(exercise, interests, difficulty)))
+        return recommendations
+
+
+def write_recommendations(db, results, computed_at):
+    """
+    Upsert a chunk's recommendations and drop the ones they replace.
+
+    Documents are keyed by (user_id, item_type, item_id), so an item that
+    stays recommended keeps its viewed/clicked flags; items that fell out
+    of a user's top N are deleted.
+    """
+    updates = []
+    for user_id, by_type in results.items():
+        for item_type, recommendations in by_type.items():
+            for rank, (item_id, score, reason) in enumerate(recommendations):
+                document = create_recommendation_document(user_id, item_id, item_type, reason, score, rank)
+                document['computed_at'] = computed_at
+                on_insert = {field: document.pop(field) for field in ('created_at', 'viewed', 'clicked')}
+                updates.append(UpdateOne(
+                    {'user_id': user_id, 'item_type': item_type, 'item_id': item_id},
+                    {'$set': document, '$setOnInsert': on_insert},
+                    upsert=True
+                ))
+    if updates:
+        db.recommendations.bulk_write(updates, ordered=False)
+    db.recommendations.delete_many({'user_id': {'$in': list(results)}, 'computed_at': {'$lt': computed_at}})
+
+
+# Per-process state of precompute_recommendations' worker processes
+_worker = {}
+
+
+def _init_worker(limit):
+    app = create_app()
+    context = app.app_context()
+    context.push()
+    _worker['context'] = context
+    _worker['limit'] = limit
+    _worker['recommender'] = BatchRecommender(mongo.db, course_catalog.snapshot(),
+                                              course_similarity, exercise_similarity)
+
+
+def _precompute_chunk(chunk):
+    user_ids, computed_at = chunk
+    results = _worker['recommender'].recommend(user_ids, _worker['limit'])
+    write_recommendations(mongo.db, results, computed_at)
+    return len(user_ids), len(results)
+
+
+def _user_chunks(db, chunk_size, computed_at):
+    chunk = []
+    for user in db.users.find({}, {'_id': 1}).sort('_id', 1).batch_size(chunk_size):
+        chunk.append(user['_id'])
+        if len(chunk) >= chunk_size:
+            yield chunk, computed_at
+            chunk = []
+    if chunk:
+        yield chunk, computed_at
+
+
+def precompute_recommendations(db, limit=20, chunk_size=500, workers=None):
+    """
+    Precompute the top limit courses and exercises for every user.
+
+    Users are read in _id order and handed out in chunks to a pool of
+    worker processes (started fresh, each with its own database client,
+    catalog snapshot and exercise matrix); each chunk is written with one
+    bulk upsert. With workers=1 everything runs in this process.
+
+    Returns:
+        dict: Users "read" and "precomputed" (users that vanished in the
+        meantime are not), the "wall_time" in seconds and "users_per_second"
+    """
+    started = time.perf_counter()
+    # MongoDB stores milliseconds; a finer computed_at would compare as
+    # newer than the copies just written and delete them
+    now = datetime.utcnow()
+    computed_at = now.replace(microsecond=now.microsecond // 1000 * 1000)
+    workers = workers or multiprocessing.cpu_count()
+    summary = {"read": 0, "precomputed": 0}
+
+    chunks = _user_chunks(db, chunk_size, computed_at)
+    if workers == 1:
+        _worker['limit'] = limit
+        _worker['recommender'] = BatchRecommender(db, course_catalog.snapshot(),
+                                                  course_similarity, exercise_similarity)
+        counts = map(_precompute_chunk, chunks)
+        pool = None
+    else:
+        # Spawned rather than forked: a MongoClient must not cross a fork
+        pool = multiprocessing.get_context('spawn').Pool(workers, initializer=_init_worker, initargs=(limit,))
+        counts = pool.imap_unordered(_precompute_chunk, chunks)
+    try:
+        for read, precomputed in counts:
+            summary['read'] += read
+            summary['precomputed'] += precomputed
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    summary['wall_time'] = round(time.perf_counter() - started, 3)
+    summary['users_per_second'] = round(summary['read'] / summary['wall_time'], 1) if summary['wall_time'] else None
+    return summary
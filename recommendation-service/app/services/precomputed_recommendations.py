@@ -0,0 +1,79 @@
+from datetime import datetime, timedelta
+from bson.objectid import ObjectId
+from app.services.scoring import EXERCISE_SUMMARY_PROJECTION
+
+# Item types as stored in the recommendations collection
+COURSE = 'course'
+EXERCISE = 'exercise'
+
+
+class PrecomputedRecommendations:
+    """
+    Online read path for the recommendations precompute_recommendations
+    writes.
+
+    Up to limit items per user and item type are precomputed, so any
+    request for at most that many is answered from the stored ranking,
+    provided it is at most max_age seconds old and the user has no
+    user_events since it was computed. Otherwise (new users, changed
+    inputs, larger limits) get returns None and the caller computes online.
+
+    The user_events check only sees events that are still retained, so
+    max_age is capped at USER_EVENTS_RETENTION: an older ranking could have
+    had the events that invalidate it expire already.
+    """
+
+    def __init__(self, database, limit=20, max_age=86400, enabled=True):
+        self.database = database
+        self.limit = limit
+        self.max_age = max_age
+        self.enabled = enabled
+
+    def init_app(self, app):
+        self.enabled = app.config.get('PRECOMPUTED_RECOMMENDATIONS_ENABLED', self.enabled)
+        self.limit = app.config.get('PRECOMPUTE_LIMIT', self.limit)
+        self.max_age = app.config.get('PRECOMPUTED_MAX_AGE', self.max_age)
+        retention = app.config.get('USER_EVENTS_RETENTION', 86400)
+        if self.max_age > retention:
+            app.logger.warning(f"PRECOMPUTED_MAX_AGE ({self.max_age}s) exceeds USER_EVENTS_RETENTION "
+                               f"({retention}s); serving precomputed results for at most {retention}s")
+            self.max_age = retention
+
+    def get(self, user_id, item_type, limit):
+        """
+        Return a user's precomputed recommendations in the shape
+        RecommendationEngine returns them, or None to compute online.
+        """
+        if not self.enabled or limit > self.limit:
+            return None
+        db = self.database()
+        stored = list(db.recommendations.find(
+            {'user_id': str(user_id), 'item_type': item_type},
+            {'item_id': 1, 'score': 1, 'computed_at': 1}
+        ).sort('rank', 1).limit(limit))
+        if not stored:
+            return None
+
+        computed_at = min(recommendation['computed_at'] for recommendation in stored)
+        if datetime.utcnow() - computed_at > timedelta(seconds=self.max_age):
+            return None
+        if db.user_events.find_one({'user_id': ObjectId(user_id), 'at': {'$gt': computed_at}}, {'_id': 1}):
+            return None
+
+        item_ids = [ObjectId(recommendation['item_id']) for recommendation in stored]
+        if item_type == COURSE:
+            items = db.courses.find({'_id': {'$in': item_ids}})
+        else:
+            items = db.exercises.find({'_id': {'$in': item_ids}}, EXERCISE_SUMMARY_PROJECTION)
+        items = {str(item['_id']): item for item in items}
+
+        recommendations = []
+        for recommendation in stored:
+            # Skip items deleted since the precomputation
+            item = items.get(recommendation['item_id'])
+            if item is not None:
+                item = dict(item)
+                item['_id'] = recommendation['item_id']
+                item['score'] = recommendation['score']
+                recommendations.append(item)
+        return recommendations
@@ -0,0 +1,252 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from bson.objectid import ObjectId
+
+# Seconds of the event log re-read on every poll: ObjectIds from different
+# processes are only ordered to the second, so an event can arrive with an
+# _id below one already seen
+EVENT_LOOKBACK = 5
+
+
+class CacheEntry:
+    __slots__ = ('value', 'computed_at')
+
+    def __init__(self, value, computed_at):
+        self.value = value
+        self.computed_at = computed_at
+
+
+class RecommendationCache:
+    """
+    Per-user cache of recommendation results, keyed by (user, endpoint,
+    limit).
+
+    Entries expire after ttl seconds; at most max_entries are kept, least
+    recently used first out. A user's entries are dropped as soon as their
+    inputs change: the user-management and coding exercise services append
+    a {user_id, source, at} event to the user_events collection when
+    progress, passed submissions or the profile change, and the cache reads
+    events past the last one seen (at most every poll_interval seconds, on
+    the request that notices). The next request after such an event always
+    gets freshly computed recommendations.
+
+    With stale_while_revalidate, an expired entry younger than max_stale
+    seconds is served as is while one background thread per key recomputes
+    it, so users with a cached result never wait on recomputation just
+    because the ttl ran out. Without it, expired entries are recomputed
+    inline.
+
+    Course scores also depend on the catalog, which changes for everyone at
+    once; ttl bounds how long a catalog change takes to show.
+    """
+
+    def __init__(self, events, ttl=300, max_entries=10000, stale_while_revalidate=True, max_stale=3600,
+                 poll_interval=2, enabled=True):
+        self.events = events
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.stale_while_revalidate = stale_while_revalidate
+        self.max_stale = max_stale
+        self.poll_interval = poll_interval
+        self.enabled = enabled
+        self.app = None
+        self._entries = OrderedDict()
+        self._keys_by_user = {}
+        self._generations = {}
+        self._refreshing = set()
+        self._seen_events = {}
+        self._log_start = None
+        self._log_started = False
+        self._last_poll = None
+        self._lock = threading.Lock()
+        self._poll_lock = threading.Lock()
+        self._stats = {"hits": 0, "stale_hits": 0, "misses": 0, "evictions": 0, "invalidations": 0,
+                       "revalidations": 0, "events": 0}
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('RECOMMENDATION_CACHE_ENABLED', self.enabled)
+        self.ttl = app.config.get('RECOMMENDATION_CACHE_TTL', self.ttl)
+        self.max_entries = app.config.get('RECOMMENDATION_CACHE_SIZE', self.max_entries)
+        self.stale_while_revalidate = app.config.get('RECOMMENDATION_CACHE_STALE_WHILE_REVALIDATE',
+                                                     self.stale_while_revalidate)
+        self.max_stale = app.config.get('RECOMMENDATION_CACHE_MAX_STALE', self.max_stale)
+        self.poll_interval = app.config.get('RECOMMENDATION_EVENTS_POLL_INTERVAL', self.poll_interval)
+
+    def get(self, user_id, endpoint, limit, compute):
+        """
+        Return the cached recommendations for a request, computing them if
+        needed.
+
+        Args:
+            user_id: The user the recommendations are for
+            endpoint (str): Which recommendations, e.g. "courses"
+            limit (int): The requested number of recommendations
+            compute (callable): Computes the recommendations; called with
+                no arguments, inside an app context
+
+        Returns:
+            list: A copy of the recommendations, free for the caller to modify
+        """
+        if not self.enabled:
+            return compute()
+        self.poll_events()
+
+        key = (str(user_id), endpoint, limit)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                age = now - entry.computed_at
+                if age < self.ttl:
+                    self._stats['hits'] += 1
+                    return copy.deepcopy(entry.value)
+                if self.stale_while_revalidate and age < self.max_stale:
+                    self._stats['stale_hits'] += 1
+                    self._revalidate(key, compute)
+                    return copy.deepcopy(entry.value)
+            self._stats['misses'] += 1
+            generation = self._generations.get(key[0], 0)
+
+        value = compute()
+        self._store(key, value, generation)
+        return copy.deepcopy(value)
+
+    def _revalidate(self, key, compute):
+        # Called with the lock held; one recomputation per key at a time
+        if key in self._refreshing:
+            return
+        self._refreshing.add(key)
+        generation = self._generations.get(key[0], 0)
+        app = self.app
+
+        def run():
+            revalidated = False
+            try:
+                if app is not None:
+                    with app.app_context():
+                        value = compute()
+                else:
+                    value = compute()
+                self._store(key, value, generation)
+                revalidated = True
+            except Exception as e:
+                if app is not None:
+                    app.logger.warning(f"Could not revalidate recommendations for {key}: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+                    if revalidated:
+                        self._stats['revalidations'] += 1
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def _store(self, key, value, generation):
+        with self._lock:
+            # A result computed from inputs that changed meanwhile is not
+            # kept; the next request computes it afresh
+            if self._generations.get(key[0], 0) != generation:
+                return
+            self._entries[key] = CacheEntry(value, time.monotonic())
+            self._entries.move_to_end(key)
+            self._keys_by_user.setdefault(key[0], set()).add(key)
+            while len(self._entries) > self.max_entries:
+                evicted, _ = self._entries.popitem(last=False)
+                self._forget_key(evicted)
+                self._stats['evictions'] += 1
+
+    def _forget_key(self, key):
+        keys = self._keys_by_user.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_user[key[0]]
+
+    def invalidate_user(self, user_id):
+        """
+        Drop a user's cached recommendations. They are never served stale,
+        and results still being computed from the old inputs are discarded.
+        """
+        user_id = str(user_id)
+        with self._lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            for key in list(self._keys_by_user.get(user_id, ())):
+                del self._entries[key]
+                self._forget_key(key)
+                self._stats['invalidations'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_user.clear()
+            self._generations.clear()
+
+    def poll_events(self, force=False):
+        """
+        Invalidate the users named in user_events since the last poll.
+
+        The first poll only records where the event log ends, since nothing
+        is cached before it. Only one request polls at a time; the others go
+        on with what is cached.
+        """
+        now = time.monotonic()
+        if not force and self._last_poll is not None and now - self._last_poll < self.poll_interval:
+            return
+        if not self._poll_lock.acquire(blocking=False):
+            return
+        try:
+            if not self._log_started:
+                latest = list(self.events().find({}, {'_id': 1}).sort('_id', -1).limit(1))
+                self._log_start = latest[0]['_id'].generation_time if latest else None
+                for event in self._read_events():
+                    self._seen_events[event['_id']] = True
+                self._log_started = True
+            else:
+                users = set()
+                for event in self._read_events():
+                    if event['_id'] in self._seen_events:
+                        continue
+                    self._seen_events[event['_id']] = True
+                    users.add(str(event['user_id']))
+                    self._stats['events'] += 1
+                    newest = event['_id'].generation_time
+                    if self._log_start is None or newest > self._log_start:
+                        self._log_start = newest
+                for user_id in users:
+                    self.invalidate_user(user_id)
+            # Events before the window are never read again
+            if self._log_start is not None:
+                window = ObjectId.from_datetime(self._log_start - timedelta(seconds=EVENT_LOOKBACK))
+                self._seen_events = {event_id: True for event_id in self._seen_events if event_id >= window}
+            self._last_poll = now
+        except Exception as e:
+            # Keep serving; ttl still bounds staleness until polling recovers
+            self._last_poll = now
+            if self.app is not None:
+                self.app.logger.warning(f"Could not poll user events: {e}")
+        finally:
+            self._poll_lock.release()
+
+    def _read_events(self):
+        query = {}
+        if self._log_start is not None:
+            query['_id'] = {'$gte': ObjectId.from_datetime(self._log_start - timedelta(seconds=EVENT_LOOKBACK))}
+        return self.events().find(query, {'user_id': 1}).sort('_id', 1)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "users": len(self._keys_by_user),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "stale_while_revalidate": self.stale_while_revalidate,
+                "max_stale": self.max_stale,
+                "refreshing": len(self._refreshing),
+                **self._stats
+            }
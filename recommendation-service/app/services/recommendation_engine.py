@@ -1,7 +1,10 @@
-from app import mongo
+import re
+from app import mongo, course_catalog, precomputed_recommendations, course_similarity, exercise_similarity
 from bson.objectid import ObjectId
-import numpy as np
 from datetime import datetime
+from app.services.precomputed_recommendations import COURSE, EXERCISE
+from app.services.scoring import (EXERCISE_SUMMARY_PROJECTION, CourseMatrix, ExerciseMatrix, submission_histories,
+                                  top_k)
 
 class RecommendationEngine:
     def recommend_courses_for_user(self, user_id, limit=5):
@@ -15,6 +18,11 @@ class RecommendationEngine:
         Returns:
             List of recommended course objects
         """
+        # Serve the batch job's results while they are current
+        precomputed = precomputed_recommendations.get(user_id, COURSE, limit)
+        if precomputed is not None:
+            return precomputed
+        
         # Get user
         user = mongo.db.users.find_one({'_id': ObjectId(user_id)})
         if not user:
@@ -46,6 +54,31 @@ class RecommendationEngine:
         
         in_progress_course_ids = [str(p['course_id']) for p in in_progress_courses]
         
+        # Courses taken by users who took the same ones score higher
+        taken_course_ids = completed_course_ids + in_progress_course_ids
+        
+        # Rank from the in-memory catalog and fetch only the chosen courses
+        if course_catalog.enabled:
+            snapshot = course_catalog.snapshot()
+            ranked = snapshot.recommend(
+                learning_style, interests, difficulty_preference,
+                completed_course_ids, in_progress_course_ids, limit,
+                boost=course_similarity.boost(taken_course_ids, snapshot.matrix.ids)
+            )
+            courses = {
+                str(course['_id']): course
+                for course in mongo.db.courses.find({'_id': {'$in': [ObjectId(cid) for cid, _ in ranked]}})
+            }
+            recommendations = []
+            for course_id, score in ranked:
+                # Skip courses deleted since the catalog was refreshed
+                if course_id in courses:
+                    course_copy = dict(courses[course_id])
+                    course_copy['_id'] = course_id
+                    course_copy['score'] = score
+                    recommendations.append(course_copy)
+            return recommendations
+        
         # Find courses that match user preferences
         # We exclude courses the user has already completed
         query = {'_id': {'$nin': [ObjectId(cid) for cid in completed_course_ids]}}
@@ -57,51 +90,20 @@ class RecommendationEngine:
         # Get all potential courses
         potential_courses = list(mongo.db.courses.find(query))
         
-        # Score each course based on relevance to user
-        scored_courses = []
-        for course in potential_courses:
-            score = 0
-            
-            # Base score
-            score += 0.5
-            
-            # Boost score if course matches learning style
-            if learning_style and 'modules' in course:
-                for module in course.get('modules', []):
-                    for item in module.get('content_items', []):
-                        if item.get('learning_style') == learning_style:
-                            score += 0.5
-            
-            # Boost score if course category or tags match interests
-            if interests:
-                for interest in interests:
-                    # Match against category
-                    if course.get('category') and interest.lower() in course.get('category', '').lower():
-                        score += 1
-                    
-                    # Match against tags
-                    if course.get('tags'):
-                        tags = course.get('tags', [])
-                        if not isinstance(tags, list):
-                            # Handle the case where tags might be a string
-                            tags = tags.split(',') if isinstance(tags, str) else []
-                            
-                        if interest.lower() in [tag.lower() for tag in tags]:
-                            score += 1
-            
-            # Penalize score for courses already in progress
-            if str(course['_id']) in in_progress_course_ids:
-                score *= 0.7
-            
-            # Store the scored course
-            course_copy = dict(course)
-            course_copy['_id'] = str(course_copy['_id'])
-            course_copy['score'] = score
-            scored_courses.append(course_copy)
+        # Score every course at once and keep the best
+        catalog = CourseMatrix.from_documents(potential_courses)
+        scores = catalog.score(learning_style, interests, in_progress_course_ids)
+        boost = course_similarity.boost(taken_course_ids, catalog.ids)
+        if boost is not None:
+            scores = scores + boost
         
-        # Sort by score and get top recommendations
-        scored_courses.sort(key=lambda x: x['score'], reverse=True)
-        return scored_courses[:limit]
+        recommendations = []
+        for i in top_k(scores, limit):
+            course_copy = dict(potential_courses[i])
+            course_copy['_id'] = str(course_copy['_id'])
+            course_copy['score'] = float(scores[i])
+            recommendations.append(course_copy)
+        return recommendations
     
     def recommend_exercises_for_user(self, user_id, limit=5):
         """
@@ -114,21 +116,32 @@ class RecommendationEngine:
         Returns:
             List of recommended exercise objects
         """
+        # Serve the batch job's results while they are current
+        precomputed = precomputed_recommendations.get(user_id, EXERCISE, limit)
+        if precomputed is not None:
+            return precomputed
+        
         # Get user
         user = mongo.db.users.find_one({'_id': ObjectId(user_id)})
         if not user:
             return []
         
-        # Get exercises the user has already completed
-        completed_submissions = list(mongo.db.submissions.find(
-            {
-                'user_id': ObjectId(user_id),
-                'passed_all': True
-            },
-            {'exercise_id': 1}
+        # Get the exercises the user has attempted and completed, from the
+        # per-user progress the coding exercise service maintains (no
+        # submission scan)
+        exercise_progress = list(mongo.db.exercise_progress.find(
+            {'user_id': ObjectId(user_id)},
+            {'exercise_id': 1, 'passed': 1}
         ))
         
-        completed_exercise_ids = [str(s['exercise_id']) for s in completed_submissions]
+        attempted_exercise_ids = [str(p['exercise_id']) for p in exercise_progress]
+        completed_exercise_ids = [str(p['exercise_id']) for p in exercise_progress if p.get('passed') is True]
+        
+        # Users with submissions from before progress was materialized have
+        # none until rebuild_exercise_stats.py runs: read their submissions
+        if not exercise_progress:
+            attempted_exercise_ids, completed_exercise_ids = submission_histories(
+                mongo.db, [ObjectId(user_id)]).get(ObjectId(user_id), ([], []))
         
         # Find exercises that match user preferences
         # We exclude exercises the user has already completed
@@ -139,32 +152,34 @@ class RecommendationEngine:
         if difficulty_preference:
             query['difficulty'] = difficulty_preference
         
-        # Get all potential exercises
-        potential_exercises = list(mongo.db.exercises.find(query))
+        # Get all potential exercises, without the solutions and test cases
+        # (possibly large) that are never part of a recommendation
+        potential_exercises = list(mongo.db.exercises.find(query, EXERCISE_SUMMARY_PROJECTION))
         
-        # Score each exercise based on relevance to user
-        scored_exercises = []
-        for exercise in potential_exercises:
-            score = 0
-            
-            # Base score
-            score += 0.5
-            
-            # Boost score for matching topics with user interests
-            interests = user.get('interests', [])
-            if interests and exercise.get('topic'):
-                if any(interest.lower() in exercise.get('topic', '').lower() for interest in interests):
-                    score += 1
-            
-            # Store the scored exercise
-            exercise_copy = dict(exercise)
-            exercise_copy['_id'] = str(exercise_copy['_id'])
-            exercise_copy['score'] = score
-            scored_exercises.append(exercise_copy)
+        # Score every exercise at once and keep the best
+        scores = ExerciseMatrix(potential_exercises).score(user.get('interests', []))
+        
+        # Exercises attempted by users who attempted the same ones score higher
+        boost = exercise_similarity.boost(attempted_exercise_ids,
+                                          [str(exercise['_id']) for exercise in potential_exercises])
+        if boost is not None:
+            scores = scores + boost
         
-        # Sort by score and get top recommendations
-        scored_exercises.sort(key=lambda x: x['score'], reverse=True)
-        return scored_exercises[:limit]
+        recommendations = []
+        for i in top_k(scores, limit):
+            exercise_copy = dict(potential_exercises[i])
+            exercise_copy['_id'] = str(exercise_copy['_id'])
+            exercise_copy['score'] = float(scores[i])
+            recommendations.append(exercise_copy)
+        return recommendations
+    
+    @staticmethod
+    def _path_course(record):
+        """A catalog record in the shape of the course documents learning paths are built from."""
+        course = {'_id': record.id, 'difficulty': record.difficulty}
+        if record.estimated_duration is not None:
+            course['estimated_duration'] = record.estimated_duration
+        return course
     
     def generate_learning_path(self, user_id, goal, timeframe='medium'):
         """
@@ -185,27 +200,38 @@ class RecommendationEngine:
             'long': 24    # 6 months
         }
         
-        # Get courses related to the goal
-        goal_courses = list(mongo.db.courses.find(
-            {
-                '$or': [
-                    {'category': {'$regex': goal, '$options': 'i'}},
-                    {'tags': {'$regex': goal, '$options': 'i'}},
-                    {'title': {'$regex': goal, '$options': 'i'}},
-                    {'description': {'$regex': goal, '$options': 'i'}}
-                ]
-            },
-            {
-                'title': 1,
-                'difficulty': 1,
-                'estimated_duration': 1
-            }
-        ))
-        
-        # Sort courses by difficulty
-        beginner_courses = [c for c in goal_courses if c.get('difficulty') == 'beginner']
-        intermediate_courses = [c for c in goal_courses if c.get('difficulty') == 'intermediate']
-        advanced_courses = [c for c in goal_courses if c.get('difficulty') == 'advanced']
+        # Get the courses most relevant to the goal at each difficulty, from
+        # the catalog's text index
+        if course_catalog.enabled:
+            buckets = course_catalog.snapshot().match_goal(goal, ('beginner', 'intermediate', 'advanced'), limit=2)
+            beginner_courses, intermediate_courses, advanced_courses = (
+                [self._path_course(record) for record in buckets[difficulty]]
+                for difficulty in ('beginner', 'intermediate', 'advanced')
+            )
+        else:
+            # Without the catalog, match the goal literally (escaped, so
+            # regex metacharacters in it cannot make the scan pathological)
+            pattern = re.escape(goal)
+            goal_courses = list(mongo.db.courses.find(
+                {
+                    '$or': [
+                        {'category': {'$regex': pattern, '$options': 'i'}},
+                        {'tags': {'$regex': pattern, '$options': 'i'}},
+                        {'title': {'$regex': pattern, '$options': 'i'}},
+                        {'description': {'$regex': pattern, '$options': 'i'}}
+                    ]
+                },
+                {
+                    'title': 1,
+                    'difficulty': 1,
+                    'estimated_duration': 1
+                }
+            ))
+            
+            # Sort courses by difficulty
+            beginner_courses = [c for c in goal_courses if c.get('difficulty') == 'beginner']
+            intermediate_courses = [c for c in goal_courses if c.get('difficulty') == 'intermediate']
+            advanced_courses = [c for c in goal_courses if c.get('difficulty') == 'advanced']
         
         # Create learning path based on timeframe
         weeks = timeframes.get(timeframe, 12)
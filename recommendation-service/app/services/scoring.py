@@ -0,0 +1,237 @@
+import numpy as np
+from app.services.text_index import document_terms
+
+# Score components, as applied by RecommendationEngine
+BASE_SCORE = 0.5
+LEARNING_STYLE_BOOST = 0.5  # Per content item in the user's learning style
+INTEREST_BOOST = 1          # Per interest matching the category, and per interest matching a tag
+IN_PROGRESS_PENALTY = 0.7   # Multiplier for courses the user has started
+
+# Exercise fields recommendations are made from and returned with
+EXERCISE_SUMMARY_PROJECTION = {'solution_code': 0, 'test_cases': 0}
+
+
+def submission_histories(db, user_ids):
+    """
+    The exercises each user attempted and passed, from their submissions.
+
+    A fallback for users without exercise_progress documents, which the
+    coding exercise service only writes for submissions since it started
+    maintaining them (rebuild_exercise_stats.py backfills the rest).
+
+    Returns:
+        dict: {user ID: (attempted exercise IDs, passed exercise IDs)}, as
+        strings, for the users with submissions
+    """
+    histories = {}
+    for pair in db.submissions.aggregate([
+        {'$match': {'user_id': {'$in': list(user_ids)}}},
+        {'$group': {'_id': {'user_id': '$user_id', 'exercise_id': '$exercise_id'}, 'passed': {'$max': '$passed_all'}}}
+    ]):
+        attempted, passed = histories.setdefault(pair['_id']['user_id'], ([], []))
+        attempted.append(str(pair['_id']['exercise_id']))
+        if pair['passed'] is True:
+            passed.append(str(pair['_id']['exercise_id']))
+    return histories
+
+
+def normalize_tags(tags):
+    """
+    A course's tags as a list: a comma-separated string is split on commas
+    and anything that is neither a list nor a string has no tags.
+    """
+    if not tags:
+        return []
+    if not isinstance(tags, list):
+        return tags.split(',') if isinstance(tags, str) else []
+    return tags
+
+
+def top_k(scores, limit):
+    """
+    Indices of the highest scores, best first, as many as scores[:limit]
+    would hold.
+
+    Ties keep catalog order, as a stable sort would, so results match
+    sorting the scored items with list.sort(reverse=True).
+    """
+    n = len(scores)
+    k = len(range(n)[:limit])
+    if k == 0:
+        return np.empty(0, dtype=np.intp)
+    if k < n:
+        # Threshold from a partial sort, then every item above it and the
+        # earliest items at it
+        kth = scores[np.argpartition(-scores, k - 1)[:k]].min()
+        above = np.flatnonzero(scores > kth)
+        ties = np.flatnonzero(scores == kth)[:k - len(above)]
+        chosen = np.concatenate([above, ties])
+    else:
+        chosen = np.arange(n)
+    return chosen[np.lexsort((chosen, -scores[chosen]))]
+
+
+class CourseRecord:
+    """
+    The parts of a course document scoring looks at: its ID, difficulty,
+    lowercased category (None if it has none), set of lowercased tags and
+    a histogram of its content items' learning styles; for learning paths
+    also the weighted terms of its category, tags, title and description
+    and its estimated duration (None if it has none).
+    """
+
+    __slots__ = ('id', 'difficulty', 'category', 'tags', 'styles', 'terms', 'estimated_duration')
+
+    def __init__(self, course_id, difficulty, category, tags, styles, terms=None, estimated_duration=None):
+        self.id = course_id
+        self.difficulty = difficulty
+        self.category = category
+        self.tags = tags
+        self.styles = styles
+        self.terms = terms or {}
+        self.estimated_duration = estimated_duration
+
+    @classmethod
+    def from_document(cls, course):
+        styles = {}
+        if 'modules' in course:
+            for module in course.get('modules', []):
+                for item in module.get('content_items', []):
+                    style = item.get('learning_style')
+                    styles[style] = styles.get(style, 0) + 1
+        return cls(
+            str(course['_id']),
+            course.get('difficulty'),
+            course.get('category', '').lower() if course.get('category') else None,
+            frozenset(tag.lower() for tag in normalize_tags(course.get('tags'))),
+            styles,
+            document_terms({
+                'category': course.get('category'),
+                'tags': normalize_tags(course.get('tags')),
+                'title': course.get('title'),
+                'description': course.get('description')
+            }),
+            course.get('estimated_duration')
+        )
+
+
+class CourseMatrix:
+    """
+    Course records encoded as arrays for vectorized scoring.
+
+    Each course is a row: a count of content items per learning style, an
+    index into the distinct categories (-1 for none) and its tags, stored
+    CSR-style (tag_indptr/tag_indices) so the tag vocabulary can be large.
+    """
+
+    def __init__(self, records):
+        self.ids = [record.id for record in records]
+        self.positions = {course_id: i for i, course_id in enumerate(self.ids)}
+        self.styles = {}
+        self.categories = {}
+        self.tags = {}
+
+        category_index = np.full(len(records), -1, dtype=np.intp)
+        tag_indptr = [0]
+        tag_indices = []
+        for i, record in enumerate(records):
+            for style in record.styles:
+                self.styles.setdefault(style, len(self.styles))
+            if record.category is not None:
+                category_index[i] = self.categories.setdefault(record.category, len(self.categories))
+            tag_indices.extend(sorted(self.tags.setdefault(tag, len(self.tags)) for tag in record.tags))
+            tag_indptr.append(len(tag_indices))
+
+        self.style_counts = np.zeros((len(records), len(self.styles)))
+        for i, record in enumerate(records):
+            for style, count in record.styles.items():
+                self.style_counts[i, self.styles[style]] = count
+        self.category_index = category_index
+        self.tag_indptr = np.array(tag_indptr, dtype=np.intp)
+        self.tag_indices = np.array(tag_indices, dtype=np.intp)
+        self.tag_rows = np.repeat(np.arange(len(records)), np.diff(self.tag_indptr))
+
+    @classmethod
+    def from_documents(cls, courses):
+        return cls([CourseRecord.from_document(course) for course in courses])
+
+    def __len__(self):
+        return len(self.ids)
+
+    def score(self, learning_style=None, interests=None, in_progress_ids=()):
+        """
+        Score every course for a user.
+
+        Args:
+            learning_style: The user's learning style
+            interests (list): The user's interests; repeated interests
+                count once per occurrence
+            in_progress_ids (iterable): IDs of courses the user has started
+
+        Returns:
+            numpy.ndarray: One score per course, in catalog order
+        """
+        n = len(self.ids)
+        scores = np.full(n, BASE_SCORE)
+        if not n:
+            return scores
+
+        if learning_style and learning_style in self.styles:
+            scores += LEARNING_STYLE_BOOST * self.style_counts[:, self.styles[learning_style]]
+
+        if interests:
+            lowered = [interest.lower() for interest in interests]
+
+            # Substring match of every interest against each distinct category
+            if self.categories:
+                category_boost = np.array([
+                    INTEREST_BOOST * sum(interest in category for interest in lowered)
+                    for category in self.categories
+                ], dtype=float)
+                has_category = self.category_index >= 0
+                scores[has_category] += category_boost[self.category_index[has_category]]
+
+            # Exact match against tags: the user as a vector over the tag vocabulary
+            tag_weights = np.zeros(len(self.tags))
+            for interest in lowered:
+                if interest in self.tags:
+                    tag_weights[self.tags[interest]] += INTEREST_BOOST
+            if tag_weights.any():
+                scores += np.bincount(self.tag_rows, weights=tag_weights[self.tag_indices], minlength=n)
+
+        penalized = sorted({self.positions[course_id] for course_id in in_progress_ids if course_id in self.positions})
+        if penalized:
+            scores[penalized] *= IN_PROGRESS_PENALTY
+        return scores
+
+
+class ExerciseMatrix:
+    """A list of exercises encoded as indexes into their lowercased topics."""
+
+    def __init__(self, exercises):
+        self.exercises = exercises
+        self.topics = {}
+        self.topic_index = np.full(len(exercises), -1, dtype=np.intp)
+        for i, exercise in enumerate(exercises):
+            if exercise.get('topic'):
+                topic = exercise.get('topic', '').lower()
+                self.topic_index[i] = self.topics.setdefault(topic, len(self.topics))
+
+    def __len__(self):
+        return len(self.exercises)
+
+    def score(self, interests=None):
+        """
+        Score every exercise for a user: the base score, plus one boost if
+        any interest occurs in the exercise's topic.
+        """
+        scores = np.full(len(self.exercises), BASE_SCORE)
+        if interests and self.topics:
+            lowered = [interest.lower() for interest in interests]
+            topic_boost = np.array([
+                INTEREST_BOOST if any(interest in topic for interest in lowered) else 0
+                for topic in self.topics
+            ], dtype=float)
+            has_topic = self.topic_index >= 0
+            scores[has_topic] += topic_boost[self.topic_index[has_topic]]
+        return scores
@@ -0,0 +1,116 @@
+import bisect
+import math
+import re
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+
+# Words too common in goals and descriptions to say anything about a match
+STOP_WORDS = frozenset([
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'how', 'i', 'in', 'into', 'is', 'it',
+    'learn', 'of', 'on', 'or', 'the', 'to', 'want', 'with', 'you', 'your'
+])
+
+# Weight of a term occurrence by the field it occurs in
+FIELD_WEIGHTS = {'title': 3.0, 'tags': 2.0, 'category': 2.0, 'description': 1.0}
+
+# Query tokens at least this long also match index terms they are a prefix of
+MIN_PREFIX_LENGTH = 3
+
+
+def tokenize(text):
+    """Lowercased alphanumeric tokens of text, without stop words."""
+    if not isinstance(text, str):
+        return []
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOP_WORDS]
+
+
+def document_terms(fields):
+    """
+    Weighted terms of a document.
+
+    Args:
+        fields (dict): Field name to text (or list of texts, e.g. tags)
+
+    Returns:
+        dict: Term to weight: the field weight of each occurrence, summed
+        and damped (1 + log) so long descriptions do not drown out titles
+    """
+    weights = {}
+    for field, text in fields.items():
+        texts = text if isinstance(text, list) else [text]
+        for token in (token for item in texts for token in tokenize(item)):
+            weights[token] = weights.get(token, 0.0) + FIELD_WEIGHTS.get(field, 1.0)
+    return {term: 1 + math.log(weight) for term, weight in weights.items()}
+
+
+class TextIndex:
+    """
+    Inverted index from terms to documents, with a sorted vocabulary for
+    prefix matches.
+
+    A search scores every document in one pass over the postings of the
+    query's terms: each query token contributes the best weight * idf of
+    the terms it matches in the document, and documents are ranked by how
+    many query tokens they match, then by score.
+    """
+
+    def __init__(self, documents):
+        """
+        Args:
+            documents (list): One dict of term weights per document (see
+                document_terms), in document order
+        """
+        self.size = len(documents)
+        postings = {}
+        for position, terms in enumerate(documents):
+            for term, weight in terms.items():
+                entry = postings.setdefault(term, ([], []))
+                entry[0].append(position)
+                entry[1].append(weight)
+        self.vocabulary = sorted(postings)
+        self.postings = {}
+        for term, (positions, weights) in postings.items():
+            idf = math.log(1 + self.size / len(positions))
+            self.postings[term] = (np.array(positions, dtype=np.intp), np.array(weights) * idf)
+
+    def __len__(self):
+        return self.size
+
+    def expand(self, token):
+        """The index terms a query token matches: itself, and any it is a prefix of."""
+        if len(token) < MIN_PREFIX_LENGTH:
+            return [token] if token in self.postings else []
+        start = bisect.bisect_left(self.vocabulary, token)
+        end = bisect.bisect_left(self.vocabulary, token + '\uffff', start)
+        return self.vocabulary[start:end]
+
+    def search(self, query):
+        """
+        Score every document against a query.
+
+        Returns:
+            tuple: (matched, scores) arrays, one entry per document: the
+            number of distinct query tokens it matches and its relevance
+        """
+        matched = np.zeros(self.size, dtype=np.intp)
+        scores = np.zeros(self.size)
+        for token in dict.fromkeys(tokenize(query)):
+            token_scores = np.zeros(self.size)
+            for term in self.expand(token):
+                # A term lists a document once, so this takes the best term per document
+                positions, weights = self.postings[term]
+                token_scores[positions] = np.maximum(token_scores[positions], weights)
+            matched += token_scores > 0
+            scores += token_scores
+        return matched, scores
+
+
+def rank_matches(matched, scores, candidates, limit=None):
+    """
+    The candidates (document positions) that match a search, best first:
+    most query tokens matched, then highest score, then document order.
+    """
+    candidates = candidates[matched[candidates] > 0]
+    order = np.lexsort((candidates, -scores[candidates], -matched[candidates]))
+    return candidates[order][:limit]
@@ -0,0 +1,126 @@
+"""
+Benchmark learning-path goal matching: text index against $regex.
+
+Generates a synthetic catalog and times, per goal, the catalog's text
+index (CatalogSnapshot.match_goal) against the previous matching, a
+case-insensitive unanchored regex over category, tags, title and
+description of every course, run in process the way MongoDB runs it on a
+collection scan:
+    python benchmark_goal_matching.py [--courses 100000] [--goals 200]
+
+With --mongo the catalog is also written to a scratch collection and the
+actual $regex query is timed against it (the collection is dropped after):
+    python benchmark_goal_matching.py --mongo [--collection benchmark_courses]
+"""
+import argparse
+import json
+import random
+import re
+import statistics
+import time
+from bson.objectid import ObjectId
+from app import create_app, mongo
+from app.services.course_catalog import CatalogSnapshot
+from app.services.scoring import CourseRecord
+
+DIFFICULTIES = ('beginner', 'intermediate', 'advanced')
+SUBJECTS = ['python', 'javascript', 'web development', 'data science', 'machine learning', 'databases',
+            'algorithms', 'devops', 'security', 'mobile', 'cloud', 'testing', 'networking', 'rust', 'go']
+WORDS = ['introduction', 'advanced', 'practical', 'fundamentals', 'patterns', 'projects', 'performance',
+         'design', 'systems', 'analysis', 'deployment', 'scaling', 'debugging', 'architecture', 'apis',
+         'frameworks', 'statistics', 'visualization', 'concurrency', 'modeling', 'automation', 'hands']
+
+app = create_app()
+
+
+def synthetic_course(rng):
+    subject = rng.choice(SUBJECTS)
+    return {
+        '_id': ObjectId(),
+        'title': f"{rng.choice(WORDS).title()} {subject.title()} {rng.choice(WORDS).title()}",
+        'description': ' '.join(rng.choice(WORDS + SUBJECTS) for _ in range(rng.randint(20, 60))),
+        'category': subject.title(),
+        'tags': rng.sample(SUBJECTS + WORDS, rng.randint(1, 5)),
+        'difficulty': rng.choice(DIFFICULTIES),
+        'estimated_duration': rng.choice([60, 120, 180, 240])
+    }
+
+
+def regex_match(courses, goal):
+    """The previous matching: goal as a case-insensitive regex on four fields."""
+    pattern = re.compile(goal, re.IGNORECASE)
+    buckets = {difficulty: [] for difficulty in DIFFICULTIES}
+    for course in courses:
+        tags = course.get('tags') or []
+        if (pattern.search(course.get('category') or '') or any(pattern.search(tag) for tag in tags)
+                or pattern.search(course.get('title') or '') or pattern.search(course.get('description') or '')):
+            if course.get('difficulty') in buckets:
+                buckets[course['difficulty']].append(course)
+    return buckets
+
+
+def timings(samples):
+    samples = sorted(samples)
+    return {
+        "mean_ms": round(statistics.mean(samples) * 1000, 3),
+        "p95_ms": round(samples[int(len(samples) * 0.95) - 1] * 1000, 3) if samples else None
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--courses', type=int, default=100000)
+    parser.add_argument('--goals', type=int, default=200, help="Goals timed per method")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--mongo', action='store_true', help="Also time $regex on a scratch collection")
+    parser.add_argument('--collection', default='benchmark_courses')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    courses = [synthetic_course(rng) for _ in range(args.courses)]
+    goals = [rng.choice([rng.choice(SUBJECTS), f"{rng.choice(WORDS)} {rng.choice(SUBJECTS)}"])
+             for _ in range(args.goals)]
+
+    started = time.perf_counter()
+    snapshot = CatalogSnapshot([CourseRecord.from_document(course) for course in courses])
+    report = {
+        "courses": args.courses,
+        "goals": args.goals,
+        "index_build_s": round(time.perf_counter() - started, 3),
+        "index_terms": len(snapshot.text.vocabulary)
+    }
+
+    index_times, regex_times = [], []
+    for goal in goals:
+        started = time.perf_counter()
+        snapshot.match_goal(goal, DIFFICULTIES, limit=2)
+        index_times.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        regex_match(courses, goal)
+        regex_times.append(time.perf_counter() - started)
+    report['text_index'] = timings(index_times)
+    report['regex_scan'] = timings(regex_times)
+
+    if args.mongo:
+        with app.app_context():
+            collection = mongo.db[args.collection]
+            collection.drop()
+            try:
+                for start in range(0, len(courses), 10000):
+                    collection.insert_many(courses[start:start + 10000], ordered=False)
+                mongo_times = []
+                for goal in goals:
+                    started = time.perf_counter()
+                    list(collection.find(
+                        {'$or': [{field: {'$regex': goal, '$options': 'i'}}
+                                 for field in ('category', 'tags', 'title', 'description')]},
+                        {'title': 1, 'difficulty': 1, 'estimated_duration': 1}
+                    ))
+                    mongo_times.append(time.perf_counter() - started)
+                report['mongo_regex'] = timings(mongo_times)
+            finally:
+                collection.drop()
+
+    report['speedup'] = round(report['regex_scan']['mean_ms'] / report['text_index']['mean_ms'], 1)
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,26 @@
+"""
+Precompute course and exercise recommendations for every user.
+
+Ranks the top N courses and exercises per user in worker processes and
+bulk-upserts them into the recommendations collection, where the
+recommendation endpoints serve them until the user's inputs change:
+    python precompute_recommendations.py [--limit 20] [--chunk-size 500] [--workers 4]
+"""
+import argparse
+import json
+from app import create_app, mongo
+from app.services.precomputation import precompute_recommendations
+
+if __name__ == '__main__':
+    # Created here so spawned workers importing this module build no app
+    app = create_app()
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--limit', type=int, default=app.config.get('PRECOMPUTE_LIMIT', 20),
+                        help="Recommendations per user and item type")
+    parser.add_argument('--chunk-size', type=int, default=500, help="Users per worker task and bulk write")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: one per CPU)")
+    args = parser.parse_args()
+
+    with app.app_context():
+        summary = precompute_recommendations(mongo.db, args.limit, args.chunk_size, args.workers)
+    print(json.dumps(summary, indent=2))
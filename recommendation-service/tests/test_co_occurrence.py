@@ -0,0 +1,94 @@
+from datetime import datetime, timedelta
+from bson.objectid import ObjectId
+from app.services.co_occurrence import ItemSimilarity
+
+NOW = datetime.utcnow()
+
+
+class Cursor(list):
+    def sort(self, field, direction=1):
+        return Cursor(sorted(self, key=lambda document: document[field], reverse=direction < 0))
+
+
+class FakeCollection:
+    """The find/find_one subset ItemSimilarity uses, over a list of documents."""
+
+    def __init__(self):
+        self.documents = []
+
+    def insert(self, user_id, item_id, seconds_ago=0):
+        _id = ObjectId.from_datetime(NOW - timedelta(seconds=seconds_ago))
+        # from_datetime zeroes the rest of the ObjectId; keep them distinct
+        _id = ObjectId(str(_id)[:16] + f"{len(self.documents) + 1:08x}")
+        self.documents.append({'_id': _id, 'user_id': user_id, 'course_id': item_id})
+
+    def _matches(self, document, query):
+        for field, condition in query.items():
+            value = document[field]
+            if isinstance(condition, dict):
+                if '$gte' in condition and not value >= condition['$gte']:
+                    return False
+                if '$in' in condition and value not in condition['$in']:
+                    return False
+            elif value != condition:
+                return False
+        return True
+
+    def find(self, query, projection=None):
+        return Cursor(dict(document) for document in self.documents if self._matches(document, query))
+
+    def find_one(self, query, projection=None, sort=None):
+        found = self.find(query)
+        if sort:
+            found = found.sort(*sort[0])
+        return found[0] if found else None
+
+
+def similarity(collection):
+    return ItemSimilarity(lambda: collection, 'course_id', min_count=1, rebuild_interval=3600)
+
+
+def counts(similarity):
+    matrix = similarity.matrix()
+    return {(a, b): matrix._row(matrix.positions[a]).get(matrix.positions[b], 0)
+            for a in matrix.ids for b in matrix.ids if a != b}
+
+
+def test_late_records_inside_the_lookback_are_applied_once():
+    collection = FakeCollection()
+    collection.insert('u1', 'a', seconds_ago=10)
+    collection.insert('u2', 'a', seconds_ago=10)
+    collection.insert('u2', 'c', seconds_ago=1)
+    items = similarity(collection)
+    items.refresh(full=True)
+
+    # Committed after the build with an _id older than the newest one seen
+    collection.insert('u1', 'b', seconds_ago=3)
+    items.refresh()
+    items.refresh()
+
+    assert items.stats()['builds'] == 1
+    assert items.stats()['records_applied'] == 1
+    assert counts(items)[('a', 'b')] == 1
+    assert counts(items)[('a', 'c')] == 1
+    assert counts(items).get(('b', 'c'), 0) == 0
+
+
+def test_rewritten_collection_is_rebuilt_rather_than_counted_again():
+    collection = FakeCollection()
+    pairs = [('u1', 'a'), ('u1', 'b'), ('u2', 'a'), ('u2', 'b'), ('u3', 'b')]
+    for user_id, item_id in pairs:
+        collection.insert(user_id, item_id, seconds_ago=60)
+    items = similarity(collection)
+    items.refresh(full=True)
+    built = counts(items)
+
+    # rebuild_exercise_stats.py clears the collection and writes it again
+    collection.documents = []
+    for user_id, item_id in pairs:
+        collection.insert(user_id, item_id)
+    items.refresh()
+
+    assert items.stats()['builds'] == 2
+    assert items.stats()['records_applied'] == 0
+    assert counts(items) == built == {('a', 'b'): 2, ('b', 'a'): 2}
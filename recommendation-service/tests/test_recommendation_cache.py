@@ -0,0 +1,97 @@
+import threading
+import time
+from datetime import datetime
+from bson.objectid import ObjectId
+from app.services.recommendation_cache import RecommendationCache
+
+
+class Cursor(list):
+    def sort(self, field, direction=1):
+        return Cursor(sorted(self, key=lambda document: document[field], reverse=direction < 0))
+
+    def limit(self, count):
+        return Cursor(self[:count])
+
+
+class FakeEvents:
+    """The find subset RecommendationCache polls user_events with."""
+
+    def __init__(self):
+        self.documents = []
+
+    def append(self, user_id):
+        _id = ObjectId.from_datetime(datetime.utcnow())
+        _id = ObjectId(str(_id)[:16] + f"{len(self.documents) + 1:08x}")
+        self.documents.append({'_id': _id, 'user_id': user_id})
+
+    def find(self, query, projection=None):
+        start = query.get('_id', {}).get('$gte')
+        return Cursor(dict(document) for document in self.documents if start is None or document['_id'] >= start)
+
+
+class Counter:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return [self.calls]
+
+
+def cache(events, **kwargs):
+    cache = RecommendationCache(lambda: events, poll_interval=0, **kwargs)
+    cache.poll_events(force=True)
+    return cache
+
+
+def test_first_request_after_an_event_is_fresh():
+    events = FakeEvents()
+    recommendations = cache(events)
+    compute = Counter()
+    assert recommendations.get('u1', 'courses', 5, compute) == [1]
+    assert recommendations.get('u1', 'courses', 5, compute) == [1]
+
+    events.append('u1')
+
+    assert recommendations.get('u1', 'courses', 5, compute) == [2]
+    assert compute.calls == 2
+    stats = recommendations.stats()
+    assert stats['invalidations'] == 1
+    assert stats['stale_hits'] == 0
+
+
+def test_expired_entries_are_served_stale_while_revalidating():
+    recommendations = cache(FakeEvents(), ttl=0)
+    compute = Counter()
+    assert recommendations.get('u1', 'courses', 5, compute) == [1]
+
+    assert recommendations.get('u1', 'courses', 5, compute) == [1]
+    deadline = time.monotonic() + 5
+    while recommendations.stats()['revalidations'] == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    stats = recommendations.stats()
+    assert stats['stale_hits'] == 1
+    assert stats['revalidations'] == 1
+    assert stats['refreshing'] == 0
+    assert compute.calls == 2
+
+
+def test_result_computed_before_an_event_is_not_kept():
+    events = FakeEvents()
+    recommendations = cache(events)
+    started, release = threading.Event(), threading.Event()
+
+    def slow():
+        started.set()
+        release.wait(5)
+        return ['old']
+
+    thread = threading.Thread(target=recommendations.get, args=('u1', 'courses', 5, slow))
+    thread.start()
+    started.wait(5)
+    recommendations.invalidate_user('u1')
+    release.set()
+    thread.join(5)
+
+    assert recommendations.get('u1', 'courses', 5, lambda: ['new']) == ['new']
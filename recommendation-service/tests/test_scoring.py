@@ -0,0 +1,114 @@
+import random
+import numpy as np
+import pytest
+from app.services.scoring import CourseMatrix, ExerciseMatrix, top_k
+
+STYLES = ['visual', 'auditory', 'reading', 'kinesthetic', None]
+WORDS = ['Python', 'web', 'data', 'Science', 'ml', 'js', 'go', 'rust', 'db', 'dev ops']
+
+
+# The scoring loops RecommendationEngine ran before scoring was vectorized;
+# the matrices must reproduce their scores and ordering exactly
+
+def loop_course_score(course, learning_style, interests, in_progress_ids):
+    score = 0
+    score += 0.5
+    if learning_style and 'modules' in course:
+        for module in course.get('modules', []):
+            for item in module.get('content_items', []):
+                if item.get('learning_style') == learning_style:
+                    score += 0.5
+    if interests:
+        for interest in interests:
+            if course.get('category') and interest.lower() in course.get('category', '').lower():
+                score += 1
+            if course.get('tags'):
+                tags = course.get('tags', [])
+                if not isinstance(tags, list):
+                    tags = tags.split(',') if isinstance(tags, str) else []
+                if interest.lower() in [tag.lower() for tag in tags]:
+                    score += 1
+    if str(course['_id']) in in_progress_ids:
+        score *= 0.7
+    return score
+
+
+def loop_exercise_score(exercise, interests):
+    score = 0
+    score += 0.5
+    if interests and exercise.get('topic'):
+        if any(interest.lower() in exercise.get('topic', '').lower() for interest in interests):
+            score += 1
+    return score
+
+
+def loop_top(items, scores, limit):
+    scored = [dict(item, score=score) for item, score in zip(items, scores)]
+    scored.sort(key=lambda x: x['score'], reverse=True)
+    return [item['_id'] for item in scored[:limit]]
+
+
+def random_course(rng, i):
+    course = {'_id': f"c{i}"}
+    if rng.random() < 0.8:
+        course['category'] = rng.choice(WORDS + ['Web Development', 'Data Science', ''])
+    tags = rng.sample(WORDS, rng.randint(0, 4))
+    course['tags'] = rng.choice([tags, ','.join(tags), None, 7])
+    if rng.random() < 0.9:
+        course['modules'] = [
+            {'content_items': [{'learning_style': rng.choice(STYLES)} for _ in range(rng.randint(0, 3))]}
+            for _ in range(rng.randint(0, 3))
+        ]
+    return course
+
+
+def interests(rng):
+    # Duplicates and mixed case on purpose; repeats count once each
+    return [rng.choice(WORDS + ['dev', 'science', 'WEB']) for _ in range(rng.randint(0, 5))]
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_course_scores_and_order_match_the_loops(seed):
+    rng = random.Random(seed)
+    courses = [random_course(rng, i) for i in range(rng.randint(0, 60))]
+    matrix = CourseMatrix.from_documents(courses)
+
+    for _ in range(10):
+        learning_style = rng.choice(STYLES + ['unknown'])
+        user_interests = interests(rng)
+        in_progress = {f"c{rng.randrange(80)}" for _ in range(rng.randint(0, 5))}
+        limit = rng.choice([0, 1, 3, 5, 10, 100, -2])
+
+        expected = [loop_course_score(course, learning_style, user_interests, in_progress) for course in courses]
+        scores = matrix.score(learning_style, user_interests, in_progress)
+
+        assert scores.tolist() == expected
+        assert [matrix.ids[i] for i in top_k(scores, limit)] == loop_top(courses, expected, limit)
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_exercise_scores_and_order_match_the_loops(seed):
+    rng = random.Random(seed)
+    exercises = [{'_id': f"e{i}", 'topic': rng.choice(WORDS + ['Data Structures', '', None])}
+                 for i in range(rng.randint(0, 60))]
+    matrix = ExerciseMatrix(exercises)
+
+    for _ in range(10):
+        user_interests = interests(rng)
+        limit = rng.choice([0, 1, 3, 5, 10, 100, -2])
+
+        expected = [loop_exercise_score(exercise, user_interests) for exercise in exercises]
+        scores = matrix.score(user_interests)
+
+        assert scores.tolist() == expected
+        assert [exercises[i]['_id'] for i in top_k(scores, limit)] == loop_top(exercises, expected, limit)
+
+
+def test_top_k_breaks_ties_by_catalog_order():
+    scores = np.array([1.0, 2.0, 1.0, 2.0, 1.0, 0.5, 2.0])
+
+    assert top_k(scores, 2).tolist() == [1, 3]
+    assert top_k(scores, 4).tolist() == [1, 3, 6, 0]
+    assert top_k(scores, 100).tolist() == [1, 3, 6, 0, 2, 4, 5]
+    assert top_k(scores, -1).tolist() == [1, 3, 6, 0, 2, 4]
+    assert top_k(np.array([]), 3).tolist() == []
@@ -0,0 +1,29 @@
+# File: app/models/user_event.py
+
+from datetime import datetime
+from bson import ObjectId
+
+# A change to a user's recommendation inputs; the recommendation service
+# reads these to drop the user's cached recommendations
+user_event_schema = {
+    "user_id": ObjectId,   # Reference to user
+    "source": str,         # What changed: progress, exercise_progress or profile
+    "at": datetime
+}
+
+def create_user_event(user_id, source):
+    """
+    Create a new user event document
+    
+    Args:
+        user_id: ID of the user whose inputs changed
+        source: What changed
+    
+    Returns:
+        dict: User event document ready to be inserted into MongoDB
+    """
+    return {
+        "user_id": ObjectId(user_id),
+        "source": source,
+        "at": datetime.utcnow()
+    }
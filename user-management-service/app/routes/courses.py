@@ -5,6 +5,7 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from app import mongo
 from bson.objectid import ObjectId
 from bson.json_util import dumps
+from datetime import datetime
 import json
 from app.models.course import create_course_document, create_module_document, create_content_item_document
 import os
@@ -115,7 +116,7 @@ def add_module(course_id):
     # Add module to course
     result = mongo.db.courses.update_one(
         {'_id': ObjectId(course_id)},
-        {'$push': {'modules': new_module}}
+        {'$push': {'modules': new_module}, '$set': {'updated_at': datetime.utcnow()}}
     )
     
     if result.modified_count == 0:
@@ -145,7 +146,7 @@ def add_content(course_id, module_index):
             '_id': ObjectId(course_id),
             'modules.order': module_index
         },
-        {'$push': {'modules.$.content_items': new_content}}
+        {'$push': {'modules.$.content_items': new_content}, '$set': {'updated_at': datetime.utcnow()}}
     )
     
     if result.modified_count == 0:
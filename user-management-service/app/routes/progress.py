@@ -8,6 +8,7 @@ from bson.json_util import dumps
 import json
 from datetime import datetime
 from app.models.progress import create_progress_document, create_content_progress
+from app.models.user_event import create_user_event
 
 progress_bp = Blueprint('progress', __name__, url_prefix='/api/progress')
 
@@ -56,6 +57,7 @@ def update_course_progress(course_id):
     })
     
     # If no record exists, create a new one
+    started = not progress
     if not progress:
         progress_doc = create_progress_document(current_user_id, course_id)
         mongo.db.progress.insert_one(progress_doc)
@@ -85,6 +87,10 @@ def update_course_progress(course_id):
         {'$set': update_fields}
     )
     
+    # Starting or completing a course changes the user's recommendations
+    if started or 'completed' in data:
+        mongo.db.user_events.insert_one(create_user_event(current_user_id, 'progress'))
+    
     return jsonify({"message": "Progress updated successfully"}), 200
 
 @progress_bp.route('/content/<course_id>/<module_index>/<content_index>', methods=['POST'])
@@ -205,4 +211,8 @@ def update_content_progress(course_id, module_index, content_index):
             }
         )
     
+    # The course may have been started or completed, which changes the
+    # user's recommendations
+    mongo.db.user_events.insert_one(create_user_event(current_user_id, 'progress'))
+    
     return jsonify({"message": "Content progress updated successfully"}), 200
\ No newline at end of file